@@ -0,0 +1,405 @@
+"""
+Micro-benchmarks for WotBot hot paths, with a stored baseline to compare against.
+
+    python benchmarks/micro.py                      # run and compare with benchmarks/baseline.json
+    python benchmarks/micro.py -k session           # only benchmarks whose name contains "session"
+    python benchmarks/micro.py --json out.json      # also write this run's results
+    python benchmarks/micro.py --update-baseline    # make this run the new baseline
+
+Each benchmark is timed like timeit: the loop count is calibrated so one
+repeat takes about --min-time seconds, and the median and minimum over
+--repeats repeats are reported per operation. Comparisons use the minimum,
+which other load on the machine can only push up: a benchmark whose minimum
+is more than --threshold times its baseline minimum is re-measured up to
+--confirm more times (a busy machine slows a single run, not every rerun),
+and if it stays slower it is a regression and the exit status is 1. Baselines are machine-specific: regenerate them on the
+machine (or CI runner class) the comparison runs on.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if __name__ == "__main__" and os.environ.get("PYTHONHASHSEED") is None:
+    # String hashing is randomized per process, which changes dict layouts and
+    # shifts the dict-heavy benchmarks between runs; pin it so runs compare
+    os.environ["PYTHONHASHSEED"] = "0"
+    os.execv(sys.executable, [sys.executable] + sys.argv)
+
+sys.path.insert(0, ROOT)
+os.environ.setdefault("LOGS_DIR", os.path.join(ROOT, "logs"))
+
+from wotbot.config import settings  # noqa: E402
+
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# name -> setup() returning the zero-argument function to time, or None to skip
+BENCHMARKS: Dict[str, Callable[[], Optional[Callable[[], object]]]] = {}
+
+
+def bench(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+# Text splitting
+
+def _paragraphs(total_chars: int) -> str:
+    para = ("WotBot keeps replies short for mobile. " * 6).strip()
+    out, size = [], 0
+    while size < total_chars:
+        out.append(para)
+        size += len(para) + 2
+    return "\n\n".join(out)
+
+
+@bench("split_for_whatsapp.paragraphs_200k")
+def _split_paragraphs():
+    from wotbot.utils.text_splitter import split_for_whatsapp
+
+    text = _paragraphs(200_000)
+    return lambda: split_for_whatsapp(text)
+
+
+@bench("split_for_whatsapp.no_newlines_200k")
+def _split_unbroken():
+    from wotbot.utils.text_splitter import split_for_whatsapp
+
+    text = "x" * 200_000
+    return lambda: split_for_whatsapp(text)
+
+
+# Responses API input formatting
+
+@bench("format_responses_input.history_200")
+def _format_history():
+    from wotbot.conversation.openai_client import _format_responses_input
+
+    messages: List[Dict[str, object]] = [{"role": "system", "content": "You are WotBot."}]
+    for i in range(100):
+        messages.append({"role": "user", "content": [
+            {"type": "text", "text": f"question {i} " * 20},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64," + "A" * 64}},
+        ]})
+        messages.append({"role": "assistant", "content": f"answer {i} " * 40})
+        messages.append({"role": "tool", "content": '{"ok": true}'})
+    return lambda: _format_responses_input(messages)
+
+
+# Tool schemas
+
+@bench("tool_schemas.all")
+def _tool_schemas():
+    from wotbot.tools.schemas import tool_schemas
+
+    return tool_schemas
+
+
+# Session store
+
+@bench("session_store.append_10k_users")
+def _session_append():
+    from wotbot.conversation.session_store import SessionStore
+
+    store = SessionStore()
+    users = [f"whatsapp:+1555{i:07d}" for i in range(10_000)]
+    for u in users:
+        for j in range(40):
+            store.append(u, "user", f"message {j}")
+    state = {"i": 0}
+
+    def run():
+        i = state["i"] = (state["i"] + 1) % len(users)
+        store.append(users[i], "user", "hello")
+
+    return run
+
+
+@bench("session_store.get_10k_users")
+def _session_get():
+    from wotbot.conversation.session_store import SessionStore
+
+    store = SessionStore()
+    users = [f"whatsapp:+1555{i:07d}" for i in range(10_000)]
+    for u in users:
+        store.append(u, "user", "hello")
+    state = {"i": 0}
+
+    def run():
+        i = state["i"] = (state["i"] + 1) % len(users)
+        return store.get(users[i])
+
+    return run
+
+
+# HTTP tool guards
+
+@bench("http.redact_headers_30")
+def _redact():
+    from wotbot.tools.http_client import _redact_headers
+
+    headers = {f"X-Header-{i}": "v" * 32 for i in range(27)}
+    headers.update({"Authorization": "Bearer secret", "X-Api-Key": "k", "Accept": "application/json"})
+    return lambda: _redact_headers(headers)
+
+
+@bench("http.domain_allowed_1000_domains")
+def _domain_allowed():
+    from wotbot.tools.http_client import _domain_allowed
+
+    # Worst case: the host matches nothing, so every entry is checked
+    domains = tuple(f"api{i}.example{i % 50}.com" for i in range(1000))
+    url = "https://service.not-listed.org/v1/items?page=2"
+
+    def run():
+        saved = settings.allow_http_domains
+        settings.allow_http_domains = domains
+        try:
+            return _domain_allowed(url)
+        finally:
+            settings.allow_http_domains = saved
+
+    return run
+
+
+# Sandbox round trips (a subprocess per call; a few ms each)
+
+@bench("sandbox.python_roundtrip")
+def _sandbox_python():
+    from wotbot.tools.code_runner import run_code
+
+    return lambda: run_code("python", "print(sum(range(100)))")
+
+
+@bench("sandbox.javascript_roundtrip")
+def _sandbox_js():
+    from wotbot.tools.code_runner import run_code
+
+    if shutil.which("node") is None:
+        return None
+    return lambda: run_code("javascript", "console.log([1, 2, 3].map(x => x * 2).join(','))")
+
+
+# Webhook
+
+@bench("webhook.form_parse")
+def _form_parse():
+    from starlette.requests import Request
+
+    body = urlencode({
+        "SmsMessageSid": "SM" + "0" * 32,
+        "NumMedia": "1",
+        "ProfileName": "Bench User",
+        "MessageType": "image",
+        "WaId": "15550001234",
+        "Body": "What is in this picture? " * 8,
+        "To": "whatsapp:+14155238886",
+        "From": "whatsapp:+15550001234",
+        "MediaUrl0": "https://api.twilio.com/2010-04-01/Accounts/AC00/Messages/MM00/Media/ME00",
+        "MediaContentType0": "image/jpeg",
+        "AccountSid": "AC" + "0" * 32,
+        "ApiVersion": "2010-04-01",
+    }).encode()
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/webhook/twilio/whatsapp",
+        "headers": [(b"content-type", b"application/x-www-form-urlencoded"), (b"content-length", str(len(body)).encode())],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def parse():
+        form = await Request(scope, receive).form()
+        return form.get("From"), form.get("Body"), int(form.get("NumMedia", "0"))
+
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(parse())
+
+
+# Runner
+
+def _time(fn: Callable[[], object], loops: int) -> float:
+    # Like timeit, keep collector pauses (which depend on whatever else is on
+    # the heap) out of the measurement
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        return time.perf_counter() - started
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def measure(fn: Callable[[], object], repeats: int, min_time: float) -> Dict[str, float]:
+    fn()  # warm caches and lazy imports
+    loops = 1
+    while True:
+        elapsed = _time(fn, loops)
+        if elapsed >= min_time / 5 or loops >= 1_000_000:
+            break
+        loops *= 10
+    loops = max(1, int(loops * (min_time / max(elapsed, 1e-9))))
+    per_op = [_time(fn, loops) / loops * 1e6 for _ in range(repeats)]
+    return {
+        "median_us": round(statistics.median(per_op), 3),
+        "min_us": round(min(per_op), 3),
+        "loops": loops,
+        "repeats": repeats,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(selected: List[str], repeats: int, min_time: float, quiet: bool = False) -> Dict[str, object]:
+    results: Dict[str, Dict[str, float]] = {}
+    for name in selected:
+        gc.collect()
+        fn = BENCHMARKS[name]()
+        if fn is None:
+            if not quiet:
+                print(f"{name:<40} skipped")
+            continue
+        r = results[name] = measure(fn, repeats, min_time)
+        del fn
+        if not quiet:
+            print(f"{name:<40} {_fmt(r['median_us']):>12}  (min {_fmt(r['min_us'])}, {r['loops']} loops x {repeats})")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "commit": _git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "benchmarks": results,
+    }
+
+
+def _slower(current: Dict[str, object], baseline: Dict[str, object], threshold: float) -> List[str]:
+    base = baseline.get("benchmarks", {})
+    return [
+        name for name, r in current["benchmarks"].items()
+        if name in base and base[name]["min_us"] and r["min_us"] / base[name]["min_us"] > threshold
+    ]
+
+
+def confirm(current: Dict[str, object], baseline: Dict[str, object], threshold: float, attempts: int, repeats: int, min_time: float) -> None:
+    """Re-measure benchmarks that look slower than the baseline, keeping each one's best run."""
+    for _ in range(attempts):
+        suspects = _slower(current, baseline, threshold)
+        if not suspects:
+            return
+        print(f"\nRe-measuring {len(suspects)} benchmark(s) slower than the baseline: " + ", ".join(suspects))
+        rerun = run(suspects, repeats, min_time, quiet=True)["benchmarks"]
+        for name, r in rerun.items():
+            if r["min_us"] < current["benchmarks"][name]["min_us"]:
+                current["benchmarks"][name] = r
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object], threshold: float) -> List[Tuple[str, float]]:
+    """Print a comparison table; returns the (name, ratio) of each regression."""
+    base = baseline.get("benchmarks", {})
+    regressions = []
+    print(f"\nBest time per op vs baseline from commit {baseline.get('meta', {}).get('commit')} (threshold {threshold:.2f}x):")
+    for name, r in current["benchmarks"].items():
+        b = base.get(name)
+        if not b:
+            print(f"  {name:<40} new")
+            continue
+        ratio = r["min_us"] / b["min_us"] if b["min_us"] else 1.0
+        mark = ""
+        if ratio > threshold:
+            mark = "  REGRESSION"
+            regressions.append((name, ratio))
+        elif ratio < 1 / threshold:
+            mark = "  faster"
+        print(f"  {name:<40} {_fmt(b['min_us']):>12} -> {_fmt(r['min_us']):>12}  {ratio:5.2f}x{mark}")
+    return regressions
+
+
+def _fmt(us: float) -> str:
+    if us >= 1000:
+        return f"{us / 1000:.2f} ms"
+    return f"{us:.2f} us"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="filter", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat (default 0.2)")
+    parser.add_argument("--json", dest="json_path", help="write this run's results to a file")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file (default benchmarks/baseline.json)")
+    parser.add_argument("--update-baseline", action="store_true", help="write this run to the baseline file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    parser.add_argument("--confirm", type=int, default=2, help="re-measure apparent regressions this many times (default 2)")
+    parser.add_argument("--list", action="store_true", help="list benchmark names and exit")
+    args = parser.parse_args()
+
+    selected = [n for n in BENCHMARKS if not args.filter or args.filter in n]
+    if args.list:
+        print("\n".join(selected))
+        return 0
+    if not selected:
+        print(f"No benchmarks match {args.filter!r}")
+        return 2
+
+    repeats, min_time = max(1, args.repeats), max(0.01, args.min_time)
+    current = run(selected, repeats, min_time)
+    baseline = None
+    if not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        confirm(current, baseline, args.threshold, max(0, args.confirm), repeats, min_time)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+    if args.update_baseline:
+        if args.filter and os.path.exists(args.baseline):
+            # Partial runs only replace the benchmarks they ran
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                merged = json.load(f)
+            merged["meta"] = current["meta"]
+            merged.setdefault("benchmarks", {}).update(current["benchmarks"])
+            current = merged
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; create one with --update-baseline")
+        return 0
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): " + ", ".join(f"{n} ({r:.2f}x)" for n, r in regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+Replay recorded traffic (TRAFFIC_RECORD_ENABLED) against this build of the app
+and compare latency and throughput between builds.
+
+    python benchmarks/replay.py run logs/traffic.jsonl.gz [--speed 1|10|max] [--json after.json]
+    python benchmarks/replay.py compare before.json after.json
+
+The app runs in-process with the recorded OpenAI HTTP responses and tool
+results served locally, optionally after their recorded latencies
+(--no-provider-latency measures app overhead alone). Local tools such as
+run_code still execute, and replies are collected instead of sent to Twilio.
+Turns keep their recorded spacing divided by --speed, with idle gaps capped at
+--max-gap seconds; "max" sends as fast as possible. A user's next message
+waits for the reply to their previous one, as it does on WhatsApp. Commands
+that restart the bot are skipped. Logs, traces and usage go to a temporary
+directory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CATEGORIES = ("text", "command", "media", "tools")
+
+
+def category(rec: Dict[str, Any]) -> str:
+    if (rec.get("body") or "").lstrip().startswith("/"):
+        return "command"
+    if rec.get("media"):
+        return "media"
+    if rec.get("tools"):
+        return "tools"
+    return "text"
+
+
+def latency_stats(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pct(p: float) -> float:
+        return round(values[min(len(values) - 1, int(p * len(values)))], 1)
+
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 1),
+        "p50": pct(0.50),
+        "p90": pct(0.90),
+        "p99": pct(0.99),
+        "max": round(values[-1], 1),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def drive(app, turns, speed: Optional[float], max_gap: float, concurrency: int) -> float:
+    """Send every turn to the webhook on schedule; returns the wall time in seconds."""
+    import httpx
+
+    sem = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+    last_by_user: Dict[str, asyncio.Task] = {}
+
+    async def send(index: int, turn, previous: Optional[asyncio.Task]) -> int:
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        rec = turn.record
+        form = {"From": rec["user"], "Body": rec.get("body") or "", "ReplayTurn": str(index)}
+        media = rec.get("media") or []
+        form["NumMedia"] = str(len(media))
+        for j, m in enumerate(media):
+            form[f"MediaUrl{j}"] = f"replay://media/{int(m.get('bytes') or 0)}"
+            form[f"MediaContentType{j}"] = m.get("type") or "image/jpeg"
+        if sem is not None:
+            await sem.acquire()
+        try:
+            turn.started = time.perf_counter()
+            # The ASGI transport returns once the background turn has finished too
+            resp = await client.post("/webhook/twilio/whatsapp", data=form)
+            return resp.status_code
+        finally:
+            if sem is not None:
+                sem.release()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        offset = 0.0
+        prev_ts = None
+        tasks = []
+        for i, turn in enumerate(turns):
+            ts = turn.record.get("ts") or 0.0
+            if speed is not None:
+                if prev_ts is not None:
+                    offset += min(max(0.0, ts - prev_ts), max_gap) / speed
+                delay = started + offset - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            prev_ts = ts
+            user = turn.record["user"]
+            task = asyncio.ensure_future(send(i, turn, last_by_user.get(user)))
+            last_by_user[user] = task
+            tasks.append(task)
+        statuses = await asyncio.gather(*tasks, return_exceptions=True)
+        wall = loop.time() - started
+    for turn, st in zip(turns, statuses):
+        turn.record["_status"] = st if isinstance(st, int) else repr(st)
+    return wall
+
+
+def cmd_run(args) -> int:
+    tmp = tempfile.mkdtemp(prefix="wotbot-replay-")
+    # Before the app's settings are read: keep the replay's files out of the
+    # real logs/data, and never require real credentials or signatures
+    os.environ["LOGS_DIR"] = os.path.join(tmp, "logs")
+    os.environ["CONFIG_DIR"] = os.path.join(tmp, "config")
+    os.environ["OVERRIDES_PATH"] = os.path.join(tmp, "config", "settings.json")
+    os.environ["USAGE_PATH"] = os.path.join(tmp, "usage.json")
+    os.environ["TWILIO_VALIDATE_SIGNATURE"] = "false"
+    os.environ["TRAFFIC_RECORD_ENABLED"] = "false"
+    os.environ.setdefault("OPENAI_API_KEY", "replay")
+
+    from wotbot import traffic
+    from wotbot.config import settings
+
+    records: List[Dict[str, Any]] = []
+    for path in args.recordings:
+        records.extend(traffic.read_turns(path))
+    records.sort(key=lambda r: r.get("ts") or 0.0)
+    safe = [r for r in records if ((r.get("body") or "").split() or [""])[0].lower() not in traffic.UNSAFE_COMMANDS]
+    skipped = len(records) - len(safe)
+    records = safe
+    if args.limit:
+        records = records[: args.limit]
+    if not records:
+        print("No turns to replay")
+        return 2
+
+    live_tools = traffic.LIVE_TOOLS if args.live_tools is None else {t.strip() for t in args.live_tools.split(",") if t.strip()}
+    player = traffic.TrafficPlayer(records, provider_latency=not args.no_provider_latency, live_tools=live_tools)
+    traffic.player = player
+
+    from wotbot.app import create_app
+
+    from wotbot.conversation.openai_client import shared_openai
+    from wotbot.routes.twilio_webhook import get_engine
+
+    app = create_app()
+    # The ASGI transport sends no lifespan events, so warm up here rather than
+    # timing the first turns' lazy engine and client construction
+    get_engine()
+    shared_openai()
+    admins = {r["user"] for r in records if r.get("admin")}
+    settings.admin_phone_numbers = tuple(settings.admin_phone_numbers) + tuple(sorted(admins))
+
+    speed = None if args.speed == "max" else float(args.speed)
+    print(f"Replaying {len(records)} turns ({skipped} skipped) at " + ("max speed" if speed is None else f"{args.speed}x") + " ...")
+    wall = asyncio.run(drive(app, player.turns, speed, args.max_gap, args.concurrency))
+
+    by_cat: Dict[str, List[float]] = {c: [] for c in CATEGORIES}
+    replayed: List[float] = []
+    recorded: List[float] = []
+    http_errors = undelivered = 0
+    for turn in player.turns:
+        rec = turn.record
+        if rec.get("_status") != 204:
+            http_errors += 1
+        if turn.delivered is None or turn.started is None:
+            undelivered += 1
+            continue
+        ms = (turn.delivered - turn.started) * 1000
+        replayed.append(ms)
+        by_cat[category(rec)].append(ms)
+        if rec.get("turn_ms") is not None:
+            recorded.append(rec["turn_ms"])
+
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "recordings": args.recordings,
+            "turns": len(records),
+            "skipped_unsafe": skipped,
+            "speed": args.speed,
+            "max_gap_sec": args.max_gap,
+            "concurrency": args.concurrency,
+            "provider_latency": not args.no_provider_latency,
+            "live_tools": sorted(player.live_tools),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "wall_sec": round(wall, 3),
+        "throughput_turns_per_sec": round(len(replayed) / wall, 3) if wall > 0 else None,
+        "latency_ms": {"all": latency_stats(replayed), **{c: latency_stats(v) for c, v in by_cat.items()}},
+        "recorded_latency_ms": latency_stats(recorded),
+        "errors": {"http": http_errors, "undelivered": undelivered},
+        "replay": dict(player.stats),
+    }
+    print_run(result)
+    print(f"logs and traces: {os.environ['LOGS_DIR']}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+def print_run(r: Dict[str, Any]) -> None:
+    print(f"\nwall {r['wall_sec']} s, throughput {r['throughput_turns_per_sec']} turns/s")
+    print(f"{'latency ms':<12} {'count':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    rows = [(k, v) for k, v in r["latency_ms"].items()] + [("recorded", r["recorded_latency_ms"])]
+    for name, s in rows:
+        if s.get("count"):
+            print(f"{name:<12} {s['count']:>6} {s['p50']:>9} {s['p90']:>9} {s['p99']:>9} {s['max']:>9}")
+    print("errors:", r["errors"], " replay:", r["replay"])
+
+
+def cmd_compare(args) -> int:
+    with open(args.before, "r", encoding="utf-8") as f:
+        a = json.load(f)
+    with open(args.after, "r", encoding="utf-8") as f:
+        b = json.load(f)
+    print(f"before {a['meta'].get('commit')} ({a['meta'].get('turns')} turns at {a['meta'].get('speed')}x)"
+          f" vs after {b['meta'].get('commit')} ({b['meta'].get('turns')} turns at {b['meta'].get('speed')}x)")
+
+    def row(label: str, x: Optional[float], y: Optional[float]) -> None:
+        if x is None or y is None:
+            return
+        change = f"{(y - x) / x * 100:+.1f}%" if x else "n/a"
+        print(f"  {label:<28} {x:>10} {y:>10}  {change:>8}")
+
+    print(f"  {'':<28} {'before':>10} {'after':>10}  {'change':>8}")
+    row("throughput turns/s", a.get("throughput_turns_per_sec"), b.get("throughput_turns_per_sec"))
+    row("wall s", a.get("wall_sec"), b.get("wall_sec"))
+    for cat in ("all",) + CATEGORIES:
+        sa, sb = a["latency_ms"].get(cat, {}), b["latency_ms"].get(cat, {})
+        if not sa.get("count") or not sb.get("count"):
+            continue
+        for p in ("p50", "p90", "p99"):
+            row(f"{cat} latency {p} ms", sa.get(p), sb.get(p))
+    for key in ("http", "undelivered"):
+        row(f"errors {key}", a["errors"].get(key), b["errors"].get(key))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="replay recordings against this build")
+    run.add_argument("recordings", nargs="+", help="traffic.jsonl.gz files (rolled-over .1 files too)")
+    run.add_argument("--speed", default="1", help="1, 10, any factor, or max (default 1)")
+    run.add_argument("--max-gap", type=float, default=10.0, help="cap on recorded idle gaps in seconds (default 10)")
+    run.add_argument("--concurrency", type=int, default=0, help="max turns in flight (default unlimited)")
+    run.add_argument("--limit", type=int, default=0, help="replay only the first N turns")
+    run.add_argument("--no-provider-latency", action="store_true", help="serve recorded responses immediately")
+    run.add_argument("--live-tools", help="comma-separated tools to execute instead of replaying (default: local tools)")
+    run.add_argument("--json", dest="json_path", help="write the results to this file")
+
+    cmp_ = sub.add_parser("compare", help="compare two run results")
+    cmp_.add_argument("before")
+    cmp_.add_argument("after")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        if args.speed != "max":
+            try:
+                if float(args.speed) <= 0:
+                    raise ValueError
+            except ValueError:
+                parser.error("--speed must be a positive number or max")
+        return cmd_run(args)
+    return cmd_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import the app, build
+it, and answer its first request.
+
+    python benchmarks/startup.py [--runs 5] [--json out.json]
+
+Each run is a new interpreter, so nothing is shared between runs except the
+OS page cache and compiled .pyc files (the first run warms both and is not
+counted). Logs and config go to a temporary directory.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child: import, then create_app, reporting both as JSON
+IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import wotbot.app
+t1 = time.perf_counter()
+wotbot.app.create_app()
+t2 = time.perf_counter()
+heavy = [m for m in ("openai", "twilio.rest", "requests", "psutil", "httpx") if m in sys.modules]
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "create_app_ms": (t2 - t1) * 1000, "loaded": heavy}))
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _env(tmp: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("LOGS_DIR", os.path.join(tmp, "logs"))
+    env.setdefault("CONFIG_DIR", os.path.join(tmp, "config"))
+    env.setdefault("USAGE_PATH", os.path.join(tmp, "usage.json"))
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def measure_import(env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure_first_request(env: dict, timeout: float = 30.0) -> float:
+    """Milliseconds from spawning uvicorn to the first 200 from /health."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError(f"no response from {url} within {timeout}s")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _summary(values: list) -> dict:
+    return {
+        "median": round(statistics.median(values), 1),
+        "min": round(min(values), 1),
+        "max": round(max(values), 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="wotbot-bench-") as tmp:
+        env = _env(tmp)
+        measure_import(env)  # warm-up: .pyc files and page cache
+        samples = {"import_ms": [], "create_app_ms": [], "first_request_ms": []}
+        loaded = []
+        for _ in range(max(1, args.runs)):
+            probe = measure_import(env)
+            samples["import_ms"].append(probe["import_ms"])
+            samples["create_app_ms"].append(probe["create_app_ms"])
+            loaded = probe["loaded"]
+            samples["first_request_ms"].append(measure_first_request(env))
+
+    result = {
+        "python": sys.version.split()[0],
+        "runs": max(1, args.runs),
+        "results": {name: _summary(values) for name, values in samples.items()},
+        "heavy_modules_at_startup": loaded,
+    }
+    for name, s in result["results"].items():
+        print(f"{name:<18} median {s['median']:>8.1f} ms   min {s['min']:>8.1f}   max {s['max']:>8.1f}")
+    print("heavy modules loaded by create_app:", ", ".join(loaded) or "none")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,7 @@
+import logging
+import threading
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from dotenv import load_dotenv
 
@@ -5,19 +9,60 @@ from dotenv import load_dotenv
 load_dotenv()
 from .config import settings, load_overrides
 from .logging_config import configure_logging
-from .routes.twilio_webhook import router as twilio_router
+from .routes.twilio_webhook import router as twilio_router, get_engine
 from .routes.health import router as health_router
+from .routes.metrics import router as metrics_router
 from .routes.admin import router as admin_router
+from .tools import code_runner
+from .tools.mcp_catalog import catalog as mcp_catalog
+from .tools.metrics_sampler import sampler as metrics_sampler
+from .conversation.usage import ledger as usage_ledger
+from .conversation.openai_client import shared_openai
+from .utils.twilio_utils import twilio_client
+from .loop_monitor import monitor as loop_monitor
+
+log = logging.getLogger(__name__)
+
+
+def _prewarm() -> None:
+    # The engine and provider clients are built on first use; do it now, off the
+    # request path, so the first WhatsApp message does not pay for the imports
+    try:
+        get_engine()
+        shared_openai()
+        if settings.twilio_account_sid and settings.twilio_auth_token:
+            twilio_client()
+    except Exception as e:
+        log.warning("Prewarm failed (clients will be built on first use): %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Measure event loop lag and catch sync calls blocking it
+    loop_monitor.start()
+    if settings.startup_prewarm:
+        threading.Thread(target=_prewarm, daemon=True, name="prewarm").start()
+    yield
+    await loop_monitor.stop()
 
 
 def create_app() -> FastAPI:
     configure_logging()
-    app = FastAPI(title="WotBot", version="0.1.0")
+    app = FastAPI(title="WotBot", version="0.1.0", lifespan=lifespan)
     # Load persisted config overrides
     load_overrides()
+    # Start the warm sandbox worker (no-op unless CODE_EXEC_PROFILE=compute)
+    code_runner.warm_up()
+    # Fetch MCP tool listings in the background so they never sit on a request
+    mcp_catalog.start()
+    # Sample system metrics in the background for /health, /status and tools
+    metrics_sampler.start()
+    # Restore today's token counters so per-user budgets survive restarts
+    usage_ledger.load()
 
     # Routers
     app.include_router(health_router, prefix="/health", tags=["health"]) 
+    app.include_router(metrics_router, prefix="/metrics", tags=["metrics"]) 
     app.include_router(twilio_router, prefix="/webhook/twilio", tags=["twilio"]) 
     app.include_router(admin_router, prefix="/admin", tags=["admin"]) 
 
@@ -28,6 +28,8 @@ class Settings:
     )
     openai_temperature: float = float(os.getenv("OPENAI_TEMPERATURE", "0.3"))
     openai_max_tokens: int = int(os.getenv("OPENAI_MAX_TOKENS", "600"))
+    # JSON {"model": [input, output, cached_input]} USD per 1M tokens, merged over built-in prices
+    openai_prices: str = os.getenv("OPENAI_PRICES", "")
 
     # Admin & Modes
     admin_phone_numbers: List[str] = tuple(
@@ -40,13 +42,35 @@ class Settings:
     )
     code_exec_timeout_sec: int = int(os.getenv("CODE_EXEC_TIMEOUT_SEC", "5"))
     code_exec_memory_mb: int = int(os.getenv("CODE_EXEC_MEMORY_MB", "128"))
+    # "basic" (no imports) or "compute" (warm worker with preloaded math/statistics/numpy)
+    code_exec_profile: str = os.getenv("CODE_EXEC_PROFILE", "basic")
     http_timeout_sec: int = int(os.getenv("HTTP_TIMEOUT_SEC", "12"))
+    http_pool_max_hosts: int = int(os.getenv("HTTP_POOL_MAX_HOSTS", "32"))
+    http_pool_maxsize: int = int(os.getenv("HTTP_POOL_MAXSIZE", "4"))
+    http_use_http2: bool = _get_bool("HTTP_USE_HTTP2", "false")
+    http_max_body_bytes: int = int(os.getenv("HTTP_MAX_BODY_BYTES", "2000000"))
+    http_batch_max_requests: int = int(os.getenv("HTTP_BATCH_MAX_REQUESTS", "10"))
+    http_batch_concurrency: int = int(os.getenv("HTTP_BATCH_CONCURRENCY", "4"))
+    http_batch_timeout_sec: int = int(os.getenv("HTTP_BATCH_TIMEOUT_SEC", "20"))
+    http_cache_enabled: bool = _get_bool("HTTP_CACHE_ENABLED", "true")
+    http_cache_max_bytes: int = int(os.getenv("HTTP_CACHE_MAX_BYTES", "8000000"))
+    http_cache_dir: str = os.getenv("HTTP_CACHE_DIR", "")
 
     # MCP servers (comma separated base URLs)
     mcp_servers: List[str] = tuple(
         s.strip() for s in os.getenv("MCP_SERVERS", "").split(",") if s.strip()
     )
     mcp_token: Optional[str] = os.getenv("MCP_TOKEN")
+    mcp_list_timeout_sec: int = int(os.getenv("MCP_LIST_TIMEOUT_SEC", "5"))
+    # Expose cached MCP tool listings as native function tools
+    mcp_native_tools: bool = _get_bool("MCP_NATIVE_TOOLS", "true")
+    mcp_catalog_ttl_sec: int = int(os.getenv("MCP_CATALOG_TTL_SEC", "300"))
+    mcp_catalog_max_tools: int = int(os.getenv("MCP_CATALOG_MAX_TOOLS", "64"))
+    # Local (stdio) MCP servers
+    mcp_exec_timeout_sec: int = int(os.getenv("MCP_EXEC_TIMEOUT_SEC", "10"))
+    mcp_exec_idle_sec: int = int(os.getenv("MCP_EXEC_IDLE_SEC", "300"))
+    mcp_exec_health_interval_sec: int = int(os.getenv("MCP_EXEC_HEALTH_INTERVAL_SEC", "60"))
+    mcp_exec_initialize: bool = _get_bool("MCP_EXEC_INITIALIZE", "true")
 
     # Security
     developer_mode_default: bool = _get_bool("DEVELOPER_MODE_DEFAULT", "false")
@@ -58,6 +82,50 @@ class Settings:
     # Overrides persistence
     overrides_path: str = os.getenv("OVERRIDES_PATH", "data/config/settings.json")
 
+    # Token usage ledger and per-user daily budgets (0 = no budget; admins are exempt).
+    # Over budget, USAGE_BUDGET_ACTION "downgrade" switches to USAGE_BUDGET_FALLBACK_MODEL (which must be
+    # cheaper than OPENAI_MODEL, or the turn is refused), "refuse" declines the turn.
+    usage_path: str = os.getenv("USAGE_PATH", "data/usage.json")
+    usage_retention_days: int = int(os.getenv("USAGE_RETENTION_DAYS", "31"))
+    user_daily_token_budget: int = int(os.getenv("USER_DAILY_TOKEN_BUDGET", "0"))
+    user_daily_cost_budget_usd: float = float(os.getenv("USER_DAILY_COST_BUDGET_USD", "0"))
+    usage_budget_action: str = os.getenv("USAGE_BUDGET_ACTION", "downgrade").lower()
+    usage_budget_fallback_model: str = os.getenv("USAGE_BUDGET_FALLBACK_MODEL", "gpt-4.1-nano")
+
+    # Build the conversation engine and OpenAI/Twilio clients in the background once
+    # the app is serving (they are created lazily, so startup never waits on them)
+    startup_prewarm: bool = _get_bool("STARTUP_PREWARM", "true")
+
+    # Background system metrics sampler
+    metrics_sample_interval_sec: int = int(os.getenv("METRICS_SAMPLE_INTERVAL_SEC", "5"))
+    # Prometheus /metrics endpoint
+    metrics_enabled: bool = _get_bool("METRICS_ENABLED", "true")
+    # Per-turn tracing: slow (>= TRACE_SLOW_MS) and failed turns are always kept,
+    # others with probability TRACE_SAMPLE_RATE; logs/traces.jsonl rolls over at TRACE_MAX_BYTES
+    trace_enabled: bool = _get_bool("TRACE_ENABLED", "true")
+    trace_sample_rate: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    trace_slow_ms: int = int(os.getenv("TRACE_SLOW_MS", "5000"))
+    trace_max_bytes: int = int(os.getenv("TRACE_MAX_BYTES", "5000000"))
+    # Event loop lag monitor: heartbeat interval, and the blocking time after which
+    # the loop thread's stack is captured as a stall
+    loop_monitor_enabled: bool = _get_bool("LOOP_MONITOR_ENABLED", "true")
+    loop_lag_interval_ms: int = int(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+    loop_stall_threshold_ms: int = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "250"))
+    # Opt-in recording of anonymized traffic (inbound messages plus the OpenAI and
+    # tool responses they caused) to logs/traffic.jsonl.gz for benchmarks/replay.py.
+    # TRAFFIC_RECORD_SALT keeps sender pseudonyms stable across restarts.
+    traffic_record_enabled: bool = _get_bool("TRAFFIC_RECORD_ENABLED", "false")
+    traffic_record_max_bytes: int = int(os.getenv("TRAFFIC_RECORD_MAX_BYTES", "50000000"))
+    traffic_record_salt: str = os.getenv("TRAFFIC_RECORD_SALT", "")
+    # On-demand sampling profiler (admin System tab): longest allowed run
+    profiler_max_seconds: int = int(os.getenv("PROFILER_MAX_SECONDS", "60"))
+
+    # Logging pipeline: file format and the bounded queue in front of the writer thread
+    log_format: str = os.getenv("LOG_FORMAT", "json").lower()
+    log_queue_size: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    log_queue_policy: str = os.getenv("LOG_QUEUE_POLICY", "drop").lower()
+    log_queue_block_ms: int = int(os.getenv("LOG_QUEUE_BLOCK_MS", "50"))
+
     # Filesystem
     logs_dir: str = os.getenv("LOGS_DIR", "logs")
     config_dir: str = os.getenv("CONFIG_DIR", "data/config")
@@ -66,6 +134,13 @@ class Settings:
     enabled_tools: List[str] = tuple(
         t.strip() for t in os.getenv("ENABLED_TOOLS", "*").split(",") if t.strip()
     )
+    # Budget for one tool result in the model context (about 4 chars per token)
+    tool_output_max_tokens: int = int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "1000"))
+    # Seconds a call waits for a free slot in a tool's bulkhead before being rejected
+    tool_queue_wait_sec: float = float(os.getenv("TOOL_QUEUE_WAIT_SEC", "0.5"))
+    # Tool result cache (per-tool policies in conversation/tool_cache.py)
+    tool_cache_enabled: bool = _get_bool("TOOL_CACHE_ENABLED", "true")
+    tool_cache_max_entries: int = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "256"))
 
 
 settings = Settings()
@@ -97,6 +172,11 @@ EDITABLE_FIELDS = {
     "OPENAI_MAX_TOKENS": ("openai_max_tokens", int),
     # Tools
     "ENABLED_TOOLS": ("enabled_tools", list),
+    # Usage budgets
+    "USER_DAILY_TOKEN_BUDGET": ("user_daily_token_budget", int),
+    "USER_DAILY_COST_BUDGET_USD": ("user_daily_cost_budget_usd", float),
+    "USAGE_BUDGET_ACTION": ("usage_budget_action", str),
+    "USAGE_BUDGET_FALLBACK_MODEL": ("usage_budget_fallback_model", str),
 }
 
 
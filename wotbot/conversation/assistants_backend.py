@@ -1,13 +1,18 @@
-import json
 import logging
 import time
-from typing import Any, Dict, Optional
-
-from openai import OpenAI
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 from ..config import settings
+from ..metrics import openai_seconds, timed
 from ..tools.schemas import tool_schemas
+from ..utils.tool_output import compact_tool_result
+from .openai_client import shared_openai
 from .tool_router import ToolRouter
+from .usage import ledger as usage_ledger
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 
 log = logging.getLogger(__name__)
@@ -15,23 +20,27 @@ log = logging.getLogger(__name__)
 
 class AssistantsBackend:
     def __init__(self):
-        self.client = OpenAI()
         self._assistant_id: Optional[str] = settings.openai_assistant_id or None
         self.tools = ToolRouter()
 
+    @property
+    def client(self) -> "OpenAI":
+        return shared_openai()
+
     def _ensure_assistant(self) -> str:
         if self._assistant_id:
             return self._assistant_id
         # Create an assistant with current tool schemas
-        asst = self.client.beta.assistants.create(
-            model=settings.openai_model,
-            name="WotBot",
-            instructions=(
-                "You are WotBot, a WhatsApp assistant. Keep replies concise and mobile-friendly. "
-                "Use provided functions for code, HTTP, MCP, and system info."
-            ),
-            tools=[{"type": "function", "function": t["function"]} for t in tool_schemas()],
-        )
+        with timed(openai_seconds, "assistants", "assistants.create"):
+            asst = self.client.beta.assistants.create(
+                model=settings.openai_model,
+                name="WotBot",
+                instructions=(
+                    "You are WotBot, a WhatsApp assistant. Keep replies concise and mobile-friendly. "
+                    "Use provided functions for code, HTTP, MCP, and system info."
+                ),
+                tools=[{"type": "function", "function": t["function"]} for t in tool_schemas()],
+            )
         self._assistant_id = asst.id
         log.info("Created assistant %s", asst.id)
         return asst.id
@@ -44,31 +53,38 @@ class AssistantsBackend:
             self._threads = {}
         if user_id in self._threads:
             return self._threads[user_id]
-        th = self.client.beta.threads.create()
+        with timed(openai_seconds, "assistants", "threads.create"):
+            th = self.client.beta.threads.create()
         self._threads[user_id] = th.id
         return th.id
 
-    def complete(self, user_id: str, user_text: str, system_prompt: Optional[str] = None) -> str:
+    def complete(self, user_id: str, user_text: str, system_prompt: Optional[str] = None, model: Optional[str] = None) -> str:
+        """Run one turn on the user's thread; ``model`` overrides the assistant's model for this run."""
         asst_id = self._ensure_assistant()
         thread_id = self._get_or_create_thread(user_id)
 
         # Add user message to thread
-        self.client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=user_text,
-        )
+        with timed(openai_seconds, "assistants", "messages.create"):
+            self.client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=user_text,
+            )
 
         # Start run, optionally override instructions
-        run = self.client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=asst_id,
-            instructions=system_prompt or None,
-        )
+        with timed(openai_seconds, "assistants", "runs.create"):
+            run = self.client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=asst_id,
+                instructions=system_prompt or None,
+                **({"model": model} if model else {}),
+            )
 
         # Poll run until completion, handling tool calls
+        turn_id = uuid.uuid4().hex
         while True:
-            run = self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+            with timed(openai_seconds, "assistants", "runs.retrieve"):
+                run = self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
             status = run.status
             if status == "requires_action":
                 tool_calls = run.required_action.submit_tool_outputs.tool_calls
@@ -77,17 +93,20 @@ class AssistantsBackend:
                     name = call.function.name
                     args = call.function.arguments
                     log.info("Assistants requested tool: %s", name)
-                    result = self.tools.call(name, args)
-                    outputs.append({"tool_call_id": call.id, "output": json.dumps(result)})
-                self.client.beta.threads.runs.submit_tool_outputs(
-                    thread_id=thread_id,
-                    run_id=run.id,
-                    tool_outputs=outputs,
-                )
+                    result = self.tools.call(name, args, user_id=user_id, turn_id=turn_id)
+                    outputs.append({"tool_call_id": call.id, "output": compact_tool_result(result)})
+                with timed(openai_seconds, "assistants", "runs.submit_tool_outputs"):
+                    self.client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id,
+                        run_id=run.id,
+                        tool_outputs=outputs,
+                    )
                 continue
             if status in {"queued", "in_progress", "cancelling"}:
                 time.sleep(0.5)
                 continue
+            # Terminal: usage covers every step of the run
+            usage_ledger.record(user_id, getattr(run, "model", None) or model or settings.openai_model, "assistants", getattr(run, "usage", None))
             if status == "completed":
                 break
             # failed/cancelled/expired
@@ -95,7 +114,8 @@ class AssistantsBackend:
             break
 
         # Fetch the latest assistant message in this run
-        msgs = self.client.beta.threads.messages.list(thread_id=thread_id, order="desc", limit=10)
+        with timed(openai_seconds, "assistants", "messages.list"):
+            msgs = self.client.beta.threads.messages.list(thread_id=thread_id, order="desc", limit=10)
         text_out = ""
         for m in msgs.data:
             if m.role == "assistant" and m.run_id == run.id:
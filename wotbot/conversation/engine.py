@@ -1,14 +1,18 @@
 import logging
+import uuid
 from typing import List, Dict, Any
 
 from ..config import settings
+from .. import tracing
 from ..utils.text_splitter import split_for_whatsapp
 from .session_store import SessionStore
 from .openai_client import OpenAIClient
 from .tool_router import ToolRouter
 from ..tools.schemas import tool_schemas
 from ..tools import system_tools
+from ..utils.tool_output import compact_tool_result
 from .assistants_backend import AssistantsBackend
+from .usage import ledger as usage_ledger
 
 
 log = logging.getLogger(__name__)
@@ -32,7 +36,9 @@ class ConversationEngine:
             ]
         if lower == "/status":
             s = system_tools.get_system_status()
-            return [f"Status: CPU {s.get('cpu_percent')}%, RAM {s.get('memory',{}).get('percent')}%, Disk {s.get('disk',{}).get('percent')}%"]
+            cpu_5m = ((s.get("trends") or {}).get("5m") or {}).get("cpu_percent") or {}
+            trend = f" (5m avg {cpu_5m['avg']}%)" if cpu_5m else ""
+            return [f"Status: CPU {s.get('cpu_percent')}%{trend}, RAM {s.get('memory',{}).get('percent')}%, Disk {s.get('disk',{}).get('percent')}%"]
         if lower == "/tools":
             names = [t["function"]["name"] for t in tool_schemas()]
             return ["Tools available: " + ", ".join(names)]
@@ -81,6 +87,12 @@ class ConversationEngine:
         if first_text.strip().startswith("/"):
             return self.handle_command(user_id, first_text)
 
+        # Per-user daily budget: may downgrade the model or refuse the turn
+        model = usage_ledger.model_for(user_id, settings.openai_model)
+        if model is None:
+            return ["You've reached today's usage limit. Please try again tomorrow."]
+        model_override = model if model != settings.openai_model else None
+
         # Build system prompt
         system_prompt = settings.assistant_instructions or (
             "You are WotBot, a WhatsApp assistant. Keep replies concise, mobile-friendly. "
@@ -88,6 +100,8 @@ class ConversationEngine:
         )
         if self.sessions.get_developer_mode(user_id):
             system_prompt += " Developer mode is ON: you may provide more technical details."
+        # Identical idempotent tool calls within this turn are served once
+        turn_id = uuid.uuid4().hex
 
         # Assemble messages
         history = self.sessions.get(user_id).messages
@@ -104,7 +118,8 @@ class ConversationEngine:
         # Choose backend
         if settings.openai_use_assistants:
             # Assistants backend expects plain text; pass the first text part
-            content = self.assistants.complete(user_id, first_text or "", system_prompt)
+            with tracing.span("openai.assistants"):
+                content = self.assistants.complete(user_id, first_text or "", system_prompt, model=model_override)
             content = content or "(no content)"
             self.sessions.append(user_id, "assistant", content)
             return split_for_whatsapp(content)
@@ -114,7 +129,10 @@ class ConversationEngine:
             # Prefer Responses API if enabled; fallback to Chat on error/unavailability
             if getattr(settings, 'openai_use_responses', False):
                 try:
-                    content = self.openai.responses_complete_text(messages, tools)
+                    with tracing.span("openai.responses"):
+                        content = self.openai.responses_complete_text(
+                            messages, tools, user_id=user_id, turn_id=turn_id, model=model
+                        )
                     self.sessions.append(user_id, "assistant", content)
                     return split_for_whatsapp(content)
                 except Exception as e:
@@ -122,52 +140,46 @@ class ConversationEngine:
 
             max_tool_iters = 4
             tool_messages: List[Dict[str, Any]] = []
-            for _ in range(max_tool_iters):
-                resp = self.openai.chat_with_tools(messages + tool_messages, tools)
-                choice = resp.choices[0].message
-
-                if getattr(choice, "tool_calls", None):
-                    # Include the assistant message with tool calls
-                    tool_messages.append({
-                        "role": "assistant",
-                        "content": choice.content or "",
-                        "tool_calls": [
-                            {
-                                "id": call.id,
-                                "type": "function",
-                                "function": {"name": call.function.name, "arguments": call.function.arguments},
-                            }
-                            for call in choice.tool_calls
-                        ],
-                    })
-                    for call in choice.tool_calls:
-                        name = call.function.name
-                        args = call.function.arguments
-                        log.info("Model requested tool: %s", name)
-                        result = self.tools.call(name, args)
-                        # Append tool result message
+            for round_no in range(max_tool_iters):
+                # One span per model round trip plus the tool calls it requested
+                with tracing.span("tool_round", round=round_no):
+                    with tracing.span("openai.chat"):
+                        resp = self.openai.chat_with_tools(messages + tool_messages, tools, model=model, user_id=user_id)
+                    choice = resp.choices[0].message
+
+                    if getattr(choice, "tool_calls", None):
+                        # Include the assistant message with tool calls
                         tool_messages.append({
-                            "role": "tool",
-                            "tool_call_id": call.id,
-                            "content": json_dumps_safe(result)[:4000],
+                            "role": "assistant",
+                            "content": choice.content or "",
+                            "tool_calls": [
+                                {
+                                    "id": call.id,
+                                    "type": "function",
+                                    "function": {"name": call.function.name, "arguments": call.function.arguments},
+                                }
+                                for call in choice.tool_calls
+                            ],
                         })
-                    # continue loop with appended tool_messages
-                    continue
-                else:
-                    content = choice.content or "(no content)"
-                    self.sessions.append(user_id, "assistant", content)
-                    return split_for_whatsapp(content)
+                        for call in choice.tool_calls:
+                            name = call.function.name
+                            args = call.function.arguments
+                            log.info("Model requested tool: %s", name)
+                            result = self.tools.call(name, args, user_id=user_id, turn_id=turn_id)
+                            # Append tool result message
+                            tool_messages.append({
+                                "role": "tool",
+                                "tool_call_id": call.id,
+                                "content": compact_tool_result(result),
+                            })
+                        # continue loop with appended tool_messages
+                        continue
+                    else:
+                        content = choice.content or "(no content)"
+                        self.sessions.append(user_id, "assistant", content)
+                        return split_for_whatsapp(content)
 
             # If loop ends without content
             fallback = "I executed tools but didn't get a final message. Please try again."
             self.sessions.append(user_id, "assistant", fallback)
             return [fallback]
-
-
-def json_dumps_safe(obj: Any) -> str:
-    try:
-        import json
-
-        return json.dumps(obj, ensure_ascii=False)
-    except Exception:
-        return str(obj)
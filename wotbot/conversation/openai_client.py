@@ -1,43 +1,110 @@
 import logging
-from typing import Any, Dict, List
-from openai import OpenAI
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 from ..config import settings
+from .. import traffic
+from ..metrics import openai_seconds, timed
+from .usage import extract_usage, ledger as usage_ledger
+from ..utils.lazy import Lazy
+from ..utils.tool_output import compact_tool_result
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 
 log = logging.getLogger(__name__)
 
 
+def _new_openai() -> "OpenAI":
+    # The SDK takes about half a second to import; keep it off the startup path
+    from openai import OpenAI
+
+    # Normally None (the SDK's own client); records or replays traffic when enabled
+    return OpenAI(http_client=traffic.openai_http_client())
+
+
+_openai: "Lazy[OpenAI]" = Lazy(_new_openai)
+
+
+def shared_openai() -> "OpenAI":
+    """The process-wide OpenAI client (thread-safe; one connection pool for every caller)."""
+    return _openai.get()
+
+
 class OpenAIClient:
     def __init__(self):
-        self.client = OpenAI()
         self.model = settings.openai_model
 
-    def chat_with_tools(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]]):
+    @property
+    def client(self) -> "OpenAI":
+        return shared_openai()
+
+    def chat_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        model: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ):
         """
         Uses Chat Completions with function/tool calling. Returns the raw response dict.
+        ``model`` overrides the configured model (e.g. a budget downgrade).
         """
+        model = model or self.model
         log.debug("Calling OpenAI Chat Completions with tools: %s", [t.get("function", {}).get("name") for t in tools])
-        resp = self.client.chat.completions.create(
-            model=self.model,
-            temperature=getattr(settings, 'openai_temperature', 0.3),
-            messages=messages,
-            tools=tools,
-            tool_choice="auto",
-            max_tokens=(getattr(settings, 'openai_max_tokens', 0) or None),
-        )
+        with timed(openai_seconds, "chat", "completions.create"):
+            resp = self.client.chat.completions.create(
+                model=model,
+                temperature=getattr(settings, 'openai_temperature', 0.3),
+                messages=messages,
+                tools=tools,
+                tool_choice="auto",
+                max_tokens=(getattr(settings, 'openai_max_tokens', 0) or None),
+            )
+        usage_ledger.record(user_id, getattr(resp, "model", None) or model, "chat", getattr(resp, "usage", None))
         return resp
 
-    def responses_complete_text(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]]) -> str:
+    def responses_complete_text(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        user_id: Optional[str] = None,
+        turn_id: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> str:
         """
         Call the Responses API with tools and return the final output text.
         Handles requires_action by executing tool calls and submitting outputs.
         """
         if not hasattr(self.client, "responses"):
             raise RuntimeError("Responses API not available in this OpenAI SDK")
+        turn_id = turn_id or uuid.uuid4().hex
+        model = model or self.model
+        # A response's usage is cumulative and grows as it is continued
+        # (submit_tool_outputs, retrieve), so record only what is new per id
+        recorded: Dict[str, Tuple[int, int, int]] = {}
+
+        def record(r: Any) -> None:
+            rid = _get(r, ["id"])
+            usage = extract_usage(_get(r, ["usage"]))
+            if usage is None:
+                return
+            prev = recorded.get(rid, (0, 0, 0))
+            delta = [max(0, now - before) for now, before in zip(usage, prev)]
+            recorded[rid] = tuple(max(now, before) for now, before in zip(usage, prev))  # type: ignore[assignment]
+            if not any(delta):
+                return
+            usage_ledger.record(user_id, _get(r, ["model"]) or model, "responses", {
+                "prompt_tokens": delta[0],
+                "completion_tokens": delta[1],
+                "prompt_tokens_details": {"cached_tokens": delta[2]},
+            })
 
         formatted_input = _format_responses_input(messages)
         log.debug("Calling OpenAI Responses with tools: %s", [t.get("function", {}).get("name") for t in tools])
-        resp = self.client.responses.create(model=self.model, input=formatted_input, tools=tools)
+        with timed(openai_seconds, "responses", "create"):
+            resp = self.client.responses.create(model=model, input=formatted_input, tools=tools)
+        record(resp)
 
         # Tool-calling loop
         while getattr(resp, "status", None) == "requires_action":
@@ -46,21 +113,25 @@ class OpenAIClient:
             for call in tool_calls:
                 name = _get(call, ["function", "name"]) or ""
                 args = _get(call, ["function", "arguments"]) or "{}"
-                result = self._execute_tool(name, args)
-                outputs.append({"tool_call_id": _get(call, ["id"]) or "", "output": _json_dumps(result)})
-            resp = self.client.responses.submit_tool_outputs(response_id=_get(resp, ["id"]) or getattr(resp, "id"), tool_outputs=outputs)
+                result = self._execute_tool(name, args, user_id, turn_id)
+                outputs.append({"tool_call_id": _get(call, ["id"]) or "", "output": compact_tool_result(result)})
+            with timed(openai_seconds, "responses", "submit_tool_outputs"):
+                resp = self.client.responses.submit_tool_outputs(response_id=_get(resp, ["id"]) or getattr(resp, "id"), tool_outputs=outputs)
+            record(resp)
             # retrieve until completed
             status = getattr(resp, "status", None)
             if status in {"queued", "in_progress", "requires_action"}:
-                resp = self.client.responses.retrieve(_get(resp, ["id"]) or getattr(resp, "id"))
+                with timed(openai_seconds, "responses", "retrieve"):
+                    resp = self.client.responses.retrieve(_get(resp, ["id"]) or getattr(resp, "id"))
+                record(resp)
 
         text = _output_text(resp)
         return text or "(no content)"
 
-    def _execute_tool(self, name: str, args_json: str) -> Dict[str, Any]:
+    def _execute_tool(self, name: str, args_json: str, user_id: Optional[str] = None, turn_id: Optional[str] = None) -> Dict[str, Any]:
         from .tool_router import ToolRouter
         router = ToolRouter()
-        return router.call(name, args_json)
+        return router.call(name, args_json, user_id=user_id, turn_id=turn_id)
 
 
 def _format_responses_input(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -0,0 +1,114 @@
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ToolPolicy:
+    """
+    Caching policy for one tool. ``ttl_sec`` > 0 shares results across turns
+    for that long; 0 only deduplicates identical calls within a turn.
+    ``key_fields`` limits which arguments form the cache key (None = all), and
+    ``idempotent`` can reject specific calls (e.g. non-GET HTTP requests).
+    """
+
+    cacheable: bool = False
+    ttl_sec: float = 0.0
+    key_fields: Optional[Tuple[str, ...]] = None
+    idempotent: Optional[Callable[[Dict[str, Any]], bool]] = None
+
+    def allows(self, args: Dict[str, Any]) -> bool:
+        return self.cacheable and (self.idempotent is None or bool(self.idempotent(args)))
+
+
+def _is_get(args: Dict[str, Any]) -> bool:
+    return str(args.get("method") or "GET").upper() == "GET"
+
+
+def _all_get(args: Dict[str, Any]) -> bool:
+    reqs = args.get("requests")
+    return isinstance(reqs, list) and all(isinstance(r, dict) and _is_get(r) for r in reqs)
+
+
+# Tools not listed here (run_code, mcp_call, native MCP tools, restart_self, ...)
+# are never cached.
+POLICIES: Dict[str, ToolPolicy] = {
+    "get_system_status": ToolPolicy(cacheable=True, ttl_sec=5),
+    "read_log": ToolPolicy(
+        cacheable=True,
+        ttl_sec=5,
+        key_fields=("path", "lines", "contains", "level", "rotated", "since_minutes", "user", "logger", "cursor"),
+    ),
+    "read_config": ToolPolicy(cacheable=True, ttl_sec=30, key_fields=("path",)),
+    # HTTP has its own RFC 9111 cache; here only repeated GETs within a turn are folded
+    "http_request": ToolPolicy(cacheable=True, idempotent=_is_get),
+    "http_batch": ToolPolicy(cacheable=True, idempotent=_all_get),
+}
+
+
+class ToolResultCache:
+    """
+    Bounded LRU of successful tool results. Keys are the tool name plus its
+    canonicalized key arguments; turn-scoped entries also carry the turn id so
+    they are never shared with another conversation turn. Results are copied
+    on the way in and out, so callers may mutate what they get.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(0, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def key(self, name: str, args: Dict[str, Any], policy: ToolPolicy, turn_id: Optional[str]) -> Optional[str]:
+        if policy.key_fields is not None:
+            args = {k: args.get(k) for k in policy.key_fields}
+        try:
+            canon = json.dumps(args, sort_keys=True, separators=(",", ":"), default=str)
+        except Exception:
+            return None
+        if policy.ttl_sec > 0:
+            return f"{name}|{canon}"
+        if not turn_id:
+            return None
+        return f"{name}|turn={turn_id}|{canon}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._entries[key]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            result = item[1]
+        return copy.deepcopy(result)
+
+    def put(self, key: str, result: Dict[str, Any], ttl_sec: float) -> None:
+        if self.max_entries <= 0:
+            return
+        # Turn-scoped entries only need to outlive one tool loop
+        expires = time.time() + (ttl_sec if ttl_sec > 0 else 300)
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._entries[key] = (expires, result)
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"ok": True, "entries": len(self._entries), "max_entries": self.max_entries, **self._stats}
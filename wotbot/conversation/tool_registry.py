@@ -0,0 +1,129 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from ..config import settings
+
+log = logging.getLogger(__name__)
+
+
+Handler = Callable[[Dict[str, Any], Optional[str]], Dict[str, Any]]
+
+
+@dataclass
+class ToolSpec:
+    """
+    A tool handler plus the limits the router enforces around it.
+
+    ``max_concurrency`` is the bulkhead: calls beyond it wait up to
+    TOOL_QUEUE_WAIT_SEC for a slot and are then rejected. ``timeout`` returns
+    the wall-clock budget in seconds (read per call so runtime config
+    overrides apply). ``executor`` names the pool the handler runs on;
+    "inline" runs on the caller's thread without a timeout.
+    """
+
+    name: str
+    handler: Handler
+    max_concurrency: int = 4
+    timeout: Callable[[], float] = lambda: 30.0
+    executor: str = "io"
+    _slots: threading.BoundedSemaphore = field(init=False, repr=False)
+    _stats: Dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._slots = threading.BoundedSemaphore(max(1, self.max_concurrency))
+        self._stats = {"calls": 0, "in_flight": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+
+
+class ToolRegistry:
+    """
+    Named tool specs and the executor pools they run on. Each pool is sized to
+    the sum of the bulkheads assigned to it, so a call that got a slot never
+    queues behind another tool's stuck calls; a call that times out keeps its
+    slot until the handler actually returns.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._specs: Dict[str, ToolSpec] = {}
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+
+    def register(self, spec: ToolSpec) -> ToolSpec:
+        with self._lock:
+            if self._pools.get(spec.executor) is not None:
+                raise RuntimeError(f"Executor '{spec.executor}' already started; register tools before first use")
+            self._specs[spec.name] = spec
+        return spec
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._specs.get(name)
+
+    def names(self):
+        return list(self._specs)
+
+    def run(self, spec: ToolSpec, args: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+        if not spec._slots.acquire(timeout=settings.tool_queue_wait_sec):
+            self._bump(spec, "rejected")
+            log.warning("Tool '%s' rejected: %d call(s) already in flight", spec.name, spec.max_concurrency)
+            return {
+                "ok": False,
+                "error": f"Tool '{spec.name}' is busy ({spec.max_concurrency} call(s) in flight); try again shortly",
+                "retryable": True,
+            }
+        self._bump(spec, "calls", "in_flight")
+        if spec.executor == "inline":
+            try:
+                return self._invoke(spec, args, user_id)
+            finally:
+                self._release(spec)
+
+        # Carry context (e.g. the user tag on log records) into the pool thread
+        ctx = contextvars.copy_context()
+        fut: Future = self._pool(spec.executor).submit(ctx.run, self._invoke, spec, args, user_id)
+        fut.add_done_callback(lambda _: self._release(spec))
+        timeout = spec.timeout()
+        try:
+            return fut.result(timeout=timeout)
+        except FutureTimeout:
+            self._bump(spec, "timeouts")
+            log.warning("Tool '%s' timed out after %ss", spec.name, timeout)
+            return {"ok": False, "error": f"Tool '{spec.name}' timed out after {timeout:g}s", "retryable": True}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tools = {
+                name: {"max_concurrency": s.max_concurrency, "timeout_sec": s.timeout(), "executor": s.executor, **s._stats}
+                for name, s in self._specs.items()
+            }
+        return {"ok": True, "tools": tools}
+
+    # Internals
+
+    def _invoke(self, spec: ToolSpec, args: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+        try:
+            return spec.handler(args, user_id)
+        except Exception as e:
+            self._bump(spec, "errors")
+            log.exception("Tool '%s' raised error", spec.name)
+            return {"ok": False, "error": str(e)}
+
+    def _release(self, spec: ToolSpec) -> None:
+        with self._lock:
+            spec._stats["in_flight"] -= 1
+        spec._slots.release()
+
+    def _bump(self, spec: ToolSpec, *names: str) -> None:
+        with self._lock:
+            for name in names:
+                spec._stats[name] += 1
+
+    def _pool(self, name: str) -> ThreadPoolExecutor:
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                workers = sum(s.max_concurrency for s in self._specs.values() if s.executor == name)
+                pool = self._pools[name] = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"tool-{name}")
+            return pool
@@ -1,50 +1,151 @@
 import json
 import logging
-from typing import Any, Dict
+from time import perf_counter
+from typing import Any, Dict, Optional
 
+from ..config import settings
+from ..metrics import tool_seconds
+from .. import tracing, traffic
 from ..tools import code_runner, http_client, mcp_client, system_tools
+from ..tools.mcp_catalog import catalog as mcp_catalog
+from .tool_cache import POLICIES, ToolResultCache
+from .tool_registry import ToolRegistry, ToolSpec
 
 log = logging.getLogger(__name__)
 
+# Shared by every router instance (chat, responses and assistants backends)
+result_cache = ToolResultCache(settings.tool_cache_max_entries)
+
 
 class ToolRouter:
     def __init__(self):
-        pass
+        self.cache = result_cache
+        self.registry = registry
 
-    def call(self, name: str, arguments_json: str) -> Dict[str, Any]:
+    def call(
+        self,
+        name: str,
+        arguments_json: str,
+        user_id: Optional[str] = None,
+        turn_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
         try:
             args = json.loads(arguments_json or "{}")
         except Exception as e:
             return {"ok": False, "error": f"Invalid JSON args: {e}"}
+        if not isinstance(args, dict):
+            return {"ok": False, "error": "Invalid JSON args: expected an object"}
 
-        try:
-            if name == "run_code":
-                return code_runner.run_code(args.get("language"), args.get("code", ""))
-            if name == "http_request":
-                return http_client.http_request(
-                    method=args.get("method", "GET"),
-                    url=args.get("url", ""),
-                    headers=args.get("headers"),
-                    params=args.get("params"),
-                    body=args.get("body"),
-                )
-            if name == "mcp_call":
-                return mcp_client.mcp_call(
-                    server=args.get("server", "0"),
-                    tool=args.get("tool", ""),
-                    arguments=args.get("arguments") or {},
-                )
-            if name == "get_system_status":
-                return system_tools.get_system_status()
-            if name == "read_log":
-                return system_tools.read_log(args.get("path", "app.log"), int(args.get("lines", 200)))
-            if name == "read_config":
-                return system_tools.read_config(args.get("path", ""))
-            if name == "restart_self":
-                return system_tools.restart_self()
-        except Exception as e:
-            log.exception("Tool '%s' raised error", name)
-            return {"ok": False, "error": str(e)}
+        with tracing.span("tool", tool=name) as span:
+            result = self._call(name, args, user_id, turn_id, span)
+            if span is not None and not (isinstance(result, dict) and result.get("ok")):
+                span.set("error", str((result or {}).get("error", ""))[:300])
+                span.status = "error"
+            return result
+
+    def _call(
+        self,
+        name: str,
+        args: Dict[str, Any],
+        user_id: Optional[str],
+        turn_id: Optional[str],
+        span: Optional[tracing.Span],
+    ) -> Dict[str, Any]:
+        started = perf_counter()
+        policy = POLICIES.get(name)
+        key = None
+        if settings.tool_cache_enabled and policy is not None and policy.allows(args):
+            key = self.cache.key(name, args, policy, turn_id)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                log.info("Tool '%s' served from result cache", name)
+                if span is not None:
+                    span.set("cached", True)
+                tool_seconds.labels(name, "cached").observe(perf_counter() - started)
+                return cached
+        result = traffic.replay_tool(name, args)
+        if result is None:
+            dispatched = perf_counter()
+            result = self._dispatch(name, args, user_id)
+            traffic.record_tool(name, args, result, perf_counter() - dispatched)
+        ok = isinstance(result, dict) and bool(result.get("ok"))
+        if key is not None and ok:
+            self.cache.put(key, result, policy.ttl_sec)
+        # Unknown names come from the model; keep them out of the label set
+        label = name if self.registry.get(name) or mcp_catalog.resolve(name) else "unknown"
+        tool_seconds.labels(label, "ok" if ok else "error").observe(perf_counter() - started)
+        return result
+
+    def _dispatch(self, name: str, args: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+        spec = self.registry.get(name)
+        if spec is None:
+            target = mcp_catalog.resolve(name)
+            if target is None:
+                return {"ok": False, "error": f"Unknown tool: {name}"}
+            # Native MCP tools share the mcp_call bulkhead and timeout
+            spec = self.registry.get("mcp_call")
+            args = {"server": target[0], "tool": target[1], "arguments": args}
+        return self.registry.run(spec, args, user_id)
+
+
+def _run_code(args: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+    return code_runner.run_code(args.get("language"), args.get("code", ""), user_id=user_id)
+
+
+def _http_request(args: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+    return http_client.http_request(
+        method=args.get("method", "GET"),
+        url=args.get("url", ""),
+        headers=args.get("headers"),
+        params=args.get("params"),
+        body=args.get("body"),
+        select=args.get("select"),
+        raw=bool(args.get("raw", False)),
+    )
+
+
+def _http_batch(args: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+    return http_client.http_batch(args.get("requests") or [])
+
+
+def _mcp_call(args: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+    return mcp_client.mcp_call(
+        server=args.get("server", "0"),
+        tool=args.get("tool", ""),
+        arguments=args.get("arguments") or {},
+    )
+
+
+def _read_log(args: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+    return system_tools.read_log(
+        args.get("path", "app.log"),
+        int(args.get("lines", 200)),
+        # Substring filter only: a model-supplied regex could backtrack
+        # catastrophically over every line (regex stays on the admin API)
+        contains=args.get("contains"),
+        level=args.get("level"),
+        rotated=bool(args.get("rotated", False)),
+        since_minutes=args.get("since_minutes"),
+        user=args.get("user"),
+        logger=args.get("logger"),
+        cursor=args.get("cursor"),
+    )
+
+
+def _build_registry() -> ToolRegistry:
+    reg = ToolRegistry()
+    # run_code already isolates in a subprocess; its own pool keeps sandbox runs
+    # from competing with network-bound tools for threads
+    reg.register(ToolSpec("run_code", _run_code, 2, lambda: settings.code_exec_timeout_sec + 5, "sandbox"))
+    reg.register(ToolSpec("http_request", _http_request, 8, lambda: settings.http_timeout_sec * 2 + 5))
+    reg.register(ToolSpec("http_batch", _http_batch, 2, lambda: settings.http_batch_timeout_sec + 5))
+    reg.register(ToolSpec("mcp_call", _mcp_call, 4, lambda: max(settings.http_timeout_sec, settings.mcp_exec_timeout_sec) + 5))
+    reg.register(ToolSpec("get_system_status", lambda a, u: system_tools.get_system_status(), 2, lambda: 10))
+    reg.register(ToolSpec("read_log", _read_log, 4, lambda: 10))
+    reg.register(ToolSpec("read_config", lambda a, u: system_tools.read_config(a.get("path", "")), 4, lambda: 10))
+    reg.register(ToolSpec("restart_self", lambda a, u: system_tools.restart_self(), 1, executor="inline"))
+    return reg
 
-        return {"ok": False, "error": f"Unknown tool: {name}"}
 
+registry = _build_registry()
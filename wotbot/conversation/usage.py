@@ -0,0 +1,322 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+from .. import metrics, tracing
+
+log = logging.getLogger(__name__)
+
+
+# USD per 1M tokens: (input, output, cached input). Longest prefix wins, so
+# dated snapshots (gpt-4o-mini-2024-07-18) use their family's price.
+# OPENAI_PRICES='{"my-model": [1.0, 4.0, 0.5]}' adds or overrides entries.
+DEFAULT_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4.1-nano": (0.10, 0.40, 0.025),
+    "gpt-4.1-mini": (0.40, 1.60, 0.10),
+    "gpt-4.1": (2.00, 8.00, 0.50),
+    "o4-mini": (1.10, 4.40, 0.275),
+    "o3-mini": (1.10, 4.40, 0.55),
+}
+
+# Per-key counters, in array order
+FIELDS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd")
+_CALLS, _PROMPT, _COMPLETION, _CACHED, _COST = range(len(FIELDS))
+
+Key = Tuple[str, str, str, str]  # (day, user, model, backend)
+
+_tokens_total = metrics.registry.register(
+    metrics.Counter("wotbot_openai_tokens_total", "OpenAI tokens by backend, model and kind (prompt, completion, cached).", ("backend", "model", "kind"))
+)
+_cost_total = metrics.registry.register(
+    metrics.Counter("wotbot_openai_cost_usd_total", "Estimated OpenAI spend in USD by backend and model.", ("backend", "model"))
+)
+
+_price_cache: Tuple[Optional[str], Dict[str, Tuple[float, float, float]]] = (None, DEFAULT_PRICES)
+
+
+def prices() -> Dict[str, Tuple[float, float, float]]:
+    global _price_cache
+    raw = settings.openai_prices
+    if raw != _price_cache[0]:
+        table = dict(DEFAULT_PRICES)
+        try:
+            for model, p in (json.loads(raw) if raw else {}).items():
+                inp, out = float(p[0]), float(p[1])
+                table[model] = (inp, out, float(p[2]) if len(p) > 2 else inp)
+        except Exception as e:
+            log.warning("Ignoring invalid OPENAI_PRICES: %s", e)
+        _price_cache = (raw, table)
+    return _price_cache[1]
+
+
+def price_for(model: str) -> Optional[Tuple[float, float, float]]:
+    table = prices()
+    best = None
+    for name in table:
+        if model.startswith(name) and (best is None or len(name) > len(best)):
+            best = name
+    return table[best] if best else None
+
+
+def cost_usd(model: str, prompt: int, completion: int, cached: int) -> float:
+    p = price_for(model)
+    if p is None:
+        return 0.0
+    return ((prompt - cached) * p[0] + cached * p[2] + completion * p[1]) / 1_000_000
+
+
+def _cheaper(fallback: str, model: str) -> bool:
+    """Whether ``fallback`` is a different model with a lower price (blended input + output)."""
+    if not fallback or fallback == model:
+        return False
+    fp, mp = price_for(fallback), price_for(model)
+    if fp is None or mp is None:
+        # Unknown prices (custom or new models): trust the configured choice
+        return True
+    return fp[0] + fp[1] < mp[0] + mp[1]
+
+
+def _field(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def extract_usage(usage: Any) -> Optional[Tuple[int, int, int]]:
+    """(prompt, completion, cached) from a Chat, Responses or Assistants run ``usage`` object."""
+    if usage is None:
+        return None
+    prompt = _field(usage, "prompt_tokens")
+    if prompt is None:
+        prompt = _field(usage, "input_tokens")
+    completion = _field(usage, "completion_tokens")
+    if completion is None:
+        completion = _field(usage, "output_tokens")
+    if prompt is None and completion is None:
+        return None
+    details = (
+        _field(usage, "prompt_tokens_details")
+        or _field(usage, "input_tokens_details")
+        or _field(usage, "prompt_token_details")
+    )
+    cached = _field(details, "cached_tokens") or 0
+    return int(prompt or 0), int(completion or 0), int(cached)
+
+
+class UsageLedger:
+    """
+    Token and cost counters per (day, user, model, backend), each a small
+    array of FIELDS. A per-(day, user) total is kept alongside so budget
+    checks are a single dict lookup. Counters are persisted to USAGE_PATH
+    (at most every SAVE_INTERVAL_SEC and at exit) so daily budgets survive
+    restarts; days older than USAGE_RETENTION_DAYS are pruned.
+    """
+
+    SAVE_INTERVAL_SEC = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._counters: Dict[Key, array] = {}
+        self._user_day: Dict[Tuple[str, str], array] = {}  # (day, user) -> [tokens, cost]
+        self._dirty = False
+        self._last_save = 0.0
+        self._loaded = False
+        self._warned: set = set()
+
+    # Recording
+
+    def record(self, user_id: Optional[str], model: str, backend: str, usage: Any) -> Optional[Dict[str, Any]]:
+        parsed = extract_usage(usage)
+        if parsed is None:
+            return None
+        prompt, completion, cached = parsed
+        model = model or "unknown"
+        cost = cost_usd(model, prompt, completion, cached)
+        day = time.strftime("%Y-%m-%d")
+        user = user_id or "unknown"
+        with self._lock:
+            row = self._counters.get((day, user, model, backend))
+            if row is None:
+                row = self._counters[(day, user, model, backend)] = array("d", [0.0] * len(FIELDS))
+            row[_CALLS] += 1
+            row[_PROMPT] += prompt
+            row[_COMPLETION] += completion
+            row[_CACHED] += cached
+            row[_COST] += cost
+            total = self._user_day.get((day, user))
+            if total is None:
+                total = self._user_day[(day, user)] = array("d", [0.0, 0.0])
+            total[0] += prompt + completion
+            total[1] += cost
+            self._dirty = True
+            save = time.time() - self._last_save >= self.SAVE_INTERVAL_SEC
+            if save:
+                self._last_save = time.time()
+        _tokens_total.labels(backend, model, "prompt").inc(prompt)
+        _tokens_total.labels(backend, model, "completion").inc(completion)
+        _tokens_total.labels(backend, model, "cached").inc(cached)
+        _cost_total.labels(backend, model).inc(cost)
+        span = tracing.current_span.get()
+        if span is not None:
+            # A span may cover several API calls (e.g. Responses tool rounds); sum them
+            prev = span.attrs.get("tokens") or {}
+            span.set("model", model)
+            span.set("tokens", {
+                "prompt": prev.get("prompt", 0) + prompt,
+                "completion": prev.get("completion", 0) + completion,
+                "cached": prev.get("cached", 0) + cached,
+            })
+        if save:
+            self.save()
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "cached_tokens": cached, "cost_usd": cost}
+
+    # Budgets
+
+    def today(self, user_id: str) -> Tuple[int, float]:
+        with self._lock:
+            total = self._user_day.get((time.strftime("%Y-%m-%d"), user_id))
+        return (int(total[0]), total[1]) if total is not None else (0, 0.0)
+
+    def over_budget(self, user_id: str) -> bool:
+        if user_id in settings.admin_phone_numbers:
+            return False
+        tokens, cost = self.today(user_id)
+        token_budget = settings.user_daily_token_budget
+        cost_budget = settings.user_daily_cost_budget_usd
+        return bool((token_budget > 0 and tokens >= token_budget) or (cost_budget > 0 and cost >= cost_budget))
+
+    def model_for(self, user_id: str, model: str) -> Optional[str]:
+        """
+        Model to use for this user's next turn, or None if service is refused.
+        A downgrade needs a fallback model that is cheaper than ``model``;
+        otherwise over-budget turns are refused rather than served as before.
+        """
+        if not self.over_budget(user_id):
+            return model
+        if settings.usage_budget_action == "refuse":
+            log.info("Daily budget exceeded for %s; refusing", user_id)
+            return None
+        fallback = settings.usage_budget_fallback_model
+        if not _cheaper(fallback, model):
+            if (fallback, model) not in self._warned:
+                self._warned.add((fallback, model))
+                log.warning(
+                    "USAGE_BUDGET_FALLBACK_MODEL %r is not cheaper than %r; refusing over-budget turns instead",
+                    fallback, model,
+                )
+            return None
+        log.info("Daily budget exceeded for %s; using %s", user_id, fallback)
+        return fallback
+
+    # Reporting
+
+    def report(self, day: Optional[str] = None, user: Optional[str] = None, top_users: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._counters.items()]
+        days = sorted({k[0] for k, _ in items}, reverse=True)
+        day = day or time.strftime("%Y-%m-%d")
+        groups: Dict[str, Dict[str, list]] = {"user": {}, "model": {}, "backend": {}}
+        totals = [0.0] * len(FIELDS)
+        for (d, u, m, b), row in items:
+            if d != day or (user and u != user):
+                continue
+            for dim, name in (("user", u), ("model", m), ("backend", b)):
+                acc = groups[dim].setdefault(name, [0.0] * len(FIELDS))
+                for i, v in enumerate(row):
+                    acc[i] += v
+            for i, v in enumerate(row):
+                totals[i] += v
+
+        def fmt(row: list) -> Dict[str, Any]:
+            out = {f: int(row[i]) for i, f in enumerate(FIELDS) if f != "cost_usd"}
+            out["cost_usd"] = round(row[_COST], 6)
+            return out
+
+        ranked = sorted(groups["user"].items(), key=lambda kv: kv[1][_COST] or kv[1][_PROMPT] + kv[1][_COMPLETION], reverse=True)
+        return {
+            "ok": True,
+            "day": day,
+            "days": days,
+            "totals": fmt(totals),
+            "by_user": {u: fmt(r) for u, r in ranked[:top_users]},
+            "by_model": {m: fmt(r) for m, r in groups["model"].items()},
+            "by_backend": {b: fmt(r) for b, r in groups["backend"].items()},
+            "users_tracked": len(groups["user"]),
+            "budgets": {
+                "daily_tokens": settings.user_daily_token_budget,
+                "daily_cost_usd": settings.user_daily_cost_budget_usd,
+                "action": settings.usage_budget_action,
+                "fallback_model": settings.usage_budget_fallback_model,
+            },
+        }
+
+    # Persistence
+
+    def load(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            path = settings.usage_path
+            if not os.path.exists(path):
+                return
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    rows = json.load(f).get("rows", [])
+            except Exception as e:
+                log.warning("Could not load usage ledger %s: %s", path, e)
+                return
+            cutoff = time.strftime("%Y-%m-%d", time.localtime(time.time() - settings.usage_retention_days * 86400))
+            for r in rows:
+                try:
+                    day, user, model, backend = (str(x) for x in r[:4])
+                    values = array("d", (float(x) for x in r[4:4 + len(FIELDS)]))
+                except (TypeError, ValueError):
+                    continue
+                if day < cutoff or len(values) != len(FIELDS):
+                    continue
+                self._counters[(day, user, model, backend)] = values
+                total = self._user_day.setdefault((day, user), array("d", [0.0, 0.0]))
+                total[0] += values[_PROMPT] + values[_COMPLETION]
+                total[1] += values[_COST]
+            self._last_save = time.time()
+
+    def save(self) -> None:
+        cutoff = time.strftime("%Y-%m-%d", time.localtime(time.time() - settings.usage_retention_days * 86400))
+        with self._lock:
+            if not self._dirty:
+                return
+            for key in [k for k in self._counters if k[0] < cutoff]:
+                del self._counters[key]
+            for key in [k for k in self._user_day if k[0] < cutoff]:
+                del self._user_day[key]
+            rows = [list(k) + [round(v, 8) for v in row] for k, row in self._counters.items()]
+            self._dirty = False
+            self._last_save = time.time()
+        path = settings.usage_path
+        try:
+            with self._save_lock:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                tmp = path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"fields": FIELDS, "rows": rows}, f, separators=(",", ":"))
+                os.replace(tmp, path)
+        except OSError as e:
+            log.warning("Could not save usage ledger %s: %s", path, e)
+            with self._lock:
+                self._dirty = True
+
+
+ledger = UsageLedger()
+atexit.register(ledger.save)
@@ -1,10 +1,106 @@
+import atexit
+import copy
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+
 from .config import settings
 
+# WhatsApp sender being served by the current task; tagged onto log records so
+# the log index can find everything logged on behalf of one user.
+current_user: ContextVar[Optional[str]] = ContextVar("current_user", default=None)
+
+DATEFMT = "%Y-%m-%d %H:%M:%S"
+
+
+class UserTagFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        user = current_user.get()
+        record.user = user
+        record.user_tag = f" user={user}" if user else ""
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; the leading time/level/logger order is relied on by the log index."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "time": self.formatTime(record, DATEFMT),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "user", None):
+            out["user"] = record.user
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        if record.stack_info:
+            out["stack"] = record.stack_info
+        return json.dumps(out, ensure_ascii=False)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to the background listener without doing I/O. When the
+    queue is full, the "drop" policy discards the record at once and the
+    "block" policy waits up to LOG_QUEUE_BLOCK_MS before dropping; either way
+    drops are counted instead of raised.
+    """
+
+    def __init__(self, q: "queue.Queue", policy: str, block_sec: float):
+        super().__init__(q)
+        self.policy = policy
+        self.block_sec = block_sec
+        self.dropped = 0
+        self.blocked = 0
+        self._count_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args and render the traceback now (cheap, and the objects they
+        # reference may change before the listener gets to them); all other
+        # formatting happens on the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.policy == "block":
+            with self._count_lock:
+                self.blocked += 1
+            try:
+                self.queue.put(record, timeout=self.block_sec)
+                return
+            except queue.Full:
+                pass
+        with self._count_lock:
+            self.dropped += 1
+
+
+_handler: Optional[BoundedQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
 
 def configure_logging() -> None:
+    global _handler, _listener
+    if _listener is not None:
+        return
     os.makedirs(settings.logs_dir, exist_ok=True)
     log_path = os.path.join(settings.logs_dir, "app.log")
 
@@ -12,19 +108,47 @@ def configure_logging() -> None:
     root.setLevel(logging.INFO)
 
     formatter = logging.Formatter(
-        fmt="%(asctime)s %(levelname)s [%(name)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
+        fmt="%(asctime)s %(levelname)s [%(name)s] %(message)s%(user_tag)s",
+        datefmt=DATEFMT,
     )
 
     # Console handler
     ch = logging.StreamHandler()
     ch.setLevel(logging.INFO)
     ch.setFormatter(formatter)
-    root.addHandler(ch)
 
-    # Rotating file handler
+    # Rotating file handler (JSON lines unless LOG_FORMAT=text)
     fh = RotatingFileHandler(log_path, maxBytes=2_000_000, backupCount=5)
     fh.setLevel(logging.INFO)
-    fh.setFormatter(formatter)
-    root.addHandler(fh)
+    fh.setFormatter(JsonFormatter() if settings.log_format == "json" else formatter)
+
+    # Request threads only enqueue; the listener thread formats, writes and rotates
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, settings.log_queue_size))
+    _handler = BoundedQueueHandler(q, settings.log_queue_policy, settings.log_queue_block_ms / 1000.0)
+    _handler.addFilter(UserTagFilter())
+    root.addHandler(_handler)
+    _listener = QueueListener(q, ch, fh, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
+def logging_stats() -> Dict[str, Any]:
+    if _handler is None:
+        return {"ok": False, "error": "Logging not configured"}
+    return {
+        "ok": True,
+        "format": settings.log_format,
+        "policy": _handler.policy,
+        "queued": _handler.queue.qsize(),
+        "max_queue": _handler.queue.maxsize,
+        "dropped": _handler.dropped,
+        "blocked": _handler.blocked,
+    }
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from array import array
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from . import metrics
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+# Recent lag samples kept for percentiles (about 1 minute at the default interval)
+WINDOW = 600
+MAX_STALLS = 20
+MAX_STACK_FRAMES = 40
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+lag_seconds = metrics.registry.register(
+    metrics.Histogram("wotbot_event_loop_lag_seconds", "Event loop lag: how late a periodic heartbeat ran.", buckets=LAG_BUCKETS)
+)
+stalls_total = metrics.registry.register(
+    metrics.Counter("wotbot_event_loop_stalls_total", "Times the event loop was blocked longer than LOOP_STALL_THRESHOLD_MS.")
+)
+
+
+class LoopMonitor:
+    """
+    A heartbeat task sleeps LOOP_LAG_INTERVAL_MS on the event loop and records
+    how late it wakes up (the lag every other coroutine saw too). A watchdog
+    thread checks the heartbeat; when it is overdue by LOOP_STALL_THRESHOLD_MS
+    it captures the loop thread's stack, which shows the sync call blocking
+    the loop while it is still running.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lags = array("d", [0.0]) * WINDOW
+        self._count = 0
+        self._head = 0
+        self._stalls: Deque[Dict[str, Any]] = deque(maxlen=MAX_STALLS)
+        self._open_stall: Optional[Dict[str, Any]] = None
+        self._last_beat = 0.0
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Call from the running event loop (app startup)."""
+        if not settings.loop_monitor_enabled or self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self._task = loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, daemon=True, name="loop-watchdog").start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _heartbeat(self) -> None:
+        interval = max(10, settings.loop_lag_interval_ms) / 1000.0
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            self._last_beat = now
+            lag_seconds.observe(lag)
+            with self._lock:
+                self._lags[self._head] = lag
+                self._head = (self._head + 1) % WINDOW
+                self._count = min(self._count + 1, WINDOW)
+                stall, self._open_stall = self._open_stall, None
+            if stall is not None:
+                # The stall is over; the heartbeat's lag is (at least) how long it lasted
+                stall["lag_ms"] = round(lag * 1000, 1)
+                log.warning("Event loop was blocked for %.0f ms in:\n%s", stall["lag_ms"], "".join(stall["stack"][-8:]))
+
+    def _watchdog(self) -> None:
+        threshold = max(10, settings.loop_stall_threshold_ms) / 1000.0
+        interval = max(10, settings.loop_lag_interval_ms) / 1000.0
+        while not self._stop.wait(threshold / 2):
+            overdue = time.perf_counter() - self._last_beat - interval
+            if overdue < threshold:
+                continue
+            with self._lock:
+                if self._open_stall is not None:
+                    continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = traceback.format_stack(frame, limit=MAX_STACK_FRAMES)
+            del frame
+            stall = {
+                "detected_at": time.time(),
+                "overdue_ms": round(overdue * 1000, 1),
+                "lag_ms": None,  # filled in when the loop recovers
+                "stack": stack,
+            }
+            with self._lock:
+                self._open_stall = stall
+                self._stalls.append(stall)
+            stalls_total.inc()
+
+    def percentiles(self) -> Dict[str, Any]:
+        with self._lock:
+            values = sorted(self._lags[i] for i in range(self._count))
+        stalls = int(stalls_total.value())
+        if not values:
+            return {"enabled": self._task is not None, "samples": 0, "stalls": stalls}
+
+        def pct(p: float) -> float:
+            return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 2)
+
+        return {
+            "enabled": True,
+            "samples": len(values),
+            "lag_ms": {"p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99), "max": round(values[-1] * 1000, 2)},
+            "stalls": stalls,
+        }
+
+    def stalls(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(s) for s in reversed(self._stalls)]
+
+
+monitor = LoopMonitor()
+
+
+def _window_pct(key: str) -> Optional[float]:
+    lag = monitor.percentiles().get("lag_ms")
+    return lag[key] / 1000.0 if lag else None
+
+
+metrics.registry.register(
+    metrics.Gauge("wotbot_event_loop_lag_p50_seconds", "Median event loop lag over the last minute.", fn=lambda: _window_pct("p50"))
+)
+metrics.registry.register(
+    metrics.Gauge("wotbot_event_loop_lag_p99_seconds", "99th percentile event loop lag over the last minute.", fn=lambda: _window_pct("p99"))
+)
@@ -0,0 +1,349 @@
+import threading
+import weakref
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Latency buckets (seconds) shared by the stage histograms; +Inf is implicit.
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _CellOwner:
+    """Lives in a thread's locals; collected (and finalized) when the thread exits."""
+
+    __slots__ = ("__weakref__",)
+
+
+class _Sharded:
+    """
+    Per-thread value cells. Each thread writes only its own list, so recording
+    takes no lock; the metric's lock is only taken the first time a thread
+    touches a series and when the thread exits, at which point its cell is
+    folded into a base total (short-lived pool threads would otherwise grow
+    the shard list forever). Scrapes add up the base and the live cells.
+    """
+
+    __slots__ = ("_size", "_local", "_shards", "_base", "_lock")
+
+    def __init__(self, size: int, lock: threading.Lock):
+        self._size = size
+        self._local = threading.local()
+        self._shards: Dict[int, List[float]] = {}
+        self._base = [0.0] * size
+        self._lock = lock
+
+    def cell(self) -> List[float]:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0.0] * self._size
+            owner = _CellOwner()
+            with self._lock:
+                self._shards[id(cell)] = cell
+            weakref.finalize(owner, self._retire, id(cell))
+            self._local.owner = owner
+            self._local.cell = cell
+            return cell
+
+    def _retire(self, key: int) -> None:
+        with self._lock:
+            cell = self._shards.pop(key, None)
+            if cell is not None:
+                for i, v in enumerate(cell):
+                    self._base[i] += v
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            shards = list(self._shards.values())
+            out = list(self._base)
+        for cell in shards:
+            for i, v in enumerate(cell):
+                out[i] += v
+        return out
+
+
+class _CounterChild:
+    __slots__ = ("_cells",)
+
+    def __init__(self, lock: threading.Lock):
+        self._cells = _Sharded(1, lock)
+
+    def inc(self, amount: float = 1) -> None:
+        self._cells.cell()[0] += amount
+
+    def value(self) -> float:
+        return self._cells.totals()[0]
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self, lock: threading.Lock):
+        self._value = 0.0
+        self._lock = lock
+
+    def set(self, value: float) -> None:
+        self._value = float(value)
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    def value(self) -> float:
+        return self._value
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: "_HistogramChild"):
+        self._child = child
+
+    def __enter__(self) -> "_Timer":
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._child.observe(perf_counter() - self._start)
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_cells")
+
+    def __init__(self, bounds: Tuple[float, ...], lock: threading.Lock):
+        self._bounds = bounds
+        # One slot per bucket (the last is +Inf), then the running sum
+        self._cells = _Sharded(len(bounds) + 2, lock)
+
+    def observe(self, value: float) -> None:
+        cell = self._cells.cell()
+        cell[bisect_left(self._bounds, value)] += 1
+        cell[-1] += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def value(self) -> Tuple[List[float], float]:
+        totals = self._cells.totals()
+        return totals[:-1], totals[-1]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return sorted(self._children.items())
+
+    def _label_str(self, values: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._series():
+            lines.append(f"{self.name}{self._label_str(values)} {_fmt(child.value())}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild(self._lock)
+
+    def inc(self, amount: float = 1) -> None:
+        self._default.inc(amount)
+
+    def value(self) -> float:
+        return self._default.value()
+
+
+class Gauge(_Metric):
+    """Set/inc/dec gauge, or pass ``fn`` to read the value at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = (), fn: Optional[Callable[[], float]] = None):
+        self.fn = fn
+        super().__init__(name, doc, labelnames)
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild(self._lock)
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._default.dec(amount)
+
+    def render(self) -> List[str]:
+        if self.fn is None:
+            return super().render()
+        try:
+            value = self.fn()
+        except Exception:
+            value = None
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        if value is not None:
+            lines.append(f"{self.name} {_fmt(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, doc, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets, self._lock)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._series():
+            counts, total = child.value()
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _fmt(bound)
+                lines.append(f"{self.name}_bucket{self._label_str(values, (('le', le),))} {_fmt(cumulative)}")
+            lines.append(f"{self.name}_sum{self._label_str(values)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{self._label_str(values)} {_fmt(cumulative)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry = Registry()
+
+
+def _process_stat(key: str) -> Optional[float]:
+    from .tools.metrics_sampler import sampler
+
+    return (sampler.latest().get("process") or {}).get(key)
+
+
+# Turn pipeline. Stages: webhook_parse, signature_check, media_fetch,
+# queue_wait, engine, twilio_send and turn (webhook receipt to last reply sent).
+stage_seconds = registry.register(
+    Histogram("wotbot_stage_duration_seconds", "Time spent in each stage of a WhatsApp turn.", ("stage",))
+)
+turns_total = registry.register(
+    Counter("wotbot_turns_total", "WhatsApp turns processed, by outcome.", ("outcome",))
+)
+turns_in_flight = registry.register(
+    Gauge("wotbot_turns_in_flight", "WhatsApp turns currently being processed.")
+)
+webhook_requests_total = registry.register(
+    Counter("wotbot_webhook_requests_total", "Twilio webhook requests, by result.", ("result",))
+)
+openai_seconds = registry.register(
+    Histogram("wotbot_openai_request_duration_seconds", "OpenAI API call latency by backend and call.", ("backend", "call", "outcome"))
+)
+tool_seconds = registry.register(
+    Histogram("wotbot_tool_duration_seconds", "Tool call latency by tool and outcome (ok, error, cached).", ("tool", "outcome"))
+)
+twilio_messages_total = registry.register(
+    Counter("wotbot_twilio_messages_total", "Outbound WhatsApp messages, by outcome.", ("outcome",))
+)
+registry.register(
+    Gauge("wotbot_process_resident_memory_bytes", "Resident memory from the latest background sample.", fn=lambda: _process_stat("rss"))
+)
+registry.register(
+    Gauge("wotbot_process_cpu_percent", "Process CPU percent from the latest background sample.", fn=lambda: _process_stat("cpu_percent"))
+)
+
+
+class timed:
+    """
+    ``with timed(openai_seconds, "chat", "create"):`` observes the duration
+    with a trailing ``outcome`` label of "ok", or "error" if the block raised.
+    """
+
+    __slots__ = ("_metric", "_labels", "_start")
+
+    def __init__(self, metric: Histogram, *labels: str):
+        self._metric = metric
+        self._labels = labels
+
+    def __enter__(self) -> "timed":
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        outcome = "error" if exc_type is not None else "ok"
+        self._metric.labels(*self._labels, outcome).observe(perf_counter() - self._start)
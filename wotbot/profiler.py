@@ -0,0 +1,156 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+
+# Frames kept per stack (the innermost ones; outer frames beyond this are
+# dropped), so one sample stays cheap even with deep recursion.
+MAX_DEPTH = 128
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+
+# Leaf frames of threads parked in the stdlib (locks, selectors, queues);
+# the summary leaves them out unless asked, so the hot code stands out.
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+    ("thread.py", "_worker"),
+}
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _label(frame: Frame) -> str:
+    func, path, line = frame
+    return f"{func} ({os.path.basename(path)}:{line})"
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread with sys._current_frames() at a
+    fixed interval. Nothing is installed in the target threads (no tracing
+    hooks), so the cost is one stack walk per thread per tick on the
+    sampler's own thread; only one profile runs at a time.
+    """
+
+    def __init__(self):
+        self._run_lock = threading.Lock()
+        self._codes: Dict[Any, Frame] = {}
+        self.last: Optional[Dict[str, Any]] = None  # most recent result, for downloading its stacks
+
+    def run(self, seconds: float, interval_ms: float) -> Dict[str, Any]:
+        seconds = max(0.1, min(float(seconds), settings.profiler_max_seconds))
+        interval = max(1.0, float(interval_ms)) / 1000.0
+        if not self._run_lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            result: Dict[str, Any] = {}
+            t = threading.Thread(target=self._sample, args=(seconds, interval, result), daemon=True, name="profiler")
+            t.start()
+            t.join()
+            self.last = result
+            return result
+        finally:
+            self._run_lock.release()
+
+    def _sample(self, seconds: float, interval: float, result: Dict[str, Any]) -> None:
+        me = threading.get_ident()
+        stacks: Counter = Counter()
+        ticks = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_tick = started
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack: List[Frame] = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    code = frame.f_code
+                    key = self._codes.get(code)
+                    if key is None:
+                        key = self._codes[code] = (code.co_name, code.co_filename, code.co_firstlineno)
+                    stack.append(key)
+                    frame = frame.f_back
+                stack.reverse()
+                stacks[(names.get(ident, str(ident)),) + tuple(stack)] += 1
+            del frame
+            ticks += 1
+            # Fixed-rate schedule; skip ticks rather than burst after a stall
+            next_tick += interval
+            if next_tick < now:
+                next_tick = now + interval
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+        result["stacks"] = stacks
+        result["ticks"] = ticks
+        result["duration_sec"] = round(time.perf_counter() - started, 3)
+        result["interval_ms"] = round(interval * 1000, 3)
+        # The code-object cache only needs to live for one profile
+        self._codes = {}
+
+
+def collapsed(stacks: Counter) -> str:
+    """Brendan Gregg's collapsed format (thread;outer;...;leaf count), for flamegraph.pl or speedscope."""
+    lines = []
+    for stack, count in stacks.most_common():
+        thread, frames = stack[0], stack[1:]
+        lines.append(";".join([f"thread:{thread}"] + [_label(f).replace(";", ":") for f in frames]) + f" {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _idle(frames: Tuple[Frame, ...]) -> bool:
+    return bool(frames) and (os.path.basename(frames[-1][1]), frames[-1][0]) in IDLE_LEAVES
+
+
+def summarize(result: Dict[str, Any], top: int = 25, include_idle: bool = False) -> Dict[str, Any]:
+    stacks: Counter = result["stacks"]
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    threads: Counter = Counter()
+    idle = 0
+    for stack, count in stacks.items():
+        thread, frames = stack[0], stack[1:]
+        threads[thread] += count
+        if not include_idle and _idle(frames):
+            idle += count
+            continue
+        if frames:
+            self_counts[frames[-1]] += count
+        for f in set(frames):
+            total_counts[f] += count
+
+    total = (sum(stacks.values()) - idle) or 1
+
+    def rows(counter: Counter) -> List[Dict[str, Any]]:
+        return [
+            {"function": _label(f), "samples": n, "percent": round(100.0 * n / total, 1)}
+            for f, n in counter.most_common(top)
+        ]
+
+    return {
+        "ok": True,
+        "duration_sec": result["duration_sec"],
+        "interval_ms": result["interval_ms"],
+        "ticks": result["ticks"],
+        "samples": sum(stacks.values()),
+        "idle_samples": idle,
+        "threads": dict(threads.most_common()),
+        "top_self": rows(self_counts),
+        "top_total": rows(total_counts),
+    }
+
+
+profiler = SamplingProfiler()
@@ -1,19 +1,30 @@
 import base64
 import logging
+import time
 from typing import Dict
 
 from fastapi import APIRouter, Depends, Form, HTTPException, Request, status, Body, Query
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
 from ..config import settings, apply_overrides, save_overrides
+from ..logging_config import logging_stats
+from ..tracing import sink as trace_sink
+from .. import profiler
+from ..loop_monitor import monitor as loop_monitor
+from ..traffic import recorder as traffic_recorder
 from ..tools import system_tools
 from ..tools import mcp_client
-from ..tools.mcp_exec_client import MCPExecClient
+from ..tools import http_client
+from ..tools import log_index
+from ..tools import mcp_exec_client
+from ..tools.mcp_catalog import catalog as mcp_catalog
+from ..tools.sandbox_stats import stats as sandbox_stats
+from ..conversation.tool_router import registry as tool_registry, result_cache as tool_result_cache
+from ..conversation.usage import ledger as usage_ledger
 from ..tools.schemas import tool_schemas, all_tool_schemas
-from openai import OpenAI
-from urllib.parse import urlparse
+from ..conversation.openai_client import shared_openai
 
 log = logging.getLogger(__name__)
 router = APIRouter()
@@ -137,7 +148,7 @@ def admin_restart(_: bool = Depends(require_auth)):
 
 @router.post("/assistant/sync")
 def assistant_sync(request: Request, _: bool = Depends(require_auth)):
-    client = OpenAI()
+    client = shared_openai()
     tools_payload = [{"type": "function", "function": t["function"]} for t in tool_schemas()]
     instructions = (
         "You are WotBot, a WhatsApp assistant. Keep replies concise and mobile-friendly. "
@@ -161,7 +172,7 @@ def assistant_sync(request: Request, _: bool = Depends(require_auth)):
 
 @router.get("/api/assistant/info")
 def assistant_info(_: bool = Depends(require_auth)):
-    client = OpenAI()
+    client = shared_openai()
     info = {
         "use_assistants": settings.openai_use_assistants,
         "assistant_id": settings.openai_assistant_id,
@@ -182,7 +193,7 @@ def assistant_info(_: bool = Depends(require_auth)):
 
 @router.post("/api/assistant/sync")
 def assistant_sync_api(_: bool = Depends(require_auth)):
-    client = OpenAI()
+    client = shared_openai()
     tools_payload = [{"type": "function", "function": t["function"]} for t in tool_schemas()]
     instructions = (
         "You are WotBot, a WhatsApp assistant. Keep replies concise and mobile-friendly. "
@@ -205,7 +216,7 @@ def assistant_sync_api(_: bool = Depends(require_auth)):
 
 @router.get("/api/openai/models")
 def api_openai_models(_: bool = Depends(require_auth)):
-    client = OpenAI()
+    client = shared_openai()
     try:
         models = client.models.list()
         ids = [m.id for m in getattr(models, 'data', [])]
@@ -216,9 +227,8 @@ def api_openai_models(_: bool = Depends(require_auth)):
 
 @router.post("/api/ai/ask")
 def api_ai_ask(_: bool = Depends(require_auth), payload: Dict = Body(...)):
-    from openai import OpenAI
     from ..tools.schemas import tool_schemas
-    import psutil, platform
+    import platform
     q = (payload or {}).get("question", "Explain this admin page")
     include_logs = bool((payload or {}).get("include_logs"))
     include_health = bool((payload or {}).get("include_health"))
@@ -240,19 +250,18 @@ def api_ai_ask(_: bool = Depends(require_auth), payload: Dict = Body(...)):
             logs_text = "\n".join(logs.get("lines", [])[-120:])
     health = {}
     if include_health:
-        vm = psutil.virtual_memory()
-        du = psutil.disk_usage("/")
+        s = system_tools.get_system_status()
         health = {
-            "cpu_percent": psutil.cpu_percent(interval=0.0),
-            "memory_percent": vm.percent,
-            "disk_percent": du.percent,
+            "cpu_percent": s["cpu_percent"],
+            "memory_percent": s["memory"]["percent"],
+            "disk_percent": s["disk"]["percent"],
             "python": platform.python_version(),
         }
     tools = []
     if include_tools:
         tools = [t["function"] for t in tool_schemas()]
 
-    client = OpenAI()
+    client = shared_openai()
     system = (
         "You are an admin UI assistant for WotBot. Explain settings clearly and concisely. "
         "Never request or reveal secrets. Use short paragraphs and bullets."
@@ -280,7 +289,7 @@ def api_ai_summarize_logs(_: bool = Depends(require_auth), payload: Dict = Body(
     if not logs.get("ok"):
         return JSONResponse({"ok": False, "error": logs.get("error", "log read failed")}, status_code=500)
     text = "\n".join(logs.get("lines", []))
-    client = OpenAI()
+    client = shared_openai()
     prompt = (
         "Summarize the following application logs. Focus on:\n"
         "- Errors, exceptions, tracebacks (with probable causes)\n"
@@ -347,14 +356,9 @@ def api_mcp_list_tools(server: str | None = Body(default=None), _: bool = Depend
                         break
             if chosen is None:
                 return JSONResponse({"ok": False, "error": f"Unknown MCP server: {server}"}, status_code=400)
-            if urlparse(chosen).scheme in ("http", "https"):
-                client = mcp_client.MCPHttpClient(chosen, settings.mcp_token)
-                res = client.list_tools()
-            else:
-                # Treat as local exec command (split by whitespace)
-                cmd = chosen.split()
-                res = MCPExecClient(cmd).list_tools()
-            return res
+            # HTTP URL or local exec command (split by whitespace)
+            client = mcp_client.registry.get(chosen) or mcp_client.make_client(chosen)
+            return client.list_tools()
         else:
             return mcp_client.mcp_list_all()
     except Exception as e:
@@ -381,12 +385,8 @@ def api_mcp_validate(server: str = Body(...), _: bool = Depends(require_auth)):
         if chosen is None:
             # Try validating the given URL directly without being in settings
             chosen = server
-        if urlparse(chosen).scheme in ("http", "https"):
-            client = mcp_client.MCPHttpClient(chosen, settings.mcp_token)
-            res = client.list_tools()
-        else:
-            cmd = chosen.split()
-            res = MCPExecClient(cmd).list_tools()
+        # Unconfigured commands get a throwaway process, not one kept in the pool
+        res = (mcp_client.registry.get(chosen) or mcp_client.make_client(chosen, pooled=False)).list_tools()
         if res.get("ok"):
             return {"ok": True, "server": chosen, "tools_count": len(res.get("result", []) if isinstance(res.get("result"), list) else [])}
         return JSONResponse({"ok": False, "server": chosen, "error": res.get("error")}, status_code=502)
@@ -394,9 +394,185 @@ def api_mcp_validate(server: str = Body(...), _: bool = Depends(require_auth)):
         return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
 
+@router.get("/api/mcp/catalog")
+def api_mcp_catalog(_: bool = Depends(require_auth)):
+    return mcp_catalog.stats()
+
+
+@router.post("/api/mcp/catalog/refresh")
+def api_mcp_catalog_refresh(_: bool = Depends(require_auth)):
+    mcp_catalog.refresh(wait=True)
+    return mcp_catalog.stats()
+
+
+@router.get("/api/mcp/processes")
+def api_mcp_processes(_: bool = Depends(require_auth)):
+    # Long-lived local (stdio) MCP server processes
+    return mcp_exec_client.pool.stats()
+
+
 @router.get("/api/logs")
-def api_logs(path: str = Query(default="app.log"), lines: int = Query(default=200, ge=1, le=1000), _: bool = Depends(require_auth)):
-    return system_tools.read_log(path, lines)
+def api_logs(
+    path: str = Query(default="app.log"),
+    lines: int = Query(default=200, ge=1, le=1000),
+    contains: str | None = Query(default=None),
+    regex: str | None = Query(default=None),
+    level: str | None = Query(default=None),
+    rotated: bool = Query(default=False),
+    _: bool = Depends(require_auth),
+):
+    return system_tools.read_log(path, lines, contains=contains, regex=regex, level=level, rotated=rotated)
+
+
+@router.get("/api/logs/query")
+def api_logs_query(
+    start: str | None = Query(default=None),
+    end: str | None = Query(default=None),
+    since_minutes: float | None = Query(default=None, gt=0),
+    level: str | None = Query(default=None),
+    logger: str | None = Query(default=None),
+    user: str | None = Query(default=None),
+    contains: str | None = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: str | None = Query(default=None),
+    _: bool = Depends(require_auth),
+):
+    # Indexed search over app.log and its rotated backups, newest first
+    try:
+        t0 = log_index.parse_time(start) if start else None
+        if since_minutes:
+            t0 = time.time() - since_minutes * 60
+        t1 = log_index.parse_time(end) if end else None
+        return log_index.index.query(t0, t1, level, logger, user, contains, limit, cursor)
+    except ValueError as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
+
+
+@router.get("/api/logs/pipeline")
+def api_logs_pipeline(_: bool = Depends(require_auth)):
+    # Queue depth and dropped-record counters of the background log writer
+    return logging_stats()
+
+
+@router.get("/api/logs/index")
+def api_logs_index(_: bool = Depends(require_auth)):
+    log_index.index.refresh()
+    return log_index.index.stats()
+
+
+@router.get("/api/usage")
+def api_usage(
+    _: bool = Depends(require_auth),
+    day: str = Query(None, description="YYYY-MM-DD; defaults to today"),
+    user: str = Query(None),
+    top: int = Query(20, ge=1, le=500),
+):
+    # Token and cost totals for one day, broken down by user, model and backend
+    rep = usage_ledger.report(day=day, user=user, top_users=top)
+    if user:
+        tokens, cost = usage_ledger.today(user)
+        rep["user_today"] = {"tokens": tokens, "cost_usd": round(cost, 6), "over_budget": usage_ledger.over_budget(user)}
+    return rep
+
+
+@router.post("/api/profile")
+def api_profile(
+    _: bool = Depends(require_auth),
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    top: int = Query(25, ge=1, le=200),
+    include_idle: bool = Query(False),
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+):
+    # Samples every thread's stack for `seconds` (capped at PROFILER_MAX_SECONDS); blocks until done
+    try:
+        result = profiler.profiler.run(seconds, interval_ms)
+    except profiler.ProfilerBusy as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=409)
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed(result["stacks"]))
+    return profiler.summarize(result, top, include_idle)
+
+
+@router.get("/api/profile/collapsed")
+def api_profile_collapsed(_: bool = Depends(require_auth)):
+    # Collapsed stacks of the last profile (flamegraph.pl / speedscope input)
+    last = profiler.profiler.last
+    if last is None:
+        return JSONResponse({"ok": False, "error": "No profile has been run yet"}, status_code=404)
+    return PlainTextResponse(profiler.collapsed(last["stacks"]), headers={"Content-Disposition": "attachment; filename=profile.collapsed.txt"})
+
+
+@router.get("/api/loop/stalls")
+def api_loop_stalls(_: bool = Depends(require_auth)):
+    # Recent event loop stalls with the loop thread's stack at detection time
+    return {"ok": True, **loop_monitor.percentiles(), "recent": loop_monitor.stalls()}
+
+
+@router.get("/api/traffic")
+def api_traffic(_: bool = Depends(require_auth)):
+    # Traffic recorder status: whether it is on, turns written and file sizes
+    return traffic_recorder.stats()
+
+
+@router.get("/api/traces")
+def api_traces(
+    _: bool = Depends(require_auth),
+    min_ms: float = Query(0.0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    # Newest-first summaries of sampled turn traces, optionally only slow ones
+    return {"ok": True, "traces": trace_sink.recent(limit=limit, min_ms=min_ms), "stats": trace_sink.stats()}
+
+
+@router.get("/api/traces/{trace_id}")
+def api_trace(trace_id: str, _: bool = Depends(require_auth)):
+    rec = trace_sink.get(trace_id)
+    if rec is None:
+        return JSONResponse({"ok": False, "error": "Trace not found"}, status_code=404)
+    return {"ok": True, "trace": rec}
+
+
+@router.get("/api/tools/stats")
+def api_tools_stats(_: bool = Depends(require_auth)):
+    # Per-tool bulkhead limits, timeouts and call/reject/timeout counters
+    return tool_registry.stats()
+
+
+@router.get("/api/tools/cache")
+def api_tools_cache(_: bool = Depends(require_auth)):
+    return tool_result_cache.stats()
+
+
+@router.post("/api/tools/cache/clear")
+def api_tools_cache_clear(_: bool = Depends(require_auth)):
+    tool_result_cache.clear()
+    return {"ok": True}
+
+
+@router.get("/api/sandbox/stats")
+def api_sandbox_stats(top_users: int = Query(default=20, ge=1, le=200), _: bool = Depends(require_auth)):
+    # Per-tool and per-user histograms of sandbox wall/CPU time, peak RSS and output size
+    return sandbox_stats.snapshot(top_users)
+
+
+@router.get("/api/http/stats")
+def api_http_stats(_: bool = Depends(require_auth)):
+    # Connection reuse per origin for the http_request tool
+    return http_client.pool_stats()
+
+
+@router.get("/api/http/cache")
+def api_http_cache(_: bool = Depends(require_auth)):
+    return http_client.cache_stats()
+
+
+@router.post("/api/http/cache/clear")
+def api_http_cache_clear(_: bool = Depends(require_auth)):
+    cache = http_client.get_cache()
+    if cache is not None:
+        cache.clear()
+    return {"ok": True}
 
 
 @router.get("/api/config/export")
@@ -1,26 +1,31 @@
 import os
 import platform
-import time
-import psutil
+
 from fastapi import APIRouter
 
+from ..loop_monitor import monitor as loop_monitor
+from ..tools.metrics_sampler import sampler
+
 router = APIRouter()
 
-PROCESS_START = time.time()
+PLATFORM = platform.platform()
+PYTHON = platform.python_version()
 
 
 @router.get("")
 def health():
-    p = psutil.Process(os.getpid())
-    mem = p.memory_info()
-    cpu_percent = p.cpu_percent(interval=0.0)
+    # Served from the background sampler's latest snapshot (empty while warming up)
+    s = sampler.snapshot(trends=False)
+    proc = s.get("process", {})
     return {
         "status": "ok",
-        "pid": p.pid,
-        "uptime_seconds": int(time.time() - PROCESS_START),
-        "platform": platform.platform(),
-        "python": platform.python_version(),
-        "cpu_percent": cpu_percent,
-        "memory_rss": mem.rss,
+        "pid": os.getpid(),
+        "uptime_seconds": s["process_uptime_seconds"],
+        "platform": PLATFORM,
+        "python": PYTHON,
+        "cpu_percent": proc.get("cpu_percent"),
+        "memory_rss": proc.get("rss"),
+        "sample_age_sec": s.get("sample_age_sec"),
+        "warming_up": bool(s.get("warming_up")),
+        "event_loop": loop_monitor.percentiles(),
     }
-
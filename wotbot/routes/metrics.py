@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response, status
+
+from ..config import settings
+from ..metrics import CONTENT_TYPE, registry
+
+router = APIRouter()
+
+
+@router.get("")
+def metrics():
+    # Prometheus text exposition format; unauthenticated like /health
+    if not settings.metrics_enabled:
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -1,17 +1,19 @@
 import logging
-from typing import Dict
+from time import perf_counter
+from typing import Dict, Optional
 
 from fastapi import APIRouter, BackgroundTasks, Depends, Request, Response, status
 from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from twilio.request_validator import RequestValidator
 
 from ..config import settings
+from ..logging_config import current_user
+from .. import metrics, tracing, traffic
 from ..conversation.session_store import SessionStore
-from ..conversation.engine import ConversationEngine
+from ..utils.lazy import Lazy
 from ..utils.twilio_utils import send_whatsapp_messages
 import base64
-import requests
 
 
 log = logging.getLogger(__name__)
@@ -19,12 +21,27 @@ router = APIRouter()
 
 
 _sessions = SessionStore()
-_engine = ConversationEngine(_sessions)
+
+
+def _new_engine():
+    # The engine imports the OpenAI SDK and every tool module; build it on first use
+    from ..conversation.engine import ConversationEngine
+
+    return ConversationEngine(_sessions)
+
+
+_engine = Lazy(_new_engine)
+
+
+def get_engine():
+    return _engine.get()
 
 
 def _twilio_signature_valid(request: Request, form_dict: Dict[str, str]) -> bool:
     if not settings.twilio_validate_signature:
         return True
+    from twilio.request_validator import RequestValidator
+
     validator = RequestValidator(settings.twilio_auth_token)
     url = settings.public_base_url.rstrip("/") + str(request.url.path)
     signature = request.headers.get("X-Twilio-Signature", "")
@@ -36,16 +53,31 @@ def _twilio_signature_valid(request: Request, form_dict: Dict[str, str]) -> bool
 
 @router.post("/whatsapp")
 async def whatsapp_webhook(request: Request, background: BackgroundTasks):
+    received = perf_counter()
+    # Root span of the turn; ended once the replies are sent (or on rejection)
+    root = tracing.start_trace("turn")
+    webhook_span = tracing.start_span("whatsapp_webhook", parent=root)
     form = await request.form()
-    if not _twilio_signature_valid(request, form):
+    parsed = perf_counter()
+    metrics.stage_seconds.labels("webhook_parse").observe(parsed - received)
+    valid = _twilio_signature_valid(request, form)
+    metrics.stage_seconds.labels("signature_check").observe(perf_counter() - parsed)
+    if not valid:
         log.warning("Twilio signature invalid")
+        metrics.webhook_requests_total.labels("forbidden").inc()
+        _end_rejected(root, webhook_span, "forbidden")
         return Response(status_code=status.HTTP_403_FORBIDDEN)
     from_number = form.get("From") or form.get("from")
     text = form.get("Body") or form.get("body") or ""
     num_media = int(form.get("NumMedia", "0") or 0)
 
     if not from_number:
+        metrics.webhook_requests_total.labels("bad_request").inc()
+        _end_rejected(root, webhook_span, "bad_request")
         return PlainTextResponse("Missing From", status_code=400)
+    if root is not None:
+        root.set("user", from_number)
+        root.set("num_media", num_media)
 
     log.info("Incoming WhatsApp message from %s: %s", from_number, text[:200])
 
@@ -63,41 +95,103 @@ async def whatsapp_webhook(request: Request, background: BackgroundTasks):
                 log.info("Ignoring non-image media %s", ctype)
                 continue
             try:
-                # Fetch media using Twilio basic auth
-                resp = requests.get(url, auth=(settings.twilio_account_sid, settings.twilio_auth_token), timeout=10)
-                resp.raise_for_status()
-                data_b64 = base64.b64encode(resp.content).decode("ascii")
-                data_url = f"data:{ctype};base64,{data_b64}"
+                # Blocking download + base64 run in the threadpool, off the event loop
+                data_url = await run_in_threadpool(_fetch_media_data_url, url, ctype, webhook_span)
                 parts.append({"type": "image_url", "image_url": {"url": data_url}})
             except Exception as e:
                 log.warning("Failed to fetch media %s: %s", url, e)
 
+    # Opt-in traffic recording (None unless TRAFFIC_RECORD_ENABLED or replaying)
+    turn = traffic.begin_turn(form, from_number, text, parts)
+
     # Process asynchronously, respond immediately to Twilio
-    background.add_task(process_and_reply_parts, from_number, parts)
+    metrics.webhook_requests_total.labels("accepted").inc()
+    if webhook_span is not None:
+        webhook_span.end()
+    background.add_task(
+        process_and_reply_parts,
+        from_number,
+        parts,
+        received_at=received,
+        enqueued_at=perf_counter(),
+        trace=root,
+        turn=turn,
+    )
 
     # Twilio expects a 2xx quickly; return no content to avoid extra 'OK' message
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
-def process_and_reply(from_number: str, text: str):
-    try:
-        replies = _engine.converse(from_number, text)
-    except Exception as e:
-        log.exception("Error processing message: %s", e)
-        replies = ["Sorry, an error occurred while processing your message."]
-    try:
-        send_whatsapp_messages(from_number, replies)
-    except Exception:
-        log.exception("Failed to send WhatsApp replies")
+def _fetch_media_data_url(url: str, ctype: str, parent: Optional[tracing.Span]) -> str:
+    if traffic.player is not None:
+        return traffic.player.media_data_url(url, ctype)
+    # Fetch media using Twilio basic auth
+    import requests
+
+    with metrics.stage_seconds.labels("media_fetch").time(), tracing.span("media_fetch", parent=parent, content_type=ctype):
+        resp = requests.get(url, auth=(settings.twilio_account_sid, settings.twilio_auth_token), timeout=10)
+        resp.raise_for_status()
+        data_b64 = base64.b64encode(resp.content).decode("ascii")
+    return f"data:{ctype};base64,{data_b64}"
+
 
+def _end_rejected(root: Optional[tracing.Span], webhook_span: Optional[tracing.Span], reason: str) -> None:
+    if root is None:
+        return
+    webhook_span.end()
+    root.set("rejected", reason)
+    root.end("rejected")
 
-def process_and_reply_parts(from_number: str, parts):
+
+def process_and_reply(from_number: str, text: str):
+    process_and_reply_parts(from_number, [{"type": "text", "text": text}])
+
+
+def process_and_reply_parts(
+    from_number: str,
+    parts,
+    received_at: Optional[float] = None,
+    enqueued_at: Optional[float] = None,
+    trace: Optional[tracing.Span] = None,
+    turn: Optional[traffic.Turn] = None,
+):
+    started = perf_counter()
+    if enqueued_at is not None:
+        metrics.stage_seconds.labels("queue_wait").observe(started - enqueued_at)
+    metrics.turns_in_flight.inc()
+    outcome = "ok"
+    if trace is None:
+        trace = tracing.start_trace("turn", user=from_number)
+    if trace is not None and enqueued_at is not None:
+        trace.set("queue_wait_ms", round((started - enqueued_at) * 1000, 3))
+    token = current_user.set(from_number)
+    span_token = tracing.current_span.set(trace)
+    turn_token = traffic.current_turn.set(turn)
     try:
-        replies = _engine.converse_parts(from_number, parts)
+        with metrics.stage_seconds.labels("engine").time(), tracing.span("converse_parts"):
+            replies = get_engine().converse_parts(from_number, parts)
     except Exception as e:
         log.exception("Error processing message with parts: %s", e)
         replies = ["Sorry, an error occurred while processing your message."]
+        outcome = "error"
     try:
-        send_whatsapp_messages(from_number, replies)
+        with metrics.stage_seconds.labels("twilio_send").time(), tracing.span("twilio_send", messages=len(replies)):
+            if traffic.player is not None:
+                traffic.player.deliver(from_number, replies)
+            else:
+                send_whatsapp_messages(from_number, replies)
     except Exception:
         log.exception("Failed to send WhatsApp replies")
+        outcome = "send_failed"
+    finally:
+        current_user.reset(token)
+        tracing.current_span.reset(span_token)
+        elapsed = perf_counter() - (received_at if received_at is not None else started)
+        traffic.finish_turn(turn, replies, outcome, elapsed)
+        traffic.current_turn.reset(turn_token)
+        if trace is not None:
+            trace.set("outcome", outcome)
+            trace.end("error" if outcome != "ok" else None)
+        metrics.turns_in_flight.dec()
+        metrics.stage_seconds.labels("turn").observe(elapsed)
+        metrics.turns_total.labels(outcome).inc()
@@ -2,11 +2,30 @@
 Internal module executed in a subprocess to run untrusted Python snippets with
 basic safeguards. It reads code from stdin and outputs a JSON result to stdout.
 
+With ``--worker <profile>`` it instead stays alive as a warm worker: the
+profile's modules are imported once, then each newline-delimited JSON request
+({"code": ...}) on stdin is run in a forked child with the limits below and
+answered with one JSON line on stdout. The "compute" profile preloads a fixed
+set of C-backed modules (math, decimal, NumPy if installed, ...) and allows
+importing only those: import statements are rewritten into lookups in a table
+of proxies that carry only the modules' public functions and classes, never
+the modules they import.
+
 Security notes:
-- Disallows import statements via AST check.
+- Disallows import statements via AST check (except preloaded profile modules).
+- Disallows access to ``_``-prefixed attributes (``__class__``, ``__globals__``,
+  ``random._os``, ...), to frame, code and traceback attributes (``gi_frame``,
+  ``f_back``, ``co_code``, ...), to ``str.format`` (whose fields do attribute
+  lookups of their own) and to attributes that reach files or raw memory
+  (``tofile``, ``ctypes``, ...) via AST check.
+- Disallows ``__``-prefixed names (``__import__``, ``__builtins__``, ...), so
+  no function or class defined in this module is reachable from snippets.
+- Runs with an allowlisted environment without secrets (set by the parent).
 - Runs with restricted builtins (no open/os/sys/subprocess/socket, etc.).
 - Enforces CPU and memory limits using resource where available.
 - Uses a timeout via signal alarm.
+- Captures stdout/stderr into capped head+tail buffers so output volume cannot
+  exhaust the memory limit; optionally aborts once a hard output cap is hit.
 
 This is not a perfect sandbox; keep time and memory small and disallow dangerous
 operations by policy. Intended for short computations only.
@@ -14,11 +33,15 @@ operations by policy. Intended for short computations only.
 
 import ast
 import builtins
+import collections
 import io
 import json
 import os
+import select
 import signal
 import sys
+import time
+import types
 
 try:
     import resource  # type: ignore
@@ -28,12 +51,136 @@ except Exception:  # pragma: no cover
 
 TIMEOUT_SEC = int(os.getenv("CODE_EXEC_TIMEOUT_SEC", "5"))
 MEMORY_MB = int(os.getenv("CODE_EXEC_MEMORY_MB", "128"))
+# Bytes of output kept per stream (head + tail), and an optional hard cap (0 = off).
+OUTPUT_BUDGET_BYTES = int(os.getenv("CODE_EXEC_OUTPUT_BYTES", "4000"))
+OUTPUT_HARD_CAP_BYTES = int(os.getenv("CODE_EXEC_OUTPUT_HARD_CAP_BYTES", "0"))
+
+# Modules preloaded into the globals of the "compute" profile. Optional ones are
+# skipped when not installed. Aliases map the usual short names. Only modules
+# implemented in C (or whose public API is) belong here: pure-Python modules
+# hold os/sys and the real builtins in their globals, and operator.attrgetter
+# would sidestep the attribute check below.
+COMPUTE_MODULES = ("math", "cmath", "decimal", "itertools", "heapq", "bisect")
+COMPUTE_OPTIONAL_MODULES = ("numpy",)
+COMPUTE_ALIASES = {"np": "numpy"}
+# Submodules kept on a module's proxy; every other submodule is left out.
+COMPUTE_SUBMODULES = {"numpy": ("random", "linalg", "fft")}
+
+# Attributes no snippet may touch, whatever the object: file I/O, pickling and
+# raw-memory escapes (mostly NumPy's); frames, code objects and tracebacks,
+# which lead back to the globals of whoever called the snippet; and
+# str.format, whose "{0.attr}" fields bypass the AST check. Names starting
+# with "_" or DENIED_ATTR_PREFIXES are refused too.
+DENIED_ATTRS = frozenset({
+    "tofile", "fromfile", "dump", "dumps", "load", "loads", "save", "savez",
+    "savez_compressed", "loadtxt", "savetxt", "genfromtxt", "fromregex",
+    "recfromtxt", "recfromcsv", "memmap", "DataSource", "open", "ctypes",
+    "ctypeslib", "cffi", "lib", "testing", "f2py", "distutils",
+    "gi_frame", "gi_code", "cr_frame", "cr_code", "ag_frame", "ag_code",
+    "f_back", "f_globals", "f_locals", "f_builtins", "f_code", "f_trace",
+    "tb_frame", "tb_next", "format", "format_map",
+})
+DENIED_ATTR_PREFIXES = ("_", "co_")
+
+# Global that holds the import table of the compute profile.
+MODULES_NAME = "__sandbox_modules__"
+
+# Extra pure builtins for the compute profile.
+COMPUTE_BUILTINS = (
+    "int", "float", "str", "bool", "complex", "bytes", "frozenset", "reversed",
+    "divmod", "isinstance", "slice", "iter", "next", "chr", "ord", "repr",
+    "hash", "Exception", "ValueError", "TypeError", "KeyError",
+    "IndexError", "ZeroDivisionError", "ArithmeticError", "StopIteration",
+)
+
+
+class OutputLimitExceeded(BaseException):
+    pass
 
 
-def _forbid_imports(tree: ast.AST):
+class CappedWriter(io.TextIOBase):
+    """
+    Text stream that keeps only the first and last bytes written within a fixed
+    budget. Everything in between is counted in ``dropped`` and discarded, so
+    memory stays flat regardless of how much the snippet prints. If
+    ``hard_cap`` is set, writing past that many bytes raises
+    OutputLimitExceeded to stop execution.
+    """
+
+    def __init__(self, budget: int, hard_cap: int = 0, head_ratio: float = 0.25):
+        self.head_budget = int(budget * head_ratio)
+        self.tail_budget = budget - self.head_budget
+        self.hard_cap = hard_cap
+        self.head = bytearray()
+        self.tail = collections.deque()
+        self.tail_size = 0
+        self.written = 0
+        self.dropped = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        data = s.encode("utf-8", errors="replace")
+        self.written += len(data)
+        room = self.head_budget - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail.append(data)
+            self.tail_size += len(data)
+            while self.tail_size > self.tail_budget:
+                first = self.tail[0]
+                excess = self.tail_size - self.tail_budget
+                if len(first) <= excess:
+                    self.tail.popleft()
+                    self.tail_size -= len(first)
+                    self.dropped += len(first)
+                else:
+                    self.tail[0] = first[excess:]
+                    self.tail_size -= excess
+                    self.dropped += excess
+        if self.hard_cap and self.written > self.hard_cap:
+            raise OutputLimitExceeded(f"Output limit exceeded ({self.hard_cap} bytes)")
+        return len(s)
+
+    def getvalue(self) -> str:
+        head = self.head.decode("utf-8", errors="ignore")
+        tail = b"".join(self.tail).decode("utf-8", errors="ignore")
+        if self.dropped:
+            return f"{head}\n... [{self.dropped} bytes dropped] ...\n{tail}"
+        return head + tail
+
+
+def _forbid_imports(tree: ast.AST, allowed=()):
     for node in ast.walk(tree):
-        if isinstance(node, (ast.Import, ast.ImportFrom)):
-            raise ValueError("Import statements are not allowed in sandbox")
+        if isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module or ""] if not node.level else [""]
+        else:
+            continue
+        for name in names:
+            if name.split(".")[0] not in allowed:
+                if allowed:
+                    raise ValueError(f"Import of '{name}' is not allowed in sandbox")
+                raise ValueError("Import statements are not allowed in sandbox")
+
+
+def _forbid_attributes(tree: ast.AST):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id.startswith("__"):
+            raise ValueError(f"Access to name '{node.id}' is not allowed in sandbox")
+        if isinstance(node, ast.Attribute):
+            names = [node.attr]
+        elif isinstance(node, ast.ImportFrom):
+            names = [a.name for a in node.names]
+        else:
+            continue
+        for name in names:
+            if name.startswith(DENIED_ATTR_PREFIXES) or name in DENIED_ATTRS:
+                raise ValueError(f"Access to attribute '{name}' is not allowed in sandbox")
 
 
 def _restricted_builtins():
@@ -62,42 +209,149 @@ def _restricted_builtins():
     return allowed
 
 
-def _apply_limits():
+def _module_proxy(module: types.ModuleType, submodules=()) -> types.ModuleType:
+    """
+    A module's public, non-module attributes as seen by snippets, on a fresh
+    module object (a C type, so snippets get no method defined here to walk).
+    """
+    proxy = types.ModuleType(module.__name__)
+    for name in dir(module):
+        if name.startswith(DENIED_ATTR_PREFIXES) or name in DENIED_ATTRS:
+            continue
+        try:
+            value = getattr(module, name)
+        except Exception:
+            continue
+        if isinstance(value, types.ModuleType):
+            if name not in submodules:
+                continue
+            value = _module_proxy(value)
+        setattr(proxy, name, value)
+    return proxy
+
+
+def _load_compute_modules():
+    """Import table of the compute profile: full dotted name -> proxy."""
+    modules = {}
+    for name in COMPUTE_MODULES + COMPUTE_OPTIONAL_MODULES:
+        try:
+            proxy = _module_proxy(__import__(name), COMPUTE_SUBMODULES.get(name, ()))
+        except ImportError:
+            continue
+        modules[name] = proxy
+        for sub in COMPUTE_SUBMODULES.get(name, ()):
+            if hasattr(proxy, sub):
+                modules[f"{name}.{sub}"] = getattr(proxy, sub)
+    for alias, name in COMPUTE_ALIASES.items():
+        if name in modules:
+            modules[alias] = modules[name]
+    return modules
+
+
+class _ImportRewriter(ast.NodeTransformer):
+    """
+    Turns import statements into assignments from the import table, e.g.
+    ``import numpy.linalg as la`` into ``la = __sandbox_modules__["numpy.linalg"]``.
+    Runs after _forbid_imports and _forbid_attributes have vetted the names.
+    """
+
+    def __init__(self, modules):
+        self.modules = modules
+
+    def _lookup(self, name: str, node: ast.AST) -> ast.expr:
+        if name not in self.modules:
+            raise ValueError(f"Module not available in sandbox: {name}")
+        table = ast.Name(id=MODULES_NAME, ctx=ast.Load())
+        return ast.copy_location(ast.Subscript(value=table, slice=ast.Constant(name), ctx=ast.Load()), node)
+
+    def _assign(self, target: str, value: ast.expr, node: ast.AST) -> ast.stmt:
+        return ast.copy_location(ast.Assign(targets=[ast.Name(id=target, ctx=ast.Store())], value=value), node)
+
+    def visit_Import(self, node: ast.Import):
+        stmts = []
+        for alias in node.names:
+            if alias.asname:
+                stmts.append(self._assign(alias.asname, self._lookup(alias.name, node), node))
+            else:
+                # "import numpy.linalg" binds "numpy", like the real statement
+                self._lookup(alias.name, node)
+                top = alias.name.split(".")[0]
+                stmts.append(self._assign(top, self._lookup(top, node), node))
+        return stmts
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        stmts = []
+        for alias in node.names:
+            if alias.name == "*":
+                raise ValueError("Star imports are not allowed in sandbox")
+            module = self._lookup(node.module or "", node)
+            value = ast.copy_location(ast.Attribute(value=module, attr=alias.name, ctx=ast.Load()), node)
+            stmts.append(self._assign(alias.asname or alias.name, value, node))
+        return stmts
+
+
+def _compute_builtins(modules):
+    allowed = _restricted_builtins()
+    for name in COMPUTE_BUILTINS:
+        allowed[name] = getattr(builtins, name)
+
+    def _import(name, globals=None, locals=None, fromlist=(), level=0):
+        # Only C code in the preloaded modules gets here (NumPy looks up its own
+        # internals through the caller's builtins and then reads sys.modules):
+        # snippet imports are rewritten and "__import__" is a refused name.
+        if level or name.split(".")[0] not in modules or name not in sys.modules:
+            raise ImportError(f"Module not available in sandbox: {name}")
+        return modules[name.split(".")[0]]
+
+    allowed["__import__"] = _import
+    return allowed
+
+
+def _apply_limits(mem_base: int = 0):
     if resource is None:
         return
-    # CPU time limit
+    # CPU time limit (a forked child starts with its own zeroed CPU counter)
     try:
         resource.setrlimit(resource.RLIMIT_CPU, (TIMEOUT_SEC, TIMEOUT_SEC))
     except Exception:
         pass
-    # Address space (virtual memory)
+    # Address space (virtual memory) on top of what preloaded modules already map
     try:
-        mem_bytes = MEMORY_MB * 1024 * 1024
+        mem_bytes = mem_base + MEMORY_MB * 1024 * 1024
         resource.setrlimit(resource.RLIMIT_AS, (mem_bytes, mem_bytes))
     except Exception:
         pass
 
 
+def _vm_size() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+
 def _timeout_handler(signum, frame):  # pragma: no cover
     raise TimeoutError("Timeout")
 
 
-def main():
-    code = sys.stdin.read()
+def _execute(code: str, modules=None, mem_base: int = 0):
     try:
         tree = ast.parse(code, mode="exec")
-        _forbid_imports(tree)
+        _forbid_imports(tree, {name.split(".")[0] for name in modules or ()})
+        _forbid_attributes(tree)
+        if modules:
+            tree = ast.fix_missing_locations(_ImportRewriter(modules).visit(tree))
         compiled = compile(tree, "<sandbox>", "exec")
     except Exception as e:
-        print(json.dumps({"ok": False, "error": f"Syntax/security error: {e}"}))
-        return
+        return {"ok": False, "error": f"Syntax/security error: {e}"}
 
-    _apply_limits()
+    _apply_limits(mem_base)
     signal.signal(signal.SIGALRM, _timeout_handler)
     signal.alarm(TIMEOUT_SEC)
 
-    stdout = io.StringIO()
-    stderr = io.StringIO()
+    stdout = CappedWriter(OUTPUT_BUDGET_BYTES, OUTPUT_HARD_CAP_BYTES)
+    stderr = CappedWriter(OUTPUT_BUDGET_BYTES, OUTPUT_HARD_CAP_BYTES)
 
     # Redirect stdio
     old_stdout, old_stderr = sys.stdout, sys.stderr
@@ -105,22 +359,100 @@ def main():
 
     try:
         # Very restricted globals
-        glb = {"__builtins__": _restricted_builtins()}
+        if modules is None:
+            glb = {"__builtins__": _restricted_builtins()}
+        else:
+            glb = {"__builtins__": _compute_builtins(modules), MODULES_NAME: modules}
+            glb.update((name, mod) for name, mod in modules.items() if "." not in name)
         loc = {}
         exec(compiled, glb, loc)
-        out = stdout.getvalue()
-        err = stderr.getvalue()
-        result = {"ok": True, "stdout": out[-4000:], "stderr": err[-4000:]}
-        print(json.dumps(result))
+        result = {"ok": True}
+    except OutputLimitExceeded as e:
+        result = {"ok": False, "error": str(e)}
     except TimeoutError:
-        print(json.dumps({"ok": False, "error": "Timeout"}))
+        result = {"ok": False, "error": "Timeout"}
     except Exception as e:
-        print(json.dumps({"ok": False, "error": str(e)}))
+        result = {"ok": False, "error": str(e) or type(e).__name__}
     finally:
         sys.stdout, sys.stderr = old_stdout, old_stderr
         signal.alarm(0)
 
+    result["stdout"] = stdout.getvalue()
+    result["stderr"] = stderr.getvalue()
+    if stdout.dropped or stderr.dropped:
+        result["dropped_bytes"] = {"stdout": stdout.dropped, "stderr": stderr.dropped}
+    return result
+
+
+def _run_forked(code: str, modules, mem_base: int):
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover - child
+        os.close(r)
+        try:
+            result = _execute(code, modules, mem_base)
+        except BaseException as e:
+            result = {"ok": False, "error": str(e)}
+        with os.fdopen(w, "w") as out:
+            out.write(json.dumps(result))
+        os._exit(0)
+
+    os.close(w)
+    chunks = []
+    deadline = time.monotonic() + TIMEOUT_SEC + 1
+    with os.fdopen(r, "rb") as inp:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([inp], [], [], remaining)[0]:
+                os.kill(pid, signal.SIGKILL)
+                break
+            chunk = os.read(inp.fileno(), 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    _, status, ru = os.wait4(pid, 0)
+    try:
+        result = json.loads(b"".join(chunks).decode("utf-8", errors="ignore"))
+    except ValueError:
+        if os.WIFSIGNALED(status) and os.WTERMSIG(status) in (signal.SIGKILL, signal.SIGXCPU):
+            result = {"ok": False, "error": "Timeout"}
+        else:
+            result = {"ok": False, "error": "Sandbox process failed", "exit_status": status}
+    result["rusage"] = {
+        "cpu_user_ms": round(ru.ru_utime * 1000, 1),
+        "cpu_sys_ms": round(ru.ru_stime * 1000, 1),
+        "max_rss_kb": ru.ru_maxrss,
+    }
+    return result
+
+
+def serve(profile: str):
+    # Keep BLAS libraries single-threaded so forking after import is safe.
+    for var in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    modules = _load_compute_modules() if profile == "compute" else None
+    mem_base = _vm_size() if modules else 0
+    out = sys.stdout
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            code = json.loads(line).get("code", "")
+        except ValueError:
+            result = {"ok": False, "error": "Invalid request"}
+        else:
+            result = _run_forked(code, modules, mem_base)
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--worker":
+        serve(sys.argv[2])
+        return
+    code = sys.stdin.read()
+    print(json.dumps(_execute(code)))
+
 
 if __name__ == "__main__":
     main()
-
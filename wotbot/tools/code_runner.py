@@ -2,58 +2,246 @@ import io
 import json
 import logging
 import os
+import select
 import signal
 import subprocess
 import sys
 import tempfile
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, List, Optional
 
 from ..config import settings
+from .sandbox_stats import stats
 
 log = logging.getLogger(__name__)
 
 
-def run_code(language: str, code: str) -> Dict[str, Any]:
+def run_code(language: str, code: str, user_id: Optional[str] = None) -> Dict[str, Any]:
     language = (language or "").lower()
     if language not in {"python", "javascript"}:
         return {"ok": False, "error": f"Unsupported language: {language}"}
 
     if language == "python":
-        return _run_python(code)
+        if settings.code_exec_profile == "compute":
+            result = _compute_worker.run(code)
+        else:
+            result = _run_python(code)
     else:
-        return _run_javascript(code)
+        result = _run_javascript(code)
+    usage = result.get("usage")
+    if usage:
+        stats.record(f"run_code:{language}", user_id, usage)
+        log.debug("CodeRunner: %s run usage %s", language, usage)
+    return result
+
+
+def _usage(rusage, wall_sec: float, output_bytes: int) -> Dict[str, Any]:
+    usage: Dict[str, Any] = {"wall_ms": round(wall_sec * 1000, 1), "output_bytes": output_bytes}
+    if rusage is not None:
+        # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+        rss = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+        usage.update({
+            "cpu_user_ms": round(rusage.ru_utime * 1000, 1),
+            "cpu_sys_ms": round(rusage.ru_stime * 1000, 1),
+            "max_rss_kb": rss,
+        })
+    return usage
+
+
+# Variables passed through to sandbox processes; everything else (API keys, the
+# Twilio token, ...) is withheld.
+_SANDBOX_ENV_VARS = (
+    "PATH", "HOME", "LANG", "LC_ALL", "LC_CTYPE", "TMPDIR", "SYSTEMROOT",
+    "OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS",
+)
+
+
+def _sandbox_env() -> Dict[str, str]:
+    env = {k: os.environ[k] for k in _SANDBOX_ENV_VARS if k in os.environ}
+    env.update({k: v for k, v in os.environ.items() if k.startswith("CODE_EXEC_")})
+    env["CODE_EXEC_TIMEOUT_SEC"] = str(settings.code_exec_timeout_sec)
+    env["CODE_EXEC_MEMORY_MB"] = str(settings.code_exec_memory_mb)
+    # The sandbox runs from a temp dir, so make sure the package stays importable.
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (root, os.environ.get("PYTHONPATH", "")) if p)
+    return env
+
+
+def _exec(cmd: List[str], code: str, cwd: str, timeout: float, env: Optional[Dict[str, str]] = None):
+    """Run cmd with code on stdin; returns (returncode, stdout, stderr, usage, timed_out)."""
+    start = time.monotonic()
+    timed_out = False
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd, env=env)
+    # Pipes are handled by threads rather than communicate(), which reaps the
+    # child itself; reaping here with wait4() is what gives us its rusage
+    out_buf: List[bytes] = []
+    err_buf: List[bytes] = []
+    buf_lock = threading.Lock()
+    threads = [
+        threading.Thread(target=_feed, args=(proc.stdin, code.encode("utf-8")), daemon=True),
+        threading.Thread(target=_drain, args=(proc.stdout, out_buf, buf_lock), daemon=True),
+        threading.Thread(target=_drain, args=(proc.stderr, err_buf, buf_lock), daemon=True),
+    ]
+    for t in threads:
+        t.start()
+    deadline = start + timeout
+    for t in threads:
+        t.join(max(0.0, deadline - time.monotonic()))
+    if any(t.is_alive() for t in threads):
+        proc.kill()
+        timed_out = True
+        # Bounded: a grandchild could still hold the pipes open
+        for t in threads:
+            t.join(5)
+    rusage = None
+    if hasattr(os, "wait4"):
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        proc.wait()
+    # A drain thread outliving the bounded join may still be appending
+    with buf_lock:
+        out, err = b"".join(out_buf), b"".join(err_buf)
+    usage = _usage(rusage, time.monotonic() - start, len(out) + len(err))
+    return proc.returncode, out, err, usage, timed_out
+
+
+def _feed(stream, data: bytes) -> None:
+    try:
+        stream.write(data)
+    except (BrokenPipeError, OSError, ValueError):
+        pass
+    finally:
+        try:
+            stream.close()
+        except OSError:
+            pass
+
+
+def _drain(stream, buf: List[bytes], lock: threading.Lock) -> None:
+    try:
+        while True:
+            chunk = stream.read1(65536)
+            if not chunk:
+                break
+            with lock:
+                buf.append(chunk)
+    except (OSError, ValueError):
+        pass
+    finally:
+        stream.close()
 
 
 def _run_python(code: str) -> Dict[str, Any]:
     with tempfile.TemporaryDirectory() as td:
         runner = [sys.executable, "-m", "wotbot.tools._py_sandbox"]
+        log.info("CodeRunner: executing python snippet with timeout=%ss", settings.code_exec_timeout_sec)
+        returncode, out, err, usage, timed_out = _exec(runner, code, td, settings.code_exec_timeout_sec + 1, _sandbox_env())
+        if timed_out:
+            return {"ok": False, "error": "Timeout", "usage": usage}
+        if returncode != 0:
+            return {
+                "ok": False,
+                "exit_code": returncode,
+                "stderr": err.decode("utf-8", errors="ignore")[:4000],
+                "usage": usage,
+            }
         try:
-            log.info("CodeRunner: executing python snippet with timeout=%ss", settings.code_exec_timeout_sec)
-            proc = subprocess.run(
-                runner,
-                input=code.encode("utf-8"),
-                cwd=td,
+            data = json.loads(out.decode("utf-8", errors="ignore"))
+        except json.JSONDecodeError:
+            data = {
+                "ok": False,
+                "error": "Non-JSON output from sandbox",
+                "raw": out.decode("utf-8", errors="ignore")[:4000],
+            }
+        data["usage"] = usage
+        return data
+
+
+class _WarmWorker:
+    """
+    Long-lived sandbox process for a profile (see _py_sandbox.serve). Modules are
+    imported once in the worker; each run is forked from it with fresh limits.
+    Runs are serialized over the worker's stdin/stdout; a crashed or hung worker
+    is killed and respawned on the next run.
+    """
+
+    def __init__(self, profile: str):
+        self.profile = profile
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._cwd: Optional[str] = None
+
+    def _ensure(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            log.info("CodeRunner: starting warm %s worker", self.profile)
+            if self._cwd is None:
+                self._cwd = tempfile.mkdtemp(prefix="wotbot-sandbox-")
+            self._proc = subprocess.Popen(
+                [sys.executable, "-m", "wotbot.tools._py_sandbox", "--worker", self.profile],
+                stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=settings.code_exec_timeout_sec + 1,
+                stderr=subprocess.DEVNULL,
+                cwd=self._cwd,
+                env=_sandbox_env(),
+                text=True,
+                bufsize=1,
             )
-            if proc.returncode != 0:
-                return {
-                    "ok": False,
-                    "exit_code": proc.returncode,
-                    "stderr": proc.stderr.decode("utf-8", errors="ignore")[:4000],
-                }
+        return self._proc
+
+    def _kill(self):
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+                self._proc.wait(timeout=1)
+            except Exception:
+                pass
+            self._proc = None
+
+    def warm_up(self):
+        with self._lock:
+            self._ensure()
+
+    def run(self, code: str) -> Dict[str, Any]:
+        timeout = settings.code_exec_timeout_sec + 2
+        start = time.monotonic()
+        if not self._lock.acquire(timeout=timeout):
+            return {"ok": False, "error": "Sandbox busy"}
+        try:
+            proc = self._ensure()
+            ready = []
             try:
-                data = json.loads(proc.stdout.decode("utf-8", errors="ignore"))
-            except json.JSONDecodeError:
-                data = {
-                    "ok": False,
-                    "error": "Non-JSON output from sandbox",
-                    "raw": proc.stdout.decode("utf-8", errors="ignore")[:4000],
-                }
-            return data
-        except subprocess.TimeoutExpired:
-            return {"ok": False, "error": "Timeout"}
+                assert proc.stdin and proc.stdout
+                proc.stdin.write(json.dumps({"code": code}) + "\n")
+                proc.stdin.flush()
+                ready = select.select([proc.stdout], [], [], timeout)[0]
+                line = proc.stdout.readline() if ready else ""
+            except (OSError, ValueError):
+                line = ""
+            if not line:
+                self._kill()
+                return {"ok": False, "error": "Timeout" if not ready else "Sandbox worker failed",
+                        "usage": {"wall_ms": round((time.monotonic() - start) * 1000, 1), "output_bytes": 0}}
+        finally:
+            self._lock.release()
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            return {"ok": False, "error": "Non-JSON output from sandbox", "raw": line[:4000]}
+        usage = {"wall_ms": round((time.monotonic() - start) * 1000, 1), "output_bytes": len(line)}
+        usage.update(data.pop("rusage", {}))
+        data["usage"] = usage
+        return data
+
+
+_compute_worker = _WarmWorker("compute")
+
+
+def warm_up() -> None:
+    """Start the warm worker for the configured profile so the first run is fast."""
+    if settings.code_exec_profile == "compute":
+        _compute_worker.warm_up()
 
 
 def _run_javascript(code: str) -> Dict[str, Any]:
@@ -79,25 +267,21 @@ process.stdin.on('end', () => {
 
     with tempfile.TemporaryDirectory() as td:
         try:
-            proc = subprocess.run(
-                ["node", "-e", js_driver],
-                input=code.encode("utf-8"),
-                cwd=td,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=settings.code_exec_timeout_sec + 2,
-            )
-            if proc.returncode != 0:
-                return {
-                    "ok": False,
-                    "exit_code": proc.returncode,
-                    "stderr": proc.stderr.decode("utf-8", errors="ignore")[:4000],
-                }
-            try:
-                return json.loads(proc.stdout.decode("utf-8", errors="ignore"))
-            except json.JSONDecodeError:
-                return {"ok": False, "error": "Non-JSON output", "raw": proc.stdout.decode("utf-8", errors="ignore")[:4000]}
+            returncode, out, err, usage, timed_out = _exec(["node", "-e", js_driver], code, td, settings.code_exec_timeout_sec + 2, _sandbox_env())
         except FileNotFoundError:
             return {"ok": False, "error": "Node.js not available"}
-        except subprocess.TimeoutExpired:
-            return {"ok": False, "error": "Timeout"}
+        if timed_out:
+            return {"ok": False, "error": "Timeout", "usage": usage}
+        if returncode != 0:
+            return {
+                "ok": False,
+                "exit_code": returncode,
+                "stderr": err.decode("utf-8", errors="ignore")[:4000],
+                "usage": usage,
+            }
+        try:
+            data = json.loads(out.decode("utf-8", errors="ignore"))
+        except json.JSONDecodeError:
+            data = {"ok": False, "error": "Non-JSON output", "raw": out.decode("utf-8", errors="ignore")[:4000]}
+        data["usage"] = usage
+        return data
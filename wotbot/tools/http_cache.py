@@ -0,0 +1,354 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional
+
+log = logging.getLogger(__name__)
+
+
+# Status codes that are cacheable by default (RFC 9110 section 15.1)
+CACHEABLE_STATUS = {200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501}
+# Cap for heuristic freshness derived from Last-Modified
+HEURISTIC_MAX_SEC = 3600
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    out: Dict[str, Optional[str]] = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip().lower()] = v.strip().strip('"')
+        else:
+            out[part.lower()] = None
+    return out
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except Exception:
+        return None
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return max(0, int(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _lower_keys(headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+    return {str(k).lower(): str(v) for k, v in (headers or {}).items()}
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    vary: Dict[str, str] = field(default_factory=dict)
+    stored_at: float = field(default_factory=time.time)
+    freshness: float = 0.0
+    age: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers.items()) + len(self.url)
+
+    def current_age(self, now: float) -> float:
+        return self.age + max(0.0, now - self.stored_at)
+
+    def is_fresh(self, now: float) -> bool:
+        if "no-cache" in parse_cache_control(_lower_keys(self.headers).get("cache-control")):
+            return False
+        return self.current_age(now) < self.freshness
+
+    def validators(self) -> Dict[str, str]:
+        h = _lower_keys(self.headers)
+        out = {}
+        if h.get("etag"):
+            out["If-None-Match"] = h["etag"]
+        if h.get("last-modified"):
+            out["If-Modified-Since"] = h["last-modified"]
+        return out
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "status": self.status,
+            "headers": self.headers,
+            "body": base64.b64encode(self.body).decode("ascii"),
+            "vary": self.vary,
+            "stored_at": self.stored_at,
+            "freshness": self.freshness,
+            "age": self.age,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "CacheEntry":
+        data = dict(data)
+        data["body"] = base64.b64decode(data.get("body", ""))
+        return cls(**data)
+
+
+def freshness_lifetime(headers: Dict[str, str], now: float) -> float:
+    """Freshness lifetime for a shared cache (RFC 9111 section 4.2.1)."""
+    h = _lower_keys(headers)
+    cc = parse_cache_control(h.get("cache-control"))
+    for directive in ("s-maxage", "max-age"):
+        val = _int(cc.get(directive))
+        if val is not None:
+            return float(val)
+    date = _http_date(h.get("date")) or now
+    expires = h.get("expires")
+    if expires is not None:
+        exp = _http_date(expires)
+        return max(0.0, exp - date) if exp is not None else 0.0
+    last_modified = _http_date(h.get("last-modified"))
+    if last_modified is not None:
+        # Heuristic freshness: 10% of the time since last modification
+        return min(HEURISTIC_MAX_SEC, max(0.0, (date - last_modified) * 0.1))
+    return 0.0
+
+
+class HttpCache:
+    """
+    In-memory LRU HTTP response cache for GET, bounded by total bytes, with
+    optional write-through persistence to a directory. Follows the shared-cache
+    rules of RFC 9111: honors Cache-Control (no-store, no-cache, private,
+    max-age, s-maxage), Expires, Age and Vary, and revalidates stale entries
+    with If-None-Match / If-Modified-Since. Requests carrying credentials are
+    never cached.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, credential_headers: Iterable[str] = ()):
+        self.max_bytes = max(0, max_bytes)
+        self.max_entry_bytes = max(1, self.max_bytes // 8)
+        self.disk_dir = disk_dir or None
+        self.credential_headers = {h.lower() for h in credential_headers}
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+        self._disk_writes = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    # Request side
+
+    def request_cacheable(self, method: str, headers: Optional[Dict[str, str]]) -> bool:
+        if method != "GET" or self.max_bytes <= 0:
+            return False
+        h = _lower_keys(headers)
+        if any(k in self.credential_headers for k in h) or "cookie" in h:
+            return False
+        cc = parse_cache_control(h.get("cache-control"))
+        return "no-store" not in cc
+
+    def lookup(self, url: str, headers: Optional[Dict[str, str]]) -> Optional[CacheEntry]:
+        h = _lower_keys(headers)
+        key = _key(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._load(key)
+        if entry is None or any(h.get(name, "") != val for name, val in entry.vary.items()):
+            self._bump("misses")
+            return None
+        if "no-cache" in parse_cache_control(h.get("cache-control")):
+            # Client asks for revalidation; treat entry as stale
+            return replace(entry, freshness=0.0)
+        return entry
+
+    # Response side
+
+    def store(self, url: str, req_headers: Optional[Dict[str, str]], status: int, headers: Dict[str, str], body: bytes) -> bool:
+        now = time.time()
+        h = _lower_keys(headers)
+        cc = parse_cache_control(h.get("cache-control"))
+        if status not in CACHEABLE_STATUS or "no-store" in cc or "private" in cc or "set-cookie" in h:
+            self._bump("bypassed")
+            return False
+        vary_names = [v.strip().lower() for v in h.get("vary", "").split(",") if v.strip()]
+        if "*" in vary_names:
+            self._bump("bypassed")
+            return False
+        freshness = freshness_lifetime(h, now)
+        if freshness <= 0 and "no-cache" not in cc and not (h.get("etag") or h.get("last-modified")):
+            # Nothing to reuse and nothing to revalidate with
+            return False
+        rh = _lower_keys(req_headers)
+        entry = CacheEntry(
+            url=url,
+            status=status,
+            headers=dict(headers),
+            body=body,
+            vary={name: rh.get(name, "") for name in vary_names},
+            stored_at=now,
+            freshness=freshness,
+            age=float(_int(h.get("age")) or 0),
+        )
+        if entry.size > self.max_entry_bytes:
+            self._bump("bypassed")
+            return False
+        self._put(_key(url), entry)
+        self._bump("stores")
+        return True
+
+    def revalidated(self, entry: CacheEntry, headers: Dict[str, str]) -> CacheEntry:
+        """Merge a 304 response's headers into the entry and refresh it."""
+        now = time.time()
+        merged = dict(entry.headers)
+        lower = {k.lower(): k for k in merged}
+        for k, v in headers.items():
+            if k.lower() in {"content-length", "content-encoding", "transfer-encoding"}:
+                continue
+            merged.pop(lower.get(k.lower(), k), None)
+            merged[k] = v
+        h = _lower_keys(merged)
+        entry = CacheEntry(
+            url=entry.url,
+            status=entry.status,
+            headers=merged,
+            body=entry.body,
+            vary=entry.vary,
+            stored_at=now,
+            freshness=freshness_lifetime(h, now),
+            age=float(_int(h.get("age")) or 0),
+        )
+        self._put(_key(entry.url), entry)
+        self._bump("revalidated")
+        return entry
+
+    def hit(self) -> None:
+        self._bump("hits")
+
+    def invalidate(self, url: str) -> None:
+        key = _key(url)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+        self._remove_disk(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+        for key in keys:
+            self._remove_disk(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ok": True,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_dir": self.disk_dir,
+                **self._stats,
+            }
+
+    # Internals
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _put(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._stats["evictions"] += 1
+        self._save(key, entry)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir or "", key + ".json")
+
+    def _save(self, key: str, entry: CacheEntry) -> None:
+        if not self.disk_dir:
+            return
+        try:
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry.to_json(), f)
+            os.replace(tmp, self._path(key))
+            self._disk_writes += 1
+            if self._disk_writes % 50 == 0:
+                self._prune_disk()
+        except Exception as e:
+            log.warning("HTTP cache disk write failed: %s", e)
+
+    def _load(self, key: str) -> Optional[CacheEntry]:
+        if not self.disk_dir or not os.path.exists(self._path(key)):
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = CacheEntry.from_json(json.load(f))
+        except Exception:
+            self._remove_disk(key)
+            return None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+        return entry
+
+    def _remove_disk(self, key: str) -> None:
+        if self.disk_dir:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _prune_disk(self) -> None:
+        # Keep the directory within 4x the memory budget, dropping oldest files first
+        files = []
+        for name in os.listdir(self.disk_dir or "."):
+            if name.endswith(".json"):
+                path = os.path.join(self.disk_dir or "", name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(f[1] for f in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes * 4:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def _key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
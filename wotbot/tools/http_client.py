@@ -1,11 +1,21 @@
+import csv
 import json
 import logging
-from typing import Dict, Any, Optional
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
 from urllib.parse import urlparse
 
-import requests
-
 from ..config import settings
+from ..utils.content_extract import csv_summary, html_to_text, json_project
+from ..utils.lazy import Lazy
+from .http_cache import HttpCache
+
+if TYPE_CHECKING:
+    import requests
 
 log = logging.getLogger(__name__)
 
@@ -35,7 +45,296 @@ def _domain_allowed(url: str) -> bool:
     return any(netloc.endswith(d.lower()) or netloc == d.lower() for d in allow)
 
 
-def http_request(method: str, url: str, headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, str]] = None, body: Any = None) -> Dict[str, Any]:
+# Pooled clients are shared by every user, so a Set-Cookie from one user's call
+# must never be replayed on another's: their cookie jars store nothing
+_REJECT_COOKIES = DefaultCookiePolicy(allowed_domains=[])
+
+
+class SessionPool:
+    """
+    Bounded LRU of keep-alive sessions, one per origin (scheme://host:port), so
+    repeated tool calls to the same API reuse TCP/TLS connections. With
+    HTTP_USE_HTTP2 enabled, a single shared httpx client (which pools per
+    origin itself) is used instead. Tracks requests and newly opened
+    connections per origin to expose reuse stats. Like the one-off requests
+    they replace, pooled clients keep no cookies and follow redirects.
+    """
+
+    def __init__(self, max_hosts: int, pool_maxsize: int, use_http2: bool = False):
+        self.max_hosts = max(1, max_hosts)
+        self.pool_maxsize = max(1, pool_maxsize)
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, requests.Session]" = OrderedDict()
+        self._stats: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._totals = {"requests": 0, "connections_opened": 0, "evictions": 0}
+        self._httpx = _make_httpx_client(self.max_hosts, self.pool_maxsize) if use_http2 else None
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        p = urlparse(url)
+        return f"{p.scheme.lower()}://{p.netloc.lower()}"
+
+    def _new_session(self) -> "requests.Session":
+        # requests is imported on the first HTTP tool call, not at startup
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.cookies.set_policy(_REJECT_COOKIES)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @staticmethod
+    def _opened(session: "requests.Session") -> int:
+        # Connections created so far by the urllib3 pools behind this session
+        total = 0
+        for adapter in session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                total += getattr(pool, "num_connections", 0) if pool is not None else 0
+        return total
+
+    def _host_stats(self, origin: str) -> Dict[str, int]:
+        st = self._stats.get(origin)
+        if st is None:
+            st = self._stats[origin] = {"requests": 0, "connections_opened": 0}
+            while len(self._stats) > self.max_hosts * 4:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(origin)
+        return st
+
+    def _session_for(self, origin: str) -> "requests.Session":
+        with self._lock:
+            session = self._sessions.get(origin)
+            if session is not None:
+                self._sessions.move_to_end(origin)
+                return session
+            session = self._sessions[origin] = self._new_session()
+            while len(self._sessions) > self.max_hosts:
+                _, old = self._sessions.popitem(last=False)
+                self._totals["evictions"] += 1
+                old.close()
+            return session
+
+    def request(self, method: str, url: str, **kwargs):
+        """Send a request and return a streaming response; callers read it with read_body()."""
+        origin = self._origin(url)
+        if self._httpx is not None:
+            opened = []
+
+            def _trace(event: str, info: Dict[str, Any]) -> None:
+                if event == "connection.connect_tcp.complete":
+                    opened.append(1)
+
+            try:
+                req = self._httpx.build_request(method, url, extensions={"trace": _trace}, **_httpx_kwargs(kwargs))
+                resp = self._httpx.send(req, stream=True)
+            finally:
+                self._count(origin, len(opened))
+            return resp
+
+        session = self._session_for(origin)
+        before = self._opened(session)
+        try:
+            return session.request(method, url, stream=True, **kwargs)
+        finally:
+            self._count(origin, max(0, self._opened(session) - before))
+
+    def _count(self, origin: str, opened: int) -> None:
+        with self._lock:
+            st = self._host_stats(origin)
+            st["requests"] += 1
+            st["connections_opened"] += opened
+            self._totals["requests"] += 1
+            self._totals["connections_opened"] += opened
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hosts = {
+                origin: {**st, "reused": max(0, st["requests"] - st["connections_opened"])}
+                for origin, st in self._stats.items()
+            }
+            totals = dict(self._totals)
+            pooled = len(self._sessions)
+        totals["reused"] = max(0, totals["requests"] - totals["connections_opened"])
+        return {
+            "ok": True,
+            "transport": "httpx-http2" if self._httpx is not None else "requests",
+            "pooled_hosts": pooled,
+            "max_hosts": self.max_hosts,
+            "pool_maxsize": self.pool_maxsize,
+            "totals": totals,
+            "hosts": hosts,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+        if self._httpx is not None:
+            self._httpx.close()
+
+
+def _make_httpx_client(max_hosts: int, pool_maxsize: int):
+    try:
+        import httpx
+
+        limits = httpx.Limits(max_connections=max_hosts * pool_maxsize, max_keepalive_connections=max_hosts * pool_maxsize)
+        return httpx.Client(http2=True, limits=limits, cookies=CookieJar(policy=_REJECT_COOKIES), follow_redirects=True)
+    except ImportError as e:
+        # httpx needs the optional 'h2' package for HTTP/2
+        log.warning("HTTP/2 transport unavailable (%s); using requests sessions", e)
+        return None
+
+
+def _httpx_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    # Translate the requests-style keyword arguments used by http_request
+    out = dict(kwargs)
+    if "data" in out:
+        out["content"] = out.pop("data")
+    return out
+
+
+_pool: Optional[SessionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SessionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool(settings.http_pool_max_hosts, settings.http_pool_maxsize, settings.http_use_http2)
+        return _pool
+
+
+def pool_stats() -> Dict[str, Any]:
+    return get_pool().stats()
+
+
+_cache: Optional[HttpCache] = None
+
+
+def get_cache() -> Optional[HttpCache]:
+    global _cache
+    if not settings.http_cache_enabled:
+        return None
+    with _pool_lock:
+        if _cache is None:
+            _cache = HttpCache(settings.http_cache_max_bytes, settings.http_cache_dir or None, REDACT_HEADERS)
+        return _cache
+
+
+def cache_stats() -> Dict[str, Any]:
+    cache = get_cache()
+    return cache.stats() if cache else {"ok": True, "enabled": False}
+
+
+def _full_url(url: str, params: Optional[Dict[str, str]]) -> str:
+    import requests
+
+    try:
+        return requests.Request("GET", url, params=params).prepare().url or url
+    except Exception:
+        return url
+
+
+def read_body(resp, max_bytes: int, deadline: Optional[float] = None) -> Tuple[bytes, bool]:
+    """
+    Read a streaming response up to max_bytes, or until the time.monotonic()
+    deadline if given; returns (content, truncated).
+    """
+    chunks: List[bytes] = []
+    total = 0
+    truncated = False
+    chunk_iter = resp.iter_content(16384) if hasattr(resp, "iter_content") else resp.iter_bytes()
+    try:
+        for chunk in chunk_iter:
+            if total + len(chunk) > max_bytes:
+                chunks.append(chunk[: max_bytes - total])
+                truncated = True
+                break
+            chunks.append(chunk)
+            total += len(chunk)
+            if deadline is not None and time.monotonic() >= deadline:
+                truncated = True
+                break
+    finally:
+        resp.close()
+    return b"".join(chunks), truncated
+
+
+def _response_payload(
+    status: int,
+    headers: Dict[str, str],
+    content: bytes,
+    truncated: bool = False,
+    select: Optional[List[str]] = None,
+    raw: bool = False,
+) -> Dict[str, Any]:
+    content_type = next((v for k, v in headers.items() if k.lower() == "content-type"), "")
+    mime = content_type.split(";")[0].strip().lower()
+    charset = "utf-8"
+    for param in content_type.split(";")[1:]:
+        k, _, v = param.strip().partition("=")
+        if k.lower() == "charset" and v:
+            charset = v.strip('"')
+    try:
+        text = content.decode(charset, errors="replace")
+    except LookupError:
+        text = content.decode("utf-8", errors="replace")
+    data: Any
+    if mime == "application/json" or mime.endswith("+json"):
+        try:
+            data = json.loads(text)
+            if select:
+                data = json_project(data, select)
+        except ValueError:
+            data = text[:4000]
+    elif raw:
+        data = text[:4000]
+    elif mime in {"text/html", "application/xhtml+xml"}:
+        page = html_to_text(text)
+        data = (page["title"] + "\n\n" if page["title"] else "") + page["text"]
+        data = data[:4000]
+    elif mime in {"text/csv", "application/csv", "text/tab-separated-values"}:
+        try:
+            data = csv_summary(text, truncated=truncated)
+        except csv.Error:
+            # e.g. a field over the csv module's size limit
+            data = text[:4000]
+    else:
+        data = text[:4000]
+
+    out = {
+        "ok": True,
+        "status": status,
+        "headers": _redact_headers(headers),
+        "data": data,
+    }
+    if truncated:
+        out["truncated"] = True
+    return out
+
+
+def http_request(
+    method: str,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    params: Optional[Dict[str, str]] = None,
+    body: Any = None,
+    select: Optional[List[str]] = None,
+    raw: bool = False,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    ``timeout`` bounds the whole request, body included (http_batch passes the
+    time left in the batch); by default each connect/read gets HTTP_TIMEOUT_SEC.
+    """
     method = method.upper()
     if method not in {"GET", "POST", "PUT", "DELETE"}:
         return {"ok": False, "error": f"Unsupported method {method}"}
@@ -45,33 +344,127 @@ def http_request(method: str, url: str, headers: Optional[Dict[str, str]] = None
     safe_headers = headers or {}
     log.info("HTTP tool %s %s headers=%s params=%s", method, url, _redact_headers(safe_headers), params)
 
+    cache = get_cache()
+    cache_url = _full_url(url, params)
+    cacheable = cache is not None and cache.request_cacheable(method, safe_headers)
+    entry = cache.lookup(cache_url, safe_headers) if cacheable else None
+    send_headers = safe_headers
+    if entry is not None:
+        if entry.is_fresh(time.time()):
+            cache.hit()
+            return {**_response_payload(entry.status, entry.headers, entry.body, select=select, raw=raw), "cache": "hit"}
+        send_headers = {**safe_headers, **entry.validators()}
+
     try:
-        resp = requests.request(
+        resp = get_pool().request(
             method,
             url,
-            headers=safe_headers,
+            headers=send_headers,
             params=params,
             json=body if isinstance(body, (dict, list)) else None,
             data=None if isinstance(body, (dict, list)) else (body if body is not None else None),
-            timeout=settings.http_timeout_sec,
+            timeout=settings.http_timeout_sec if timeout is None else min(settings.http_timeout_sec, timeout),
         )
-    except requests.RequestException as e:
+    except Exception as e:
+        # requests.RequestException or httpx.HTTPError depending on transport
         return {"ok": False, "error": str(e)}
 
-    content_type = resp.headers.get("content-type", "")
-    data: Any
-    if "application/json" in content_type:
-        try:
-            data = resp.json()
-        except ValueError:
-            data = resp.text[:4000]
-    else:
-        data = resp.text[:4000]
+    resp_headers = dict(resp.headers)
+    if entry is not None and resp.status_code == 304:
+        resp.close()
+        entry = cache.revalidated(entry, resp_headers)
+        return {**_response_payload(entry.status, entry.headers, entry.body, select=select, raw=raw), "cache": "revalidated"}
 
-    return {
-        "ok": True,
-        "status": resp.status_code,
-        "headers": _redact_headers(dict(resp.headers)),
-        "data": data,
-    }
+    try:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        content, truncated = read_body(resp, settings.http_max_body_bytes, deadline)
+    except Exception as e:
+        return {"ok": False, "status": resp.status_code, "error": f"Failed reading body: {e}"}
+    if cacheable and not truncated:
+        cache.store(cache_url, safe_headers, resp.status_code, resp_headers, content)
+    elif cache is not None and method != "GET" and resp.status_code < 400:
+        # Unsafe methods invalidate the stored response for the target URI
+        cache.invalidate(cache_url)
+    return _response_payload(resp.status_code, resp_headers, content, truncated, select, raw)
+
+
+# Shared by all http_batch calls: the registry runs at most two at once (see
+# tool_router), each with up to HTTP_BATCH_CONCURRENCY requests in flight
+_batch_pool: Lazy[ThreadPoolExecutor] = Lazy(
+    lambda: ThreadPoolExecutor(max_workers=2 * max(1, settings.http_batch_concurrency), thread_name_prefix="http-batch")
+)
+
+
+def _batch_item(item: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+    # Sized when the pool starts the item, not when it was queued
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return {"ok": False, "error": "Timeout"}
+    return http_request(
+        method=item.get("method", "GET"),
+        url=item["url"],
+        headers=item.get("headers"),
+        params=item.get("params"),
+        body=item.get("body"),
+        select=item.get("select"),
+        raw=bool(item.get("raw", False)),
+        timeout=remaining,
+    )
+
+
+def http_batch(requests_list: List[Dict[str, Any]], concurrency: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Run several http_request calls concurrently and return their results in
+    order. Each item takes the same fields as http_request. The allowlist is
+    checked up front, concurrency is capped, and all requests share one
+    deadline: each request's timeout is bounded by the time left, and items
+    not done by the deadline report a timeout.
+    """
+    if not isinstance(requests_list, list) or not requests_list:
+        return {"ok": False, "error": "requests must be a non-empty list"}
+    if len(requests_list) > settings.http_batch_max_requests:
+        return {"ok": False, "error": f"Too many requests (max {settings.http_batch_max_requests})"}
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(requests_list)
+    pending = []
+    for i, item in enumerate(requests_list):
+        if not isinstance(item, dict) or not item.get("url"):
+            results[i] = {"ok": False, "error": "Each request needs a url"}
+        elif not _domain_allowed(item["url"]):
+            results[i] = {"ok": False, "error": f"Domain not allowed for URL: {item['url']}"}
+        else:
+            pending.append(i)
+
+    workers = max(1, min(concurrency or settings.http_batch_concurrency, settings.http_batch_concurrency))
+    executor = _batch_pool.get()
+    deadline = time.monotonic() + settings.http_batch_timeout_sec
+    futures: Dict[Any, int] = {}
+    running: set = set()
+    # Keep at most `workers` of this batch in flight on the shared pool
+    while pending or running:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        while pending and len(running) < workers:
+            i = pending.pop(0)
+            fut = executor.submit(_batch_item, requests_list[i], deadline)
+            futures[fut] = i
+            running.add(fut)
+        done, running = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+        for fut in done:
+            try:
+                results[futures[fut]] = fut.result()
+            except Exception as e:
+                results[futures[fut]] = {"ok": False, "error": str(e)}
+    # Past the deadline: drop queued items from the shared pool; started ones
+    # end within their own (deadline-bounded) timeout and are discarded
+    for fut in running:
+        fut.cancel()
+        results[futures[fut]] = {"ok": False, "error": "Timeout"}
+    for i in pending:
+        results[i] = {"ok": False, "error": "Timeout"}
 
+    out = []
+    for i, res in enumerate(results):
+        out.append({"index": i, "url": requests_list[i].get("url") if isinstance(requests_list[i], dict) else None, **(res or {})})
+    return {"ok": True, "results": out}
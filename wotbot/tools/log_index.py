@@ -0,0 +1,276 @@
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+from .log_reader import LEVELS, rotated_files
+
+log = logging.getLogger(__name__)
+
+
+# Header of a record written by logging_config's text or JSON formatter
+_HEADER = re.compile(
+    rb'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:,\d+)? (\w+) \[([^\]]*)\]'
+    rb'|\{"time": "(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})", "level": "(\w+)", "logger": "((?:[^"\\]|\\.)*)"'
+)
+# WhatsApp senders appear as "whatsapp:+15551234567" (or bare E.164 numbers)
+_PHONE = re.compile(rb"(?:whatsapp:)?(\+\d{7,15})\b")
+_LEVEL_IDS = {name.encode(): value // 10 for name, value in LEVELS.items()}
+
+# Bytes of a record returned per match, and records whose text is read per
+# query when a substring filter forces reading from disk.
+MAX_RECORD_BYTES = 8000
+MAX_SCANNED_RECORDS = 20000
+
+
+def normalize_user(user: str) -> str:
+    user = (user or "").strip()
+    return user[len("whatsapp:"):] if user.startswith("whatsapp:") else user
+
+
+def parse_time(value: str) -> float:
+    """Local 'YYYY-MM-DD HH:MM[:SS]' (as written in the log) or epoch seconds."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time: {value}")
+
+
+class _FileIndex:
+    """Record start offsets of one log file plus per-record time/level/logger and user postings."""
+
+    def __init__(self, key: Tuple[int, int], path: str):
+        self.key = key
+        self.path = path
+        self.size = 0  # bytes indexed (always ends on a line boundary)
+        self.offsets = array("q")
+        self.times = array("d")
+        self.levels = array("b")
+        self.loggers = array("H")
+        self.users: Dict[str, array] = {}
+
+    def end_of(self, i: int) -> int:
+        return self.offsets[i + 1] if i + 1 < len(self.offsets) else self.size
+
+    def memory_bytes(self) -> int:
+        n = len(self.offsets)
+        return n * (8 + 8 + 1 + 2) + sum(len(a) * a.itemsize for a in self.users.values())
+
+
+class LogIndex:
+    """
+    Incremental index over app.log and its rotated backups. Files are tracked
+    by inode, so a rotation (rename to app.log.1) keeps its index and only new
+    bytes are parsed on each refresh. Queries use the index to pick matching
+    records and read only those byte ranges from disk.
+    """
+
+    def __init__(self, base: str = "app.log"):
+        self.base = base
+        self._lock = threading.Lock()
+        self._files: Dict[Tuple[int, int], _FileIndex] = {}
+        self._order: List[Tuple[int, int]] = []  # newest file first
+        self._logger_ids: Dict[str, int] = {}
+        self._logger_names: List[str] = []
+        self._time_cache: Dict[bytes, float] = {}
+        self._last_refresh = 0.0
+
+    # Indexing
+
+    def refresh(self) -> None:
+        with self._lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self) -> None:
+        base = os.path.join(settings.logs_dir, self.base)
+        seen: List[Tuple[int, int]] = []
+        for path in rotated_files(base) if os.path.exists(base) else []:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            key = (st.st_dev, st.st_ino)
+            fi = self._files.get(key)
+            if fi is None or st.st_size < fi.size:
+                # New file, or truncated/replaced in place
+                fi = self._files[key] = _FileIndex(key, path)
+            fi.path = path
+            if st.st_size > fi.size:
+                self._index_file(fi, st.st_size)
+            seen.append(key)
+        for key in set(self._files) - set(seen):
+            del self._files[key]
+        self._order = seen
+        self._last_refresh = time.time()
+
+    def _index_file(self, fi: _FileIndex, size: int) -> None:
+        with open(fi.path, "rb") as f:
+            f.seek(fi.size)
+            pos = fi.size
+            carry = b""
+            while pos + len(carry) < size:
+                chunk = f.read(min(1 << 20, size - pos - len(carry)))
+                if not chunk:
+                    break
+                data = carry + chunk
+                cut = data.rfind(b"\n")
+                if cut == -1:
+                    carry = data
+                    continue
+                self._index_lines(fi, data[: cut + 1], pos)
+                pos += cut + 1
+                carry = data[cut + 1:]
+            fi.size = pos
+
+    def _index_lines(self, fi: _FileIndex, data: bytes, base: int) -> None:
+        start = 0
+        while start < len(data):
+            end = data.index(b"\n", start)
+            m = _HEADER.match(data, start, end)
+            if m:
+                stamp, level, logger = (m.group(1), m.group(2), m.group(3)) if m.group(1) else m.group(4, 5, 6)
+                ts = self._time_cache.get(stamp)
+                if ts is None:
+                    if len(self._time_cache) > 4096:
+                        self._time_cache.clear()
+                    ts = self._time_cache[stamp] = time.mktime(time.strptime(stamp.decode(), "%Y-%m-%d %H:%M:%S"))
+                idx = len(fi.offsets)
+                fi.offsets.append(base + start)
+                fi.times.append(ts)
+                fi.levels.append(_LEVEL_IDS.get(level, 0))
+                fi.loggers.append(self._logger_id(logger.decode("utf-8", errors="ignore")))
+                for user in {u.decode() for u in _PHONE.findall(data, m.end(), end)}:
+                    fi.users.setdefault(user, array("I")).append(idx)
+            start = end + 1
+
+    def _logger_id(self, name: str) -> int:
+        lid = self._logger_ids.get(name)
+        if lid is None:
+            lid = self._logger_ids[name] = len(self._logger_names)
+            self._logger_names.append(name)
+        return lid
+
+    # Query
+
+    def query(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        level: Optional[str] = None,
+        logger: Optional[str] = None,
+        user: Optional[str] = None,
+        contains: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Matching records newest first. ``level`` is a minimum, ``logger``
+        matches the name or its children, ``user`` a WhatsApp number. Pass the
+        returned ``next_cursor`` back to get the following (older) page.
+        """
+        min_level = 0
+        if level:
+            if level.upper() not in LEVELS:
+                raise ValueError(f"Unknown level: {level}")
+            min_level = LEVELS[level.upper()] // 10
+        limit = max(1, min(int(limit), 500))
+        after: Optional[Tuple[Tuple[int, int], int]] = None
+        if cursor:
+            try:
+                dev, ino, idx = (int(x) for x in cursor.split(":"))
+                after = ((dev, ino), idx)
+            except ValueError:
+                raise ValueError("Invalid cursor")
+        needle = contains.encode("utf-8") if contains else None
+        user_key = normalize_user(user) if user else None
+
+        with self._lock:
+            self._refresh_locked()
+            loggers = None
+            if logger:
+                loggers = {
+                    lid for name, lid in self._logger_ids.items() if name == logger or name.startswith(logger + ".")
+                }
+            plan = [self._files[k] for k in self._order]
+
+        records: List[Dict[str, Any]] = []
+        scanned = 0
+        next_cursor = None
+        skipping = after is not None
+        for fi in plan:
+            if skipping and fi.key != after[0]:
+                continue
+            # Snapshot lengths; the live file may grow while we read
+            n = len(fi.offsets)
+            lo = bisect_left(fi.times, start, 0, n) if start is not None else 0
+            hi = bisect_right(fi.times, end, 0, n) if end is not None else n
+            if skipping:
+                hi = min(hi, after[1])
+                skipping = False
+            if user_key is not None:
+                posting = fi.users.get(user_key, array("I"))
+                p_hi = bisect_left(posting, hi)
+                p_lo = bisect_left(posting, lo)
+                candidates = (posting[j] for j in range(p_hi - 1, p_lo - 1, -1))
+            else:
+                candidates = iter(range(hi - 1, lo - 1, -1))
+            try:
+                f = open(fi.path, "rb")
+            except OSError:
+                continue
+            with f:
+                for i in candidates:
+                    if fi.levels[i] < min_level:
+                        continue
+                    if loggers is not None and fi.loggers[i] not in loggers:
+                        continue
+                    if len(records) >= limit or scanned >= MAX_SCANNED_RECORDS:
+                        next_cursor = f"{fi.key[0]}:{fi.key[1]}:{i + 1}"
+                        break
+                    scanned += 1
+                    off = fi.offsets[i]
+                    f.seek(off)
+                    raw = f.read(min(fi.end_of(i) - off, MAX_RECORD_BYTES))
+                    if needle is not None and needle not in raw:
+                        continue
+                    records.append(
+                        {
+                            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(fi.times[i])),
+                            "level": next((k for k, v in LEVELS.items() if v // 10 == fi.levels[i]), ""),
+                            "logger": self._logger_names[fi.loggers[i]],
+                            "file": os.path.basename(fi.path),
+                            "text": raw.decode("utf-8", errors="ignore").rstrip("\n"),
+                        }
+                    )
+            if next_cursor:
+                break
+        return {"ok": True, "records": records, "next_cursor": next_cursor, "scanned": scanned}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            files = [
+                {
+                    "file": os.path.basename(self._files[k].path),
+                    "records": len(self._files[k].offsets),
+                    "indexed_bytes": self._files[k].size,
+                    "users": len(self._files[k].users),
+                    "index_bytes": self._files[k].memory_bytes(),
+                }
+                for k in self._order
+            ]
+            return {"ok": True, "files": files, "loggers": len(self._logger_names), "last_refresh": self._last_refresh or None}
+
+
+index = LogIndex()
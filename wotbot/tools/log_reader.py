@@ -0,0 +1,136 @@
+import os
+import re
+from typing import Callable, Iterator, List, Optional
+
+BLOCK_SIZE = 64 * 1024
+# Longest traceback (in lines) kept together when filtering by record
+MAX_RECORD_LINES = 200
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+# Matches the start of a record written by logging_config's text or JSON formatter
+_RECORD_START = re.compile(
+    r'^(?:\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:,\d+)? (\w+) |\{"time": "[^"]*", "level": "(\w+)")'
+)
+
+
+def iter_lines_reverse(path: str, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    """Yield the lines of a file last-to-first, reading fixed-size blocks from the end."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        carry = b""
+        first = True
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step) + carry
+            parts = chunk.split(b"\n")
+            # parts[0] may continue in the previous block
+            carry = parts[0]
+            tail = parts[1:]
+            if first:
+                first = False
+                if tail and tail[-1] == b"":
+                    tail.pop()  # trailing newline at EOF
+            for raw in reversed(tail):
+                yield raw.decode("utf-8", errors="ignore").rstrip("\r")
+        if carry:
+            yield carry.decode("utf-8", errors="ignore").rstrip("\r")
+
+
+def rotated_files(path: str) -> List[str]:
+    """``path`` followed by its existing RotatingFileHandler backups (.1, .2, ...)."""
+    files = [path]
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        files.append(f"{path}.{i}")
+        i += 1
+    return files
+
+
+def make_filter(
+    contains: Optional[str] = None,
+    regex: Optional[str] = None,
+    level: Optional[str] = None,
+) -> Optional[Callable[[str, Optional[str]], bool]]:
+    """
+    Predicate over (record text, level name), or None when nothing is
+    filtered. ``level`` is a minimum (WARNING matches WARNING, ERROR, CRITICAL).
+    Raises ValueError for an invalid regex or level.
+    """
+    if not (contains or regex or level):
+        return None
+    pattern = None
+    if regex:
+        if len(regex) > 200:
+            raise ValueError("Regex too long (max 200 chars)")
+        try:
+            pattern = re.compile(regex)
+        except re.error as e:
+            raise ValueError(f"Invalid regex: {e}")
+    min_level = None
+    if level:
+        min_level = LEVELS.get(level.upper())
+        if min_level is None:
+            raise ValueError(f"Unknown level: {level}")
+
+    def _match(text: str, record_level: Optional[str]) -> bool:
+        if min_level is not None and LEVELS.get((record_level or "").upper(), 0) < min_level:
+            return False
+        if contains and contains not in text:
+            return False
+        if pattern is not None and not pattern.search(text):
+            return False
+        return True
+
+    return _match
+
+
+def _reverse_records(path: str) -> Iterator[List[str]]:
+    # Continuation lines (tracebacks) precede their header when reading backwards
+    pending: List[str] = []
+    for line in iter_lines_reverse(path):
+        if _RECORD_START.match(line):
+            pending.append(line)
+            yield pending[::-1]
+            pending = []
+        elif len(pending) < MAX_RECORD_LINES:
+            pending.append(line)
+    if pending:
+        yield pending[::-1]
+
+
+def tail(
+    paths: List[str],
+    lines: int,
+    match: Optional[Callable[[str, Optional[str]], bool]] = None,
+) -> List[str]:
+    """
+    Last ``lines`` lines across ``paths`` (newest file first), in chronological
+    order. With a filter, whole records (header plus traceback) are matched.
+    Only the returned lines are held in memory.
+    """
+    out: List[str] = []  # newest first
+    for path in paths:
+        if len(out) >= lines:
+            break
+        if match is None:
+            for line in iter_lines_reverse(path):
+                out.append(line)
+                if len(out) >= lines:
+                    break
+            continue
+        for record in _reverse_records(path):
+            m = _RECORD_START.match(record[0])
+            if not match("\n".join(record), (m.group(1) or m.group(2)) if m else None):
+                continue
+            for line in reversed(record):
+                out.append(line)
+                if len(out) >= lines:
+                    break
+            if len(out) >= lines:
+                break
+    out.reverse()
+    return out
+
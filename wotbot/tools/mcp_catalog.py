@@ -0,0 +1,164 @@
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+from . import mcp_client
+
+log = logging.getLogger(__name__)
+
+
+# OpenAI function names: ^[a-zA-Z0-9_-]{1,64}$
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_-]+")
+_EMPTY_PARAMS = {"type": "object", "properties": {}}
+
+
+def function_name(server_index: int, tool: str) -> str:
+    """Native tool name for an MCP tool, e.g. ``mcp0_search``."""
+    return (f"mcp{server_index}_" + _NAME_RE.sub("_", tool).strip("_"))[:64]
+
+
+def _tool_entries(result: Any) -> List[Dict[str, Any]]:
+    # MCP returns {"tools": [...]}; simpler servers return the list directly
+    if isinstance(result, dict):
+        result = result.get("tools")
+    if not isinstance(result, list):
+        return []
+    return [t for t in result if isinstance(t, dict) and t.get("name")]
+
+
+def _parameters(tool: Dict[str, Any]) -> Dict[str, Any]:
+    schema = tool.get("inputSchema") or tool.get("input_schema") or tool.get("parameters")
+    if not isinstance(schema, dict) or schema.get("type") != "object":
+        return dict(_EMPTY_PARAMS)
+    return schema
+
+
+class MCPToolCatalog:
+    """
+    Cached tools/list results for every configured MCP server, exposed as
+    native function schemas. Reads never block on the network: a background
+    thread refreshes entries older than MCP_CATALOG_TTL_SEC, and a failed
+    refresh keeps serving the last good listing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # server -> (fetched_at, tools, error)
+        self._entries: Dict[str, Tuple[float, List[Dict[str, Any]], Optional[str]]] = {}
+        self._routes: Dict[str, Tuple[str, str]] = {}
+        self._schemas: List[Dict[str, Any]] = []
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if not settings.mcp_native_tools:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="mcp-catalog")
+                self._thread.start()
+
+    def refresh(self, wait: bool = False) -> None:
+        """Refresh stale servers now (wait=True) or nudge the background thread."""
+        if wait:
+            self._refresh_stale(force=True)
+        else:
+            self.start()
+            self._wake.set()
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        if not settings.mcp_native_tools:
+            return []
+        self.start()
+        with self._lock:
+            if set(self._entries) != set(settings.mcp_servers):
+                self._wake.set()
+            return list(self._schemas)
+
+    def resolve(self, name: str) -> Optional[Tuple[str, str]]:
+        """(server, tool) for a native MCP function name, if known."""
+        if not settings.mcp_native_tools:
+            return None
+        with self._lock:
+            return self._routes.get(name)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            servers = [
+                {
+                    "server": srv,
+                    "tools": len(tools),
+                    "age_sec": round(now - fetched, 1) if fetched else None,
+                    "error": error,
+                }
+                for srv, (fetched, tools, error) in self._entries.items()
+            ]
+            return {"ok": True, "enabled": settings.mcp_native_tools, "servers": servers, "functions": sorted(self._routes)}
+
+    # Internals
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self._refresh_stale()
+            except Exception:
+                log.exception("MCP catalog refresh failed")
+            self._wake.wait(timeout=max(5, settings.mcp_catalog_ttl_sec // 4))
+            self._wake.clear()
+
+    def _refresh_stale(self, force: bool = False) -> None:
+        servers = list(settings.mcp_servers)
+        now = time.time()
+        with self._lock:
+            for srv in list(self._entries):
+                if srv not in servers:
+                    del self._entries[srv]
+            stale = [
+                srv for srv in servers
+                if force or srv not in self._entries or now - self._entries[srv][0] >= settings.mcp_catalog_ttl_sec
+            ]
+        if stale:
+            for item in mcp_client.mcp_list_all(servers=stale).get("servers", []):
+                srv, res = item["server"], item["response"]
+                with self._lock:
+                    if res.get("ok"):
+                        self._entries[srv] = (now, _tool_entries(res.get("result")), None)
+                    else:
+                        _, tools, _ = self._entries.get(srv, (0.0, [], None))
+                        # Keep the last good listing; retry on the next TTL tick
+                        self._entries[srv] = (now, tools, str(res.get("error")))
+                        log.warning("MCP catalog: listing %s failed: %s", srv, res.get("error"))
+        self._rebuild(servers)
+
+    def _rebuild(self, servers: List[str]) -> None:
+        routes: Dict[str, Tuple[str, str]] = {}
+        schemas: List[Dict[str, Any]] = []
+        with self._lock:
+            for idx, srv in enumerate(servers):
+                _, tools, _ = self._entries.get(srv, (0.0, [], None))
+                for tool in tools:
+                    if len(schemas) >= settings.mcp_catalog_max_tools:
+                        break
+                    name = function_name(idx, str(tool["name"]))
+                    if name in routes:
+                        continue
+                    routes[name] = (srv, str(tool["name"]))
+                    desc = str(tool.get("description") or f"MCP tool {tool['name']}")
+                    schemas.append(
+                        {
+                            "type": "function",
+                            "function": {
+                                "name": name,
+                                "description": f"{desc[:900]} (MCP server {idx})",
+                                "parameters": _parameters(tool),
+                            },
+                        }
+                    )
+            self._routes, self._schemas = routes, schemas
+
+
+catalog = MCPToolCatalog()
@@ -1,10 +1,12 @@
 import json
 import logging
-from typing import Any, Dict, List, Optional
-
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
 
 from ..config import settings
+from .mcp_exec_client import MCPExecClient
 
 log = logging.getLogger(__name__)
 
@@ -19,17 +21,25 @@ class MCPHttpClient:
     'tools/list' and 'tools/call'.
     """
 
-    def __init__(self, base_url: str, token: Optional[str] = None):
+    def __init__(self, base_url: str, token: Optional[str] = None, timeout: Optional[float] = None):
         self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        import requests
+
         self.session = requests.Session()
         self.headers = {"Content-Type": "application/json"}
         if token:
             self.headers["Authorization"] = f"Bearer {token}"
 
-    def _rpc(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    def _rpc(self, method: str, params: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
         payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
         try:
-            resp = self.session.post(self.base_url, headers=self.headers, json=payload, timeout=settings.http_timeout_sec)
+            resp = self.session.post(
+                self.base_url,
+                headers=self.headers,
+                json=payload,
+                timeout=timeout or self.timeout or settings.http_timeout_sec,
+            )
             resp.raise_for_status()
             data = resp.json()
         except Exception as e:
@@ -38,46 +48,121 @@ class MCPHttpClient:
             return {"ok": False, "error": data["error"]}
         return {"ok": True, "result": data.get("result")}
 
-    def list_tools(self) -> Dict[str, Any]:
-        return self._rpc("tools/list", {})
+    def list_tools(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return self._rpc("tools/list", {}, timeout)
 
     def call_tool(self, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         return self._rpc("tools/call", {"tool": tool, "arguments": arguments})
 
+    def close(self) -> None:
+        self.session.close()
 
-def mcp_list_all() -> Dict[str, Any]:
-    servers = settings.mcp_servers
-    if not servers:
-        return {"ok": False, "error": "No MCP servers configured"}
-    out: List[Dict[str, Any]] = []
-    for idx, srv in enumerate(servers):
-        client = MCPHttpClient(srv, settings.mcp_token)
-        res = client.list_tools()
-        out.append({"server": srv, "response": res})
-    return {"ok": True, "servers": out}
 
+class MCPClientRegistry:
+    """
+    Long-lived MCP clients, one per configured server, so keep-alive
+    connections (HTTP) and server processes (local commands) survive across
+    calls. The set is rebuilt only when MCP_SERVERS or MCP_TOKEN change.
+    """
 
-def mcp_call(server: str, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._config: Optional[Tuple[Tuple[str, ...], Optional[str]]] = None
+        self._clients: Dict[str, MCPClient] = {}
+
+    def _sync(self) -> Dict[str, "MCPClient"]:
+        config = (tuple(settings.mcp_servers), settings.mcp_token)
+        with self._lock:
+            if config != self._config:
+                old = self._clients
+                self._clients = {srv: make_client(srv) for srv in config[0]}
+                self._config = config
+                for srv, client in old.items():
+                    # Keep local processes whose command is still configured
+                    if isinstance(client, MCPExecClient) and srv in self._clients:
+                        continue
+                    client.close()
+                log.info("MCP client registry rebuilt for %d server(s)", len(self._clients))
+            return self._clients
+
+    def get(self, server: str) -> Optional["MCPClient"]:
+        return self._sync().get(server)
+
+    def clients(self) -> Dict[str, "MCPClient"]:
+        return dict(self._sync())
+
+
+MCPClient = Union[MCPHttpClient, MCPExecClient]
+
+
+def make_client(server: str, pooled: bool = True) -> MCPClient:
+    """
+    HTTP(S) URLs get a JSON-RPC HTTP client; anything else is a local command,
+    run in the shared process pool unless ``pooled`` is False.
+    """
+    if urlparse(server).scheme in ("http", "https"):
+        return MCPHttpClient(server, settings.mcp_token)
+    return MCPExecClient(server.split(), pooled=pooled)
+
+
+registry = MCPClientRegistry()
+
+
+def resolve_server(server: str) -> Optional[str]:
+    """Resolve a configured server by index or by exact base URL."""
     servers = list(settings.mcp_servers)
-    if not servers:
-        return {"ok": False, "error": "No MCP servers configured"}
-    # Allow addressing by index or by exact base URL
-    chosen: Optional[str] = None
     try:
         idx = int(server)
         if 0 <= idx < len(servers):
-            chosen = servers[idx]
+            return servers[idx]
     except Exception:
         # not an int
         pass
-    if chosen is None:
-        for s in servers:
-            if s.rstrip('/') == server.rstrip('/'):
-                chosen = s
-                break
-    if chosen is None:
-        return {"ok": False, "error": f"Unknown MCP server: {server}"}
+    for s in servers:
+        if s.rstrip('/') == str(server).rstrip('/'):
+            return s
+    return None
+
+
+def mcp_list_all(timeout: Optional[float] = None, servers: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    List tools on every configured server (or the given subset) concurrently.
+    Each server gets its own timeout; servers that fail or time out are
+    reported individually and do not hold back the others.
+    """
+    clients = registry.clients()
+    if servers is not None:
+        clients = {srv: c for srv, c in clients.items() if srv in servers}
+    if not clients:
+        return {"ok": False, "error": "No MCP servers configured"}
+    timeout = timeout or settings.mcp_list_timeout_sec
+    executor = ThreadPoolExecutor(max_workers=min(8, len(clients)), thread_name_prefix="mcp-list")
+    try:
+        futures = {executor.submit(client.list_tools, timeout): srv for srv, client in clients.items()}
+        # Small grace over the per-request timeout for connection setup
+        done, _ = wait(futures, timeout=timeout + 1)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    results: Dict[str, Dict[str, Any]] = {}
+    for fut, srv in futures.items():
+        if fut in done:
+            try:
+                results[srv] = fut.result()
+            except Exception as e:
+                results[srv] = {"ok": False, "error": str(e)}
+        else:
+            results[srv] = {"ok": False, "error": f"Timeout after {timeout}s"}
+    out: List[Dict[str, Any]] = [{"server": srv, "response": results[srv]} for srv in clients]
+    return {"ok": True, "servers": out, "partial": any(not r.get("ok") for r in results.values())}
+
 
-    client = MCPHttpClient(chosen, settings.mcp_token)
+def mcp_call(server: str, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    if not settings.mcp_servers:
+        return {"ok": False, "error": "No MCP servers configured"}
+    # Allow addressing by index or by exact base URL
+    chosen = resolve_server(server)
+    client = registry.get(chosen) if chosen else None
+    if client is None:
+        return {"ok": False, "error": f"Unknown MCP server: {server}"}
     return client.call_tool(tool, arguments or {})
 
@@ -1,65 +1,396 @@
+import itertools
 import json
+import logging
 import subprocess
-import sys
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Deque, Dict, List, Optional, Tuple
 
+from ..config import settings
 
-class MCPExecClient:
+log = logging.getLogger(__name__)
+
+
+class MCPProcess:
     """
-    Minimal JSON-RPC client over stdio to a local MCP process.
-    This assumes the process reads a single JSON-RPC request on stdin and writes
-    a single JSON-RPC response on stdout, line-delimited. This is a pragmatic
-    fallback and may need adapting for specific servers.
+    One long-lived local MCP server speaking newline-delimited JSON-RPC over
+    stdio. Requests get unique ids and may be in flight concurrently; a reader
+    thread matches responses back to their callers. If the process exits, all
+    pending calls fail and the next request starts a fresh process (with
+    backoff when it keeps crashing).
+
+    A server that exits cleanly after its first reply (the handshake, or the
+    first request) is treated as one-shot: from then on every request spawns
+    its own process, reads one reply and lets it exit.
     """
 
-    def __init__(self, command: List[str], cwd: Optional[str] = None, timeout: int = 10):
+    def __init__(self, command: List[str], cwd: Optional[str] = None):
         self.command = command
         self.cwd = cwd
-        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._reader: Optional[threading.Thread] = None
+        self._replies = 0
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count(1)
+        self._stderr: Deque[str] = deque(maxlen=20)
+        self._crashes: Deque[float] = deque(maxlen=5)
+        self._timeouts = 0
+        self.started_at = 0.0
+        self.last_used = 0.0
+        self.restarts = 0
+        self.requests = 0
+        self.one_shot = False
 
-    def _rpc(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
-        try:
+    # Lifecycle
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _ensure(self) -> subprocess.Popen:
+        with self._lock:
+            if self.alive:
+                return self._proc  # type: ignore[return-value]
+            recent = [t for t in self._crashes if time.time() - t < 60]
+            if len(recent) >= 3:
+                wait_for = min(30.0, 2.0 ** len(recent)) - (time.time() - recent[-1])
+                if wait_for > 0:
+                    raise RuntimeError(f"MCP process keeps crashing; retry in {wait_for:.0f}s")
+            if self.started_at:
+                self.restarts += 1
             proc = subprocess.Popen(
                 self.command,
                 cwd=self.cwd,
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
             )
-        except FileNotFoundError as e:
-            return {"ok": False, "error": f"Command not found: {self.command[0]}"}
-        except Exception as e:
-            return {"ok": False, "error": str(e)}
+            self._proc = proc
+            self.started_at = time.time()
+            self._timeouts = 0
+            self._replies = 0
+            self._reader = threading.Thread(target=self._read_stdout, args=(proc,), daemon=True, name="mcp-exec-out")
+            self._reader.start()
+            threading.Thread(target=self._read_stderr, args=(proc,), daemon=True, name="mcp-exec-err").start()
+            log.info("Started local MCP process %s (pid %s)", self.command[0], proc.pid)
+            # Handshake under the lock so concurrent first callers wait for it
+            if settings.mcp_exec_initialize:
+                self._handshake()
+            return proc
 
-        try:
-            assert proc.stdin and proc.stdout
-            proc.stdin.write(json.dumps(payload) + "\n")
+    def _handshake(self) -> None:
+        res = self._send(
+            "initialize",
+            {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {},
+                "clientInfo": {"name": "wotbot", "version": "0.3.0"},
+            },
+            timeout=settings.mcp_exec_timeout_sec,
+        )
+        if res.get("ok"):
+            self._notify("notifications/initialized", {})
+        else:
+            # Servers without an MCP handshake just answer with an error; carry on
+            log.debug("MCP initialize not accepted by %s: %s", self.command[0], res.get("error"))
+
+    def stop(self) -> None:
+        with self._lock:
+            proc, self._proc = self._proc, None
+        if proc is not None and proc.poll() is None:
+            try:
+                if proc.stdin:
+                    proc.stdin.close()
+                proc.terminate()
+                proc.wait(timeout=2)
+            except Exception:
+                proc.kill()
+        self._fail_pending("MCP process stopped")
+
+    # I/O
+
+    def _read_stdout(self, proc: subprocess.Popen) -> None:
+        assert proc.stdout
+        for raw in proc.stdout:
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if not line:
+                continue
+            try:
+                msg = json.loads(line)
+            except json.JSONDecodeError:
+                log.debug("Non-JSON line from MCP process: %s", line[:200])
+                continue
+            if not isinstance(msg, dict):
+                continue
+            if "method" in msg:
+                self._handle_server_message(msg)
+                continue
+            with self._pending_lock:
+                fut = self._pending.pop(msg.get("id"), None)
+            self._replies += 1
+            if fut is not None and not fut.done():
+                fut.set_result(msg)
+        # EOF: process exited
+        code = proc.wait()
+        if proc is self._proc:
+            if code != 0:
+                self._crashes.append(time.time())
+            elif self._replies == 1 and not self.one_shot:
+                self.one_shot = True
+                log.info("Local MCP process %s exits after one reply; spawning it per request", self.command[0])
+            log.warning("Local MCP process %s exited with %s", self.command[0], code)
+            self._fail_pending(f"MCP process exited ({code}): {' | '.join(self._stderr)[-500:]}")
+
+    def _read_stderr(self, proc: subprocess.Popen) -> None:
+        assert proc.stderr
+        for raw in proc.stderr:
+            self._stderr.append(raw.decode("utf-8", errors="ignore").rstrip())
+
+    def _handle_server_message(self, msg: Dict[str, Any]) -> None:
+        if "id" not in msg:
+            return  # notification
+        if msg.get("method") == "ping":
+            self._write({"jsonrpc": "2.0", "id": msg["id"], "result": {}})
+        else:
+            self._write({"jsonrpc": "2.0", "id": msg["id"], "error": {"code": -32601, "message": "Method not found"}})
+
+    def _fail_pending(self, error: str) -> None:
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_result({"error": error})
+
+    def _forget(self, req_id: int) -> None:
+        with self._pending_lock:
+            self._pending.pop(req_id, None)
+
+    def _write(self, payload: Dict[str, Any]) -> None:
+        proc = self._proc
+        if proc is None or proc.stdin is None:
+            raise RuntimeError("MCP process not running")
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        with self._write_lock:
+            proc.stdin.write(data)
             proc.stdin.flush()
-            proc.stdin.close()
-            out, err = proc.communicate(timeout=self.timeout)
-        except subprocess.TimeoutExpired:
-            proc.kill()
+
+    def _notify(self, method: str, params: Dict[str, Any]) -> None:
+        try:
+            self._write({"jsonrpc": "2.0", "method": method, "params": params})
+        except Exception:
+            pass
+
+    def _send(self, method: str, params: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        req_id = next(self._ids)
+        fut: Future = Future()
+        with self._pending_lock:
+            self._pending[req_id] = fut
+        try:
+            self._write({"jsonrpc": "2.0", "id": req_id, "method": method, "params": params})
+            data = fut.result(timeout=timeout)
+        except FutureTimeout:
+            self._forget(req_id)
+            self._timeouts += 1
             return {"ok": False, "error": "Timeout waiting for local MCP process"}
         except Exception as e:
-            proc.kill()
+            self._forget(req_id)
             return {"ok": False, "error": str(e)}
-
-        out = out.strip()
-        if not out:
-            return {"ok": False, "error": (err.strip() if err else "No output from process")}
-        try:
-            data = json.loads(out.splitlines()[-1])
-        except json.JSONDecodeError:
-            return {"ok": False, "error": "Invalid JSON from process", "raw": out[-2000:]}
+        self._timeouts = 0
         if "error" in data:
             return {"ok": False, "error": data["error"]}
         return {"ok": True, "result": data.get("result")}
 
-    def list_tools(self) -> Dict[str, Any]:
-        return self._rpc("tools/list", {})
+    def request(self, method: str, params: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        timeout = timeout or settings.mcp_exec_timeout_sec
+        if self.one_shot:
+            self.last_used = time.time()
+            self.requests += 1
+            return run_once(self.command, self.cwd, method, params, timeout)
+        try:
+            proc = self._ensure()
+        except FileNotFoundError:
+            return {"ok": False, "error": f"Command not found: {self.command[0]}"}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+        self.last_used = time.time()
+        self.requests += 1
+        res = self._send(method, params, timeout)
+        if not res.get("ok") and proc.poll() is not None:
+            # Let the reader finish with the exit so one-shot servers are recognized
+            reader = self._reader
+            if reader is not None:
+                reader.join(1)
+            if self.one_shot:
+                return run_once(self.command, self.cwd, method, params, timeout)
+        if self._timeouts >= 2:
+            # Repeated timeouts: assume the server is wedged and restart it on next use
+            log.warning("Local MCP process %s unresponsive; restarting", self.command[0])
+            self.stop()
+        return res
+
+    # Health
+
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def health_check(self) -> bool:
+        """Ping the process; any JSON-RPC reply (even an error) counts as healthy."""
+        if not self.alive:
+            return False
+        res = self._send("ping", {}, timeout=min(5, settings.mcp_exec_timeout_sec))
+        healthy = res.get("ok") or res.get("error") != "Timeout waiting for local MCP process"
+        if not healthy:
+            log.warning("Local MCP process %s failed health check; restarting", self.command[0])
+            self.stop()
+        return bool(healthy)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "command": " ".join(self.command),
+            "alive": self.alive,
+            "pid": self._proc.pid if self.alive and self._proc else None,
+            "started_at": self.started_at or None,
+            "last_used": self.last_used or None,
+            "restarts": self.restarts,
+            "requests": self.requests,
+            "in_flight": self.in_flight(),
+            "one_shot": self.one_shot,
+        }
+
+
+def run_once(command: List[str], cwd: Optional[str], method: str, params: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """Spawn the server for a single request and read its one reply (one-shot servers)."""
+    payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+    try:
+        proc = subprocess.Popen(
+            command,
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+    except FileNotFoundError:
+        return {"ok": False, "error": f"Command not found: {command[0]}"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+    try:
+        out, err = proc.communicate(json.dumps(payload) + "\n", timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        return {"ok": False, "error": "Timeout waiting for local MCP process"}
+    except Exception as e:
+        proc.kill()
+        return {"ok": False, "error": str(e)}
+    out = out.strip()
+    if not out:
+        return {"ok": False, "error": (err.strip() if err else "No output from process")}
+    try:
+        data = json.loads(out.splitlines()[-1])
+    except json.JSONDecodeError:
+        return {"ok": False, "error": "Invalid JSON from process", "raw": out[-2000:]}
+    if "error" in data:
+        return {"ok": False, "error": data["error"]}
+    return {"ok": True, "result": data.get("result")}
+
+
+class MCPProcessPool:
+    """
+    Keeps one MCPProcess per (command, cwd). A background janitor pings idle
+    processes periodically and shuts down those unused for MCP_EXEC_IDLE_SEC.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._procs: Dict[Tuple[Tuple[str, ...], Optional[str]], MCPProcess] = {}
+        self._janitor: Optional[threading.Thread] = None
+
+    def get(self, command: List[str], cwd: Optional[str] = None) -> MCPProcess:
+        key = (tuple(command), cwd)
+        with self._lock:
+            proc = self._procs.get(key)
+            if proc is None:
+                proc = self._procs[key] = MCPProcess(list(command), cwd)
+            if self._janitor is None:
+                self._janitor = threading.Thread(target=self._janitor_loop, daemon=True, name="mcp-exec-janitor")
+                self._janitor.start()
+            return proc
+
+    def stop(self, command: List[str], cwd: Optional[str] = None) -> None:
+        with self._lock:
+            proc = self._procs.pop((tuple(command), cwd), None)
+        if proc is not None:
+            proc.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            procs = list(self._procs.values())
+        return {"ok": True, "processes": [p.info() for p in procs]}
+
+    def _janitor_loop(self) -> None:
+        last_health = time.time()
+        while True:
+            time.sleep(5)
+            now = time.time()
+            with self._lock:
+                procs = list(self._procs.values())
+            check_health = now - last_health >= settings.mcp_exec_health_interval_sec
+            for p in procs:
+                if not p.alive or p.in_flight():
+                    continue
+                try:
+                    if settings.mcp_exec_idle_sec and now - p.last_used > settings.mcp_exec_idle_sec:
+                        log.info("Stopping idle local MCP process %s", p.command[0])
+                        p.stop()
+                    elif check_health:
+                        p.health_check()
+                except Exception:
+                    log.exception("MCP janitor error")
+            if check_health:
+                last_health = now
+
+
+pool = MCPProcessPool()
+
+
+class MCPExecClient:
+    """
+    JSON-RPC client over stdio to a local MCP process. Requests go to a shared,
+    long-lived process from the pool (newline-delimited JSON-RPC), so many calls
+    reuse one server instead of spawning it per request. With ``pooled=False``
+    each request gets a throwaway process that is stopped afterwards (used to
+    validate commands that are not configured).
+    """
+
+    def __init__(self, command: List[str], cwd: Optional[str] = None, timeout: Optional[int] = None, pooled: bool = True):
+        self.command = command
+        self.cwd = cwd
+        self.timeout = timeout
+        self.pooled = pooled
+
+    def _rpc(self, method: str, params: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        if not self.command:
+            return {"ok": False, "error": "Empty MCP command"}
+        if self.pooled:
+            return pool.get(self.command, self.cwd).request(method, params, timeout or self.timeout)
+        proc = MCPProcess(list(self.command), self.cwd)
+        try:
+            return proc.request(method, params, timeout or self.timeout)
+        finally:
+            proc.stop()
+
+    def list_tools(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return self._rpc("tools/list", {}, timeout)
 
     def call_tool(self, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         return self._rpc("tools/call", {"tool": tool, "arguments": arguments})
 
+    def close(self) -> None:
+        if self.pooled:
+            pool.stop(self.command, self.cwd)
@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+import time
+from array import array
+from typing import Any, Dict, Optional
+
+from ..config import settings
+from ..utils.lazy import Lazy
+
+log = logging.getLogger(__name__)
+
+
+# Series sampled on every tick, and the trend windows reported for each.
+SERIES = (
+    "cpu_percent",
+    "memory_percent",
+    "disk_percent",
+    "process_cpu_percent",
+    "process_rss",
+    "process_threads",
+)
+WINDOWS = {"1m": 60, "5m": 300, "15m": 900}
+
+
+class RingBuffer:
+    """Fixed-capacity (timestamp, value) series backed by two preallocated arrays."""
+
+    __slots__ = ("capacity", "times", "values", "count", "head")
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.times = array("d", [0.0]) * self.capacity
+        self.values = array("d", [0.0]) * self.capacity
+        self.count = 0
+        self.head = 0  # next write position
+
+    def push(self, ts: float, value: float) -> None:
+        self.times[self.head] = ts
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def window(self, seconds: float, now: float) -> Optional[Dict[str, float]]:
+        """avg/min/max over samples newer than ``now - seconds`` (walks back from the newest)."""
+        total = 0.0
+        lo = hi = None
+        n = 0
+        idx = self.head
+        for _ in range(self.count):
+            idx = (idx - 1) % self.capacity
+            if self.times[idx] < now - seconds:
+                break
+            v = self.values[idx]
+            total += v
+            lo = v if lo is None or v < lo else lo
+            hi = v if hi is None or v > hi else hi
+            n += 1
+        if not n:
+            return None
+        return {"avg": round(total / n, 2), "min": lo, "max": hi, "samples": n}
+
+
+class SystemSampler:
+    """
+    Samples CPU, memory, disk and process stats every METRICS_SAMPLE_INTERVAL_SEC
+    on a background thread. Readers get the latest snapshot and 1m/5m/15m
+    trends from ring buffers, so status requests make no syscalls of their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._psutil = Lazy(self._load_psutil)
+        self._proc = None
+        self._latest: Dict[str, Any] = {}
+        self._ready = threading.Event()  # set by the first stored sample
+        self._buffers: Dict[str, RingBuffer] = {}
+        self._boot_time = 0.0
+        self._primed_at = 0.0
+        self.started_at = time.time()
+
+    def _load_psutil(self):
+        # Imported and primed on the sampler thread, off the startup path
+        import psutil
+
+        self._proc = psutil.Process(os.getpid())
+        self._boot_time = psutil.boot_time()
+        # Prime the CPU counters so the first real sample covers a full interval
+        psutil.cpu_percent(interval=None)
+        self._proc.cpu_percent(interval=None)
+        self._primed_at = time.time()
+        return psutil
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            interval = max(1, settings.metrics_sample_interval_sec)
+            capacity = max(WINDOWS.values()) // interval + 1
+            self._buffers = {name: RingBuffer(capacity) for name in SERIES}
+            self._thread = threading.Thread(target=self._loop, args=(interval,), daemon=True, name="metrics-sampler")
+            self._thread.start()
+
+    def _loop(self, interval: float) -> None:
+        # First sample soon after startup, then on the regular interval
+        self._psutil.get()
+        delay = min(interval, 1.0)
+        while True:
+            time.sleep(delay)
+            delay = interval
+            try:
+                self.sample()
+            except Exception:
+                log.exception("System metrics sample failed")
+
+    def sample(self) -> Dict[str, Any]:
+        psutil = self._psutil.get()
+        now = time.time()
+        # CPU percentages over a near-zero span are noise; report None until primed
+        cpu_ready = now - self._primed_at >= 0.5
+        vm = psutil.virtual_memory()
+        du = psutil.disk_usage("/")
+        with self._proc.oneshot():
+            pmem = self._proc.memory_info()
+            snap = {
+                "cpu_percent": psutil.cpu_percent(interval=None) if cpu_ready else None,
+                "memory": {"total": vm.total, "available": vm.available, "percent": vm.percent, "used": vm.used},
+                "disk": {"total": du.total, "used": du.used, "free": du.free, "percent": du.percent},
+                "process": {
+                    "pid": self._proc.pid,
+                    "cpu_percent": self._proc.cpu_percent(interval=None) if cpu_ready else None,
+                    "rss": pmem.rss,
+                    "threads": self._proc.num_threads(),
+                },
+                "sampled_at": now,
+            }
+        values = {
+            "cpu_percent": snap["cpu_percent"],
+            "memory_percent": vm.percent,
+            "disk_percent": du.percent,
+            "process_cpu_percent": snap["process"]["cpu_percent"],
+            "process_rss": pmem.rss,
+            "process_threads": snap["process"]["threads"],
+        }
+        with self._lock:
+            for name, value in values.items():
+                buf = self._buffers.get(name)
+                if buf is not None and value is not None:
+                    buf.push(now, float(value))
+            self._latest = snap
+        self._ready.set()
+        return snap
+
+    def latest(self) -> Dict[str, Any]:
+        """Most recent sample, or {} before the first one (never samples)."""
+        return self._latest
+
+    def snapshot(self, trends: bool = True, wait: float = 0.0) -> Dict[str, Any]:
+        """
+        Latest sample plus trends. Before the first background sample, waits up
+        to ``wait`` seconds for it and otherwise returns a ``warming_up`` stub;
+        psutil is never called on the caller's thread.
+        """
+        self.start()
+        if wait > 0:
+            self._ready.wait(wait)
+        with self._lock:
+            latest = self._latest
+        now = time.time()
+        if not latest:
+            return {"warming_up": True, "process_uptime_seconds": int(now - self.started_at)}
+        out = dict(latest)
+        out["uptime_seconds"] = int(now - self._boot_time)
+        out["process_uptime_seconds"] = int(now - self.started_at)
+        out["sample_age_sec"] = round(now - latest["sampled_at"], 1)
+        if trends:
+            with self._lock:
+                out["trends"] = {
+                    label: {name: buf.window(seconds, now) for name, buf in self._buffers.items()}
+                    for label, seconds in WINDOWS.items()
+                }
+        return out
+
+
+sampler = SystemSampler()
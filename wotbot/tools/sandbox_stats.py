@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Upper bucket bounds per metric; the last bucket is open-ended.
+BUCKETS: Dict[str, Tuple[float, ...]] = {
+    "wall_ms": (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    "cpu_user_ms": (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+    "cpu_sys_ms": (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+    "max_rss_kb": (8192, 16384, 32768, 65536, 131072, 262144, 524288),
+    "output_bytes": (256, 1024, 4096, 16384, 65536, 262144, 1048576),
+}
+
+MAX_USERS = 1000
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        idx = len(self.bounds)
+        for i, b in enumerate(self.bounds):
+            if value <= b:
+                idx = i
+                break
+        self.counts[idx] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"<={b:g}" for b in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "max": round(self.max, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+def _new_group() -> Dict[str, Histogram]:
+    return {k: Histogram(b) for k, b in BUCKETS.items()}
+
+
+class SandboxStats:
+    """
+    Aggregates per-run sandbox usage into fixed-bucket histograms keyed by tool
+    and by user. Users are kept in LRU order and capped at MAX_USERS so an
+    abusive sender cannot grow memory without bound.
+    """
+
+    def __init__(self, max_users: int = MAX_USERS):
+        self._lock = threading.Lock()
+        self._max_users = max_users
+        self._by_tool: Dict[str, Dict[str, Histogram]] = {}
+        self._by_user: "OrderedDict[str, Dict[str, Histogram]]" = OrderedDict()
+
+    def record(self, tool: str, user_id: Optional[str], usage: Dict[str, Any]) -> None:
+        user = user_id or "unknown"
+        with self._lock:
+            groups = [self._by_tool.setdefault(tool, _new_group())]
+            if user not in self._by_user:
+                self._by_user[user] = _new_group()
+                while len(self._by_user) > self._max_users:
+                    self._by_user.popitem(last=False)
+            else:
+                self._by_user.move_to_end(user)
+            groups.append(self._by_user[user])
+            for key in BUCKETS:
+                val = usage.get(key)
+                if val is None:
+                    continue
+                for g in groups:
+                    g[key].observe(float(val))
+
+    def snapshot(self, top_users: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            tools = {t: {k: h.snapshot() for k, h in g.items()} for t, g in self._by_tool.items()}
+            ranked: List[Tuple[str, Dict[str, Histogram]]] = sorted(
+                self._by_user.items(), key=lambda kv: kv[1]["cpu_user_ms"].sum + kv[1]["cpu_sys_ms"].sum, reverse=True
+            )
+            users = {u: {k: h.snapshot() for k, h in g.items()} for u, g in ranked[:top_users]}
+        return {"ok": True, "tools": tools, "users": users, "users_tracked": len(self._by_user)}
+
+
+stats = SandboxStats()
@@ -2,13 +2,23 @@ from typing import List, Dict, Any
 from ..config import settings
 
 
+def _run_code_description() -> str:
+    desc = "Run short code snippets in a sandbox (python or javascript)."
+    if settings.code_exec_profile == "compute":
+        desc += (
+            " Python may import only: math, cmath, decimal, itertools, heapq, bisect,"
+            " numpy (as np, if installed; with numpy.random, numpy.linalg and numpy.fft, no file I/O)."
+        )
+    return desc
+
+
 def all_tool_schemas() -> List[Dict[str, Any]]:
     return [
         {
             "type": "function",
             "function": {
                 "name": "run_code",
-                "description": "Run short code snippets in a sandbox (python or javascript).",
+                "description": _run_code_description(),
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -27,7 +37,10 @@ def all_tool_schemas() -> List[Dict[str, Any]]:
             "type": "function",
             "function": {
                 "name": "http_request",
-                "description": "Perform an HTTP request (GET, POST, PUT, DELETE) with optional headers and query.",
+                "description": (
+                    "Perform an HTTP request (GET, POST, PUT, DELETE) with optional headers and query. "
+                    "HTML is returned as readable text, CSV as a header/rows summary, JSON as parsed data."
+                ),
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -36,11 +49,50 @@ def all_tool_schemas() -> List[Dict[str, Any]]:
                         "headers": {"type": "object", "additionalProperties": {"type": "string"}},
                         "params": {"type": "object", "additionalProperties": {"type": "string"}},
                         "body": {"type": ["object", "string", "null"]},
+                        "select": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "JSON paths to return instead of the whole body, e.g. 'data.items[*].name'.",
+                        },
+                        "raw": {"type": "boolean", "description": "Return raw text instead of extracted HTML/CSV content."},
                     },
                     "required": ["method", "url"],
                 },
             },
         },
+        {
+            "type": "function",
+            "function": {
+                "name": "http_batch",
+                "description": (
+                    "Perform several HTTP requests concurrently in one call (e.g. comparing multiple pages). "
+                    "Each item accepts the same fields as http_request. Results are returned in order."
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "requests": {
+                            "type": "array",
+                            "maxItems": settings.http_batch_max_requests,
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "method": {"type": "string", "enum": ["GET", "POST", "PUT", "DELETE"]},
+                                    "url": {"type": "string"},
+                                    "headers": {"type": "object", "additionalProperties": {"type": "string"}},
+                                    "params": {"type": "object", "additionalProperties": {"type": "string"}},
+                                    "body": {"type": ["object", "string", "null"]},
+                                    "select": {"type": "array", "items": {"type": "string"}},
+                                    "raw": {"type": "boolean"},
+                                },
+                                "required": ["url"],
+                            },
+                        },
+                    },
+                    "required": ["requests"],
+                },
+            },
+        },
         {
             "type": "function",
             "function": {
@@ -69,12 +121,23 @@ def all_tool_schemas() -> List[Dict[str, Any]]:
             "type": "function",
             "function": {
                 "name": "read_log",
-                "description": "Read recent application logs.",
+                "description": "Read recent application logs, optionally filtered (newest lines last).",
                 "parameters": {
                     "type": "object",
                     "properties": {
                         "path": {"type": "string", "description": "Relative path under logs directory."},
                         "lines": {"type": "integer", "minimum": 1, "maximum": 1000, "default": 200},
+                        "contains": {"type": "string", "description": "Only records containing this text."},
+                        "level": {
+                            "type": "string",
+                            "enum": ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+                            "description": "Minimum log level.",
+                        },
+                        "rotated": {"type": "boolean", "description": "Also search rotated files (app.log.1, ...)."},
+                        "since_minutes": {"type": "number", "description": "Only records from the last N minutes (uses the log index)."},
+                        "user": {"type": "string", "description": "Only records for this WhatsApp number, e.g. +15551234567."},
+                        "logger": {"type": "string", "description": "Only records from this logger or its children, e.g. wotbot.tools."},
+                        "cursor": {"type": "string", "description": "next_cursor from a previous indexed result, for older records."},
                     },
                 },
             },
@@ -103,9 +166,17 @@ def all_tool_schemas() -> List[Dict[str, Any]]:
         },
     ]
 def tool_schemas() -> List[Dict[str, Any]]:
+    # Built-in tools plus MCP tools from the cached catalog (never blocks)
+    from .mcp_catalog import catalog
+
     all_tools = all_tool_schemas()
+    mcp_tools = catalog.schemas()
     enabled = settings.enabled_tools
     if enabled and enabled != ("*",):
         allow = set(t.lower() for t in enabled)
-        return [t for t in all_tools if t.get("function", {}).get("name", "").lower() in allow]
-    return all_tools
+        tools = [t for t in all_tools if t.get("function", {}).get("name", "").lower() in allow]
+        # Native MCP tools follow mcp_call unless listed individually
+        if "mcp_call" not in allow:
+            mcp_tools = [t for t in mcp_tools if t["function"]["name"].lower() in allow]
+        return tools + mcp_tools
+    return all_tools + mcp_tools
@@ -1,34 +1,19 @@
 import logging
 import os
-from typing import Dict, Any
-
-import psutil
+import time
+from typing import Dict, Any, Optional
 
 from ..config import settings
+from . import log_index, log_reader
+from .metrics_sampler import sampler
 
 log = logging.getLogger(__name__)
 
 
 def get_system_status() -> Dict[str, Any]:
-    vm = psutil.virtual_memory()
-    du = psutil.disk_usage("/")
-    return {
-        "ok": True,
-        "cpu_percent": psutil.cpu_percent(interval=0.0),
-        "memory": {
-            "total": vm.total,
-            "available": vm.available,
-            "percent": vm.percent,
-            "used": vm.used,
-        },
-        "disk": {
-            "total": du.total,
-            "used": du.used,
-            "free": du.free,
-            "percent": du.percent,
-        },
-        "uptime_seconds": psutil.boot_time(),
-    }
+    # Precomputed by the background sampler; no psutil calls on this path.
+    # Right after startup, give the first sample a moment to land.
+    return {"ok": True, **sampler.snapshot(wait=2.0)}
 
 
 def _safe_join(base: str, rel: str) -> str:
@@ -39,15 +24,48 @@ def _safe_join(base: str, rel: str) -> str:
     return candidate
 
 
-def read_log(path: str, lines: int = 200) -> Dict[str, Any]:
+def read_log(
+    path: str,
+    lines: int = 200,
+    contains: Optional[str] = None,
+    regex: Optional[str] = None,
+    level: Optional[str] = None,
+    rotated: bool = False,
+    since_minutes: Optional[float] = None,
+    user: Optional[str] = None,
+    logger: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Tail a log by seeking backwards from the end, optionally continuing into
+    rotated backups (app.log.1, ...) and filtering records server-side.
+    Time, user and logger filters (and paging cursors) on app.log go through
+    the log index instead, which reads only the matching records.
+    """
     try:
+        if since_minutes or user or logger or cursor:
+            if (path or "app.log") != log_index.index.base:
+                return {"ok": False, "error": "since_minutes/user/logger filters are only supported for app.log"}
+            if regex:
+                return {"ok": False, "error": "regex cannot be combined with since_minutes/user/logger; use contains"}
+            res = log_index.index.query(
+                start=time.time() - float(since_minutes) * 60 if since_minutes else None,
+                level=level,
+                logger=logger,
+                user=user,
+                contains=contains,
+                limit=max(1, min(int(lines), 500)),
+                cursor=cursor,
+            )
+            res["path"] = path
+            return res
         full = _safe_join(settings.logs_dir, path or "app.log")
         if not os.path.exists(full):
             return {"ok": False, "error": f"Log not found: {path}"}
-        out_lines = []
-        with open(full, "r", encoding="utf-8", errors="ignore") as f:
-            for line in f.readlines()[-lines:]:
-                out_lines.append(line.rstrip("\n"))
+        lines = max(1, min(int(lines), 1000))
+        match = log_reader.make_filter(contains, regex, level)
+        files = log_reader.rotated_files(full) if rotated else [full]
+        out_lines = log_reader.tail(files, lines, match)
         return {"ok": True, "path": path, "lines": out_lines}
     except Exception as e:
         return {"ok": False, "error": str(e)}
@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import settings
+from .tools.log_reader import iter_lines_reverse
+
+log = logging.getLogger(__name__)
+
+# Span the current task is working under; child spans attach to it.
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+# Spans kept per trace; a runaway tool loop cannot grow a trace without bound.
+MAX_SPANS_PER_TRACE = 500
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "dropped", "lock")
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List["Span"] = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+
+class Span:
+    """
+    One timed operation within a trace. Spans are buffered on their trace and
+    written together when the root span ends, so the sampling decision can
+    look at the whole turn (slow or failed turns are always kept).
+    """
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "_t0", "duration_ms", "attrs", "status")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.attrs = attrs
+        self.status = "ok"
+        with trace.lock:
+            if len(trace.spans) < MAX_SPANS_PER_TRACE:
+                trace.spans.append(self)
+            else:
+                trace.dropped += 1
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def end(self, status: Optional[str] = None) -> None:
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = round((time.perf_counter() - self._t0) * 1000, 3)
+        if status:
+            self.status = status
+        if self.parent_id is None:
+            sink.finish(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+
+
+def start_trace(name: str, **attrs: Any) -> Optional[Span]:
+    """Root span of a new trace, or None when tracing is off."""
+    if not settings.trace_enabled:
+        return None
+    return Span(_Trace(), name, None, attrs)
+
+
+def start_span(name: str, parent: Optional[Span] = None, **attrs: Any) -> Optional[Span]:
+    """Child of ``parent`` (default: the current span), or None outside a trace."""
+    parent = parent or current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, attrs)
+
+
+class span:
+    """
+    ``with span("tool", tool=name) as s:`` runs the block as a child of the
+    current span and makes it current; ``s`` is None (and nothing is
+    recorded) outside a trace. An exception marks the span as an error.
+    """
+
+    __slots__ = ("_name", "_parent", "_attrs", "_span", "_token")
+
+    def __init__(self, name: str, parent: Optional[Span] = None, **attrs: Any):
+        self._name = name
+        self._parent = parent
+        self._attrs = attrs
+
+    def __enter__(self) -> Optional[Span]:
+        self._span = start_span(self._name, self._parent, **self._attrs)
+        self._token = current_span.set(self._span) if self._span is not None else None
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._span is None:
+            return
+        if exc_type is not None:
+            self._span.set("error", f"{exc_type.__name__}: {exc}"[:300])
+        self._span.end("error" if exc_type is not None else None)
+        current_span.reset(self._token)
+
+
+class TraceSink:
+    """
+    Sampled traces as JSON lines in logs/traces.jsonl, one trace per line.
+    The file rolls over to traces.jsonl.1 at TRACE_MAX_BYTES, so the sink
+    holds at most twice that on disk.
+    """
+
+    def __init__(self, filename: str = "traces.jsonl"):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._stats = {"finished": 0, "written": 0, "sampled_out": 0, "errors": 0}
+
+    @property
+    def path(self) -> str:
+        return os.path.join(settings.logs_dir, self.filename)
+
+    def finish(self, root: Span) -> None:
+        trace = root.trace
+        with trace.lock:
+            spans = list(trace.spans)
+            dropped = trace.dropped
+        failed = any(s.status == "error" for s in spans)
+        keep = (
+            failed
+            or root.duration_ms >= settings.trace_slow_ms
+            or random.random() < settings.trace_sample_rate
+        )
+        with self._lock:
+            self._stats["finished"] += 1
+            if not keep:
+                self._stats["sampled_out"] += 1
+                return
+        record = {
+            "trace_id": trace.trace_id,
+            "name": root.name,
+            "start": round(root.start, 6),
+            "duration_ms": root.duration_ms,
+            "status": "error" if failed else root.status,
+            "user": root.attrs.get("user"),
+            "dropped_spans": dropped,
+            # Unfinished spans (e.g. a tool still running past its timeout) have no duration
+            "spans": [s.to_dict() for s in spans],
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        try:
+            with self._lock:
+                os.makedirs(settings.logs_dir, exist_ok=True)
+                path = self.path
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    size = 0
+                if size and size + len(line) > settings.trace_max_bytes:
+                    os.replace(path, path + ".1")
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                self._stats["written"] += 1
+        except OSError as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            log.warning("Failed to write trace %s: %s", trace.trace_id, e)
+
+    def _iter(self) -> Iterator[Dict[str, Any]]:
+        for path in (self.path, self.path + ".1"):
+            if not os.path.exists(path):
+                continue
+            for line in iter_lines_reverse(path):
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def recent(self, limit: int = 50, min_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """Newest-first trace summaries at least ``min_ms`` long."""
+        out: List[Dict[str, Any]] = []
+        for rec in self._iter():
+            if (rec.get("duration_ms") or 0) < min_ms:
+                continue
+            summary = {k: v for k, v in rec.items() if k != "spans"}
+            summary["span_count"] = len(rec.get("spans") or [])
+            out.append(summary)
+            if len(out) >= limit:
+                break
+        return out
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        for rec in self._iter():
+            if rec.get("trace_id") == trace_id:
+                return rec
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ok": True,
+                "enabled": settings.trace_enabled,
+                "sample_rate": settings.trace_sample_rate,
+                "slow_ms": settings.trace_slow_ms,
+                **self._stats,
+            }
+
+
+sink = TraceSink()
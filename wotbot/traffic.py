@@ -0,0 +1,374 @@
+import atexit
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Tools that run for real during replay (local and side-effect free); every
+# other tool (HTTP, MCP, restart) gets its recorded result.
+LIVE_TOOLS = frozenset({"run_code", "get_system_status", "read_log", "read_config"})
+# Commands the replayer skips: they would restart the process running the replay
+UNSAFE_COMMANDS = frozenset({"/restart_bot", "/admin/restart"})
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Country code, check digits, then up to 30 letters/digits, often in groups of 4
+_IBAN = re.compile(r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?\b")
+# Digits, possibly grouped by spaces, dashes, dots or parentheses: phone, card
+# and account numbers, one-time codes. Masked when 6 or more digits in total.
+_NUMBER = re.compile(r"\+?\(?\d[\d \-.()]*\d")
+_MIN_DIGITS = 6
+
+
+def _mask_iban(m: "re.Match[str]") -> str:
+    s = m.group()
+    return s[:2] + re.sub(r"[A-Z]", "X", re.sub(r"\d", "0", s[2:]))
+
+
+def _mask_number(m: "re.Match[str]") -> str:
+    s = m.group()
+    if sum(c.isdigit() for c in s) < _MIN_DIGITS:
+        return s
+    return re.sub(r"\d", "0", s)
+
+
+def redact(text: str) -> str:
+    """
+    Replace e-mail addresses, IBANs and numbers of 6 or more digits (however
+    they are grouped), keeping the text's shape.
+
+    >>> redact("call me at +1 555-123-4567 or (054) 123.4567, code 123456")
+    'call me at +0 000-000-0000 or (000) 000.0000, code 000000'
+    >>> redact("card 4111 1111 1111 1111, IBAN DE89 3704 0044 0532 0130 00")
+    'card 0000 0000 0000 0000, IBAN DE00 0000 0000 0000 0000 00'
+    >>> redact("GB82 WEST 1234 5698 7654 32 to jane.doe@mail.example.org")
+    'GB00 XXXX 0000 0000 0000 00 to user@example.com'
+    >>> redact("order 42 of 3.5 kg at 10:30")
+    'order 42 of 3.5 kg at 10:30'
+    """
+    text = _EMAIL.sub("user@example.com", text)
+    text = _IBAN.sub(_mask_iban, text)
+    return _NUMBER.sub(_mask_number, text)
+
+
+def scrub(obj: Any) -> Any:
+    """``redact`` every string value in a JSON-like structure (keys are kept)."""
+    if isinstance(obj, str):
+        return redact(obj)
+    if isinstance(obj, dict):
+        return {k: scrub(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [scrub(v) for v in obj]
+    return obj
+
+
+def _args_key(args: Any) -> str:
+    return json.dumps(args, sort_keys=True, default=str)
+
+
+class Turn:
+    """
+    One inbound message and the provider traffic it caused. While recording,
+    OpenAI responses and tool results are appended as the turn runs; during
+    replay they are handed back out in the same order.
+    """
+
+    __slots__ = ("record", "_next_openai", "_tools_used", "started", "delivered", "replies")
+
+    def __init__(self, record: Dict[str, Any]):
+        self.record = record
+        self._next_openai = 0
+        self._tools_used: Set[int] = set()
+        self.started: Optional[float] = None
+        self.delivered: Optional[float] = None
+        self.replies = 0
+
+    def next_openai(self) -> Optional[Dict[str, Any]]:
+        calls = self.record.get("openai") or []
+        if self._next_openai >= len(calls):
+            return None
+        self._next_openai += 1
+        return calls[self._next_openai - 1]
+
+    def take_tool(self, name: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Same name and arguments first, then the next unused call of that tool
+        tools = self.record.get("tools") or []
+        key = _args_key(scrub(args))
+        for exact in (True, False):
+            for i, t in enumerate(tools):
+                if i in self._tools_used or t.get("name") != name:
+                    continue
+                if exact and _args_key(t.get("args")) != key:
+                    continue
+                self._tools_used.add(i)
+                return t
+        return None
+
+
+# Turn being recorded, or replayed, by the current request thread
+current_turn: ContextVar[Optional[Turn]] = ContextVar("traffic_turn", default=None)
+
+
+class TrafficRecorder:
+    """
+    Opt-in (TRAFFIC_RECORD_ENABLED) recorder of real traffic for replay. Each
+    turn is one JSON line in the gzip file logs/traffic.jsonl.gz:
+    - the pseudonymized sender
+    - the redacted message text
+    - media types and sizes (never the media itself)
+    - every OpenAI HTTP response and tool result the turn produced, with
+      latencies
+
+    The file rolls over to traffic.jsonl.gz.1 at TRAFFIC_RECORD_MAX_BYTES.
+    """
+
+    def __init__(self, filename: str = "traffic.jsonl.gz"):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._file = None
+        self._salt: Optional[bytes] = None
+        self._stats = {"turns": 0, "errors": 0}
+
+    @property
+    def path(self) -> str:
+        return os.path.join(settings.logs_dir, self.filename)
+
+    def pseudonym(self, number: str) -> str:
+        """Stable stand-in number for a sender (per TRAFFIC_RECORD_SALT, or per process without one)."""
+        if self._salt is None:
+            self._salt = settings.traffic_record_salt.encode() or secrets.token_bytes(16)
+        digest = hmac.new(self._salt, number.encode(), hashlib.sha256).digest()
+        return "whatsapp:+999" + str(int.from_bytes(digest[:8], "big"))[-10:].zfill(10)
+
+    def begin(self, from_number: str, text: str, parts: List[Dict[str, Any]]) -> Optional[Turn]:
+        if not settings.traffic_record_enabled:
+            return None
+        media = []
+        for p in parts:
+            url = (p.get("image_url") or {}).get("url", "") if p.get("type") == "image_url" else ""
+            if url.startswith("data:"):
+                header, _, data = url.partition(",")
+                media.append({"type": header[5:].split(";")[0], "bytes": len(data) * 3 // 4})
+        return Turn({
+            "type": "turn",
+            "v": FORMAT_VERSION,
+            "ts": round(time.time(), 3),
+            "user": self.pseudonym(from_number),
+            "admin": from_number in settings.admin_phone_numbers,
+            "body": redact(text),
+            "media": media,
+            "openai": [],
+            "tools": [],
+        })
+
+    def finish(self, turn: Turn, replies: List[str], outcome: str, seconds: float) -> None:
+        rec = turn.record
+        rec["replies"] = len(replies)
+        rec["reply_chars"] = sum(len(r) for r in replies)
+        rec["outcome"] = outcome
+        rec["turn_ms"] = round(seconds * 1000, 1)
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+        try:
+            with self._lock:
+                if self._file is None:
+                    os.makedirs(settings.logs_dir, exist_ok=True)
+                    self._file = gzip.open(self.path, "at", encoding="utf-8")
+                self._file.write(line)
+                # Sync-flush so a crash loses at most the turn being written
+                self._file.flush()
+                self._stats["turns"] += 1
+                if os.path.getsize(self.path) >= settings.traffic_record_max_bytes:
+                    self._file.close()
+                    self._file = None
+                    os.replace(self.path, self.path + ".1")
+        except OSError as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            log.warning("Failed to record traffic: %s", e)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = {}
+        for path in (self.path + ".1", self.path):
+            if os.path.exists(path):
+                sizes[os.path.basename(path)] = os.path.getsize(path)
+        with self._lock:
+            return {"ok": True, "enabled": settings.traffic_record_enabled, "files": sizes, **self._stats}
+
+
+def read_turns(path: str) -> Iterator[Dict[str, Any]]:
+    """Turns from a recording, oldest first (tolerates a truncated last write)."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("type") == "turn":
+                    yield rec
+        except (EOFError, OSError) as e:
+            log.warning("Recording %s ends early: %s", path, e)
+
+
+class TrafficPlayer:
+    """
+    Serves a recording back to the app: OpenAI responses come from the turn's
+    recorded HTTP responses (optionally after their recorded latency), tools
+    outside ``live_tools`` return their recorded results, media downloads are
+    replaced by zero bytes of the recorded size, and replies are collected
+    instead of sent. Installed by benchmarks/replay.py before the app starts.
+    """
+
+    def __init__(self, turns: List[Dict[str, Any]], provider_latency: bool = True, live_tools=LIVE_TOOLS):
+        self.turns = [Turn(t) for t in turns]
+        self.provider_latency = provider_latency
+        self.live_tools = frozenset(live_tools) - {"restart_self"}
+        self.stats = {"openai_served": 0, "openai_missing": 0, "tools_served": 0, "tools_missing": 0, "tools_live": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def turn(self, index: Any) -> Optional[Turn]:
+        try:
+            return self.turns[int(index)]
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def media_data_url(self, url: str, ctype: str) -> str:
+        # replay://<bytes>: the recorded size, so encoding and request sizes match
+        try:
+            size = int(url.rsplit("/", 1)[-1])
+        except ValueError:
+            size = 0
+        return f"data:{ctype};base64,{base64.b64encode(bytes(size)).decode('ascii')}"
+
+    def tool_result(self, turn: Optional[Turn], name: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if name in self.live_tools:
+            self._count("tools_live")
+            return None
+        t = turn.take_tool(name, args) if turn is not None else None
+        if t is None:
+            self._count("tools_missing")
+            return {"ok": False, "error": f"replay: no recorded result for tool {name}"}
+        self._count("tools_served")
+        if self.provider_latency:
+            time.sleep((t.get("ms") or 0) / 1000.0)
+        return t.get("result")
+
+    def deliver(self, to: str, messages: List[str]) -> None:
+        turn = current_turn.get()
+        if turn is not None:
+            turn.delivered = time.perf_counter()
+            turn.replies = len(messages)
+
+    def http_client(self):
+        import httpx
+        from openai import DefaultHttpxClient
+
+        player = self
+
+        class ReplayTransport(httpx.BaseTransport):
+            def handle_request(self, request: httpx.Request) -> httpx.Response:
+                turn = current_turn.get()
+                entry = turn.next_openai() if turn is not None else None
+                if entry is None:
+                    player._count("openai_missing")
+                    # 400 so the SDK does not retry
+                    body = {"error": {"message": f"replay: no recorded response for {request.url.path}", "type": "replay"}}
+                    return httpx.Response(400, json=body, request=request)
+                player._count("openai_served")
+                if player.provider_latency:
+                    time.sleep((entry.get("ms") or 0) / 1000.0)
+                return httpx.Response(entry.get("status", 200), json=entry.get("body"), request=request)
+
+        return DefaultHttpxClient(transport=ReplayTransport())
+
+
+recorder = TrafficRecorder()
+atexit.register(recorder.close)
+
+# Set only by the replay harness; None in normal operation
+player: Optional[TrafficPlayer] = None
+
+
+# Hooks used by the webhook, ToolRouter and the OpenAI client
+
+def begin_turn(form: Any, from_number: str, text: str, parts: List[Dict[str, Any]]) -> Optional[Turn]:
+    if player is not None:
+        return player.turn(form.get("ReplayTurn"))
+    return recorder.begin(from_number, text, parts)
+
+
+def finish_turn(turn: Optional[Turn], replies: List[str], outcome: str, seconds: float) -> None:
+    if turn is not None and player is None:
+        recorder.finish(turn, replies, outcome, seconds)
+
+
+def replay_tool(name: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Recorded result for this tool call during replay; None means run it."""
+    if player is None:
+        return None
+    return player.tool_result(current_turn.get(), name, args)
+
+
+def record_tool(name: str, args: Dict[str, Any], result: Any, seconds: float) -> None:
+    turn = current_turn.get()
+    if turn is None or player is not None:
+        return
+    turn.record["tools"].append({"name": name, "args": scrub(args), "ms": round(seconds * 1000, 1), "result": scrub(result)})
+
+
+def _stamp_request(request) -> None:
+    request.extensions["traffic_t0"] = time.perf_counter()
+
+
+def _record_response(response) -> None:
+    turn = current_turn.get()
+    if turn is None:
+        return
+    response.read()
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    t0 = response.request.extensions.get("traffic_t0")
+    turn.record["openai"].append({
+        "method": response.request.method,
+        "path": response.request.url.path,
+        "status": response.status_code,
+        "ms": round((time.perf_counter() - t0) * 1000, 1) if t0 else None,
+        "body": scrub(body),
+    })
+
+
+def openai_http_client():
+    """httpx client for the OpenAI SDK when recording or replaying; None for the SDK default."""
+    if player is not None:
+        return player.http_client()
+    if settings.traffic_record_enabled:
+        from openai import DefaultHttpxClient
+
+        return DefaultHttpxClient(event_hooks={"request": [_stamp_request], "response": [_record_response]})
+    return None
@@ -0,0 +1,145 @@
+import csv
+import io
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+
+_SKIP_TAGS = {"script", "style", "noscript", "svg", "template", "iframe", "head"}
+_BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "tr", "table", "section", "article", "header",
+    "footer", "nav", "aside", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote",
+    "dt", "dd", "hr", "form", "main",
+}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.title = ""
+        self._skip = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        elif tag == "body":
+            # An unclosed <head> ends where the body starts
+            self._skip = 0
+        elif tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+        if tag == "li":
+            self.parts.append("- ")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> Dict[str, str]:
+    """Readable text from an HTML page: drops scripts/styles, keeps block breaks."""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass
+    text = "".join(parser.parts)
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    return {"title": " ".join(parser.title.split()), "text": text}
+
+
+_PATH_TOKEN = re.compile(r"([^.\[\]]+)|\[(\*|-?\d+)\]")
+
+
+def _walk(value: Any, tokens: List[str]) -> Any:
+    if not tokens:
+        return value
+    tok, rest = tokens[0], tokens[1:]
+    if tok == "*":
+        if isinstance(value, list):
+            return [_walk(v, rest) for v in value]
+        if isinstance(value, dict):
+            return {k: _walk(v, rest) for k, v in value.items()}
+        return None
+    if isinstance(value, list):
+        try:
+            return _walk(value[int(tok)], rest)
+        except (ValueError, IndexError):
+            return None
+    if isinstance(value, dict):
+        return _walk(value.get(tok), rest) if tok in value else None
+    return None
+
+
+def json_project(data: Any, paths: List[str]) -> Dict[str, Any]:
+    """
+    Pick values out of parsed JSON by path, e.g. "data.items[*].name" or
+    "results[0].id". Missing paths map to None.
+    """
+    out: Dict[str, Any] = {}
+    for path in paths:
+        tokens = [m.group(1) or m.group(2) for m in _PATH_TOKEN.finditer(path or "")]
+        out[path] = _walk(data, tokens)
+    return out
+
+
+def csv_summary(text: str, head_rows: int = 10, truncated: bool = False) -> Dict[str, Any]:
+    """Header, first rows, row count and numeric column stats for CSV text."""
+    if truncated and "\n" in text:
+        # Drop the partial last row of a capped download
+        text = text[: text.rfind("\n")]
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = csv.reader(io.StringIO(text), dialect)
+    columns: Optional[List[str]] = None
+    head: List[List[str]] = []
+    count = 0
+    stats: Dict[int, List[float]] = {}
+    for row in rows:
+        if columns is None:
+            columns = row
+            continue
+        count += 1
+        if len(head) < head_rows:
+            head.append(row)
+        for i, cell in enumerate(row):
+            try:
+                num = float(cell)
+            except ValueError:
+                continue
+            st = stats.get(i)
+            if st is None:
+                stats[i] = [num, num, num, 1]
+            else:
+                st[0] = min(st[0], num)
+                st[1] = max(st[1], num)
+                st[2] += num
+                st[3] += 1
+    columns = columns or []
+    numeric = {}
+    for i, (lo, hi, total, n) in sorted(stats.items()):
+        name = columns[i] if i < len(columns) else str(i)
+        numeric[name] = {"min": lo, "max": hi, "mean": round(total / n, 6), "count": int(n)}
+    return {"columns": columns, "rows": count, "head": head, "numeric": numeric, "rows_partial": truncated}
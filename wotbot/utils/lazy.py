@@ -0,0 +1,32 @@
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    A value built by ``factory`` on first ``get()`` instead of at import, so
+    heavy SDKs and clients stay off the startup path. Construction runs once
+    even when several threads ask at the same time; a factory that raises is
+    retried on the next ``get()``.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value: Optional[T] = None
+        self._built = False
+
+    def get(self) -> T:
+        if self._built:
+            return self._value  # type: ignore[return-value]
+        with self._lock:
+            if not self._built:
+                self._value = self._factory()
+                self._built = True
+        return self._value  # type: ignore[return-value]
+
+    @property
+    def built(self) -> bool:
+        return self._built
@@ -0,0 +1,112 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+from ..config import settings
+
+
+# Fields that carry the outcome of a call; never dropped and shortened last.
+KEEP_KEYS = {"ok", "error", "status", "exit_code", "timeout", "truncated", "retryable", "stderr"}
+# Response headers worth showing the model; the rest are noise.
+USEFUL_HEADERS = {"content-type", "location", "retry-after", "www-authenticate", "content-length", "last-modified"}
+
+# (max string chars, max list items / dict keys, max depth), tried in order
+# until the result fits the budget.
+_LEVELS: Tuple[Tuple[int, int, int], ...] = (
+    (2000, 50, 8),
+    (800, 20, 6),
+    (300, 10, 5),
+    (120, 5, 4),
+    (60, 3, 3),
+)
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _short(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    # Keep both ends: the tail often holds the error or the final answer
+    head = max(1, limit * 2 // 3)
+    tail = max(0, limit - head)
+    return f"{text[:head]}…[{len(text) - limit} chars elided]…{text[len(text) - tail:] if tail else ''}"
+
+
+def _shrink(value: Any, max_str: int, max_items: int, depth: int) -> Any:
+    if isinstance(value, str):
+        return _short(value, max_str)
+    if isinstance(value, (list, tuple)):
+        if depth <= 0:
+            return f"[list of {len(value)} items]"
+        items = [_shrink(v, max_str, max_items, depth - 1) for v in value[:max_items]]
+        if len(value) > max_items:
+            if max_items > 1:
+                # Keep the last item too; it is often the most recent entry
+                items[-1] = _shrink(value[-1], max_str, max_items, depth - 1)
+            items.insert(len(items) - 1 if max_items > 1 else len(items), f"…{len(value) - max_items} more items…")
+        return items
+    if isinstance(value, dict):
+        if depth <= 0:
+            return f"{{object with {len(value)} keys}}"
+        out: Dict[str, Any] = {}
+        extra: List[str] = []
+        for k, v in value.items():
+            key = str(k)
+            if key == "headers" and isinstance(v, dict):
+                v = {hk: hv for hk, hv in v.items() if str(hk).lower() in USEFUL_HEADERS}
+            if key in KEEP_KEYS:
+                # Outcome fields get a larger share of the string budget
+                out[key] = _shrink(v, max_str * 2, max_items, depth - 1)
+            elif len(out) - sum(1 for x in out if x in KEEP_KEYS) < max_items:
+                out[key] = _shrink(v, max_str, max_items, depth - 1)
+            else:
+                extra.append(key)
+        if extra:
+            out["_omitted_keys"] = len(extra)
+        return out
+    return value
+
+
+def compact_tool_result(obj: Any) -> str:
+    """compact_json with the configured per-result token budget."""
+    return compact_json(obj, max(200, settings.tool_output_max_tokens * 4))
+
+
+def compact_json(obj: Any, max_chars: int = 4000) -> str:
+    """
+    Serialize a tool result as valid JSON within ``max_chars``. Instead of
+    cutting the text, progressively shortens long strings (keeping head and
+    tail), elides long arrays with counts, caps nesting and drops noisy HTTP
+    headers, while outcome fields such as ``ok``/``error`` are kept.
+    """
+    try:
+        text = _dumps(obj)
+    except Exception:
+        text = _dumps(str(obj))
+    if len(text) <= max_chars:
+        return text
+    for max_str, max_items, depth in _LEVELS:
+        text = _dumps(_shrink(obj, max_str, max_items, depth))
+        if len(text) <= max_chars:
+            return text
+    # Still too large (e.g. very wide objects): keep outcome fields and, room
+    # permitting, a preview; the outcome fields are shortened before dropped
+    keep = {k: obj[k] for k in KEEP_KEYS if k in obj} if isinstance(obj, dict) else {}
+    marker = len(f"…[{len(text)} chars elided]…")
+    for max_str in (200, 60):
+        summary: Dict[str, Any] = {"truncated": True}
+        summary.update({k: _shrink(v, max_str, 3, 2) for k, v in keep.items()})
+        room = max_chars - len(_dumps({**summary, "preview": ""})) - marker
+        while room > 0:
+            summary["preview"] = _short(text, room)
+            out = _dumps(summary)
+            if len(out) <= max_chars:
+                return out
+            # JSON escapes in the preview took more than their share
+            room -= len(out) - max_chars
+        summary.pop("preview", None)
+        out = _dumps(summary)
+        if len(out) <= max_chars:
+            return out
+    return _dumps({"truncated": True, **({"ok": keep["ok"]} if "ok" in keep else {})})
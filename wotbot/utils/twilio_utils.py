@@ -1,26 +1,50 @@
 import logging
-from typing import List
-
-from twilio.rest import Client
+import threading
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from ..config import settings
+from .. import metrics, tracing
+
+if TYPE_CHECKING:
+    from twilio.rest import Client
 
 log = logging.getLogger(__name__)
 
+_client_lock = threading.Lock()
+_client: Optional[Tuple[Tuple[str, str], "Client"]] = None
 
-def twilio_client() -> Client:
-    if not settings.twilio_account_sid or not settings.twilio_auth_token:
+
+def twilio_client() -> "Client":
+    """Shared Twilio client, rebuilt only when the credentials change (e.g. via admin overrides)."""
+    global _client
+    creds = (settings.twilio_account_sid, settings.twilio_auth_token)
+    if not creds[0] or not creds[1]:
         raise RuntimeError("Twilio credentials not configured")
-    return Client(settings.twilio_account_sid, settings.twilio_auth_token)
+    cached = _client
+    if cached is not None and cached[0] == creds:
+        return cached[1]
+    with _client_lock:
+        if _client is None or _client[0] != creds:
+            # twilio.rest pulls in requests and every API domain; import on first send
+            from twilio.rest import Client
+
+            _client = (creds, Client(*creds))
+        return _client[1]
 
 
 def send_whatsapp_messages(to: str, messages: List[str]):
     client = twilio_client()
     for body in messages:
         log.info("Sending WhatsApp message to %s (%d chars)", to, len(body))
-        client.messages.create(
-            body=body,
-            from_=settings.twilio_whatsapp_from,
-            to=to,
-        )
+        try:
+            with tracing.span("twilio.messages.create", chars=len(body)):
+                client.messages.create(
+                    body=body,
+                    from_=settings.twilio_whatsapp_from,
+                    to=to,
+                )
+        except Exception:
+            metrics.twilio_messages_total.labels("error").inc()
+            raise
+        metrics.twilio_messages_total.labels("sent").inc()
 